@@ -0,0 +1,55 @@
+// Client for the optional query API (scripts/api_server.py).
+// The site is normally served as static files; when it is served by
+// api_server.py instead, /api/status answers and pages can ask for small,
+// filtered results rather than downloading whole JSON files.
+// Without the server every call returns null and callers use the static files.
+const API_BASE = "./api";
+
+let apiStatusPromise = null;
+
+function getApiStatus() {
+  if (!apiStatusPromise) {
+    apiStatusPromise = fetch(`${API_BASE}/status`)
+      .then((res) => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+  return apiStatusPromise;
+}
+
+// Parsed JSON of an API query, or null if the API (or that dataset) is unavailable.
+async function apiQuery(dataset, path, params = {}) {
+  const status = await getApiStatus();
+  if (!status || !status[dataset]) return null;
+
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([k, v]) => {
+    if (v != null && v !== "") query.set(k, Array.isArray(v) ? v.join(",") : v);
+  });
+
+  try {
+    const res = await fetch(`${API_BASE}/${path}?${query}`);
+    if (!res.ok) return null;
+    return await res.json();
+  } catch (e) {
+    console.warn("API query failed:", path, e);
+    return null;
+  }
+}
+
+// Every item of a paginated API query, fetched page by page; null if the
+// API is unavailable or any page fails.
+async function apiQueryAll(dataset, path, params = {}) {
+  let page = await apiQuery(dataset, path, params);
+  if (!page) return null;
+  const items = page.items;
+  while (items.length < page.total && page.items.length > 0) {
+    page = await apiQuery(dataset, path, { ...params, offset: items.length });
+    if (!page) return null;
+    items.push(...page.items);
+  }
+  return items;
+}
+
+window.getApiStatus = getApiStatus;
+window.apiQuery = apiQuery;
+window.apiQueryAll = apiQueryAll;
@@ -83,15 +83,108 @@ function setupToneParts() {
   });
 }
 
+// Packed audio_notes (.bin, written by export_notes.py --notes-format binary).
+// Layout mirrors scripts/notes_binary.py: header, JSON meta, per-part counts,
+// then float32 times/durations, uint16 measures and uint8 pitches per part.
+const AUDIO_NOTES_MAGIC = "BCN1";
+let audioNotesBinaryAvailable = true;
+
+function decodeAudioNotes(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(
+    view.getUint8(0),
+    view.getUint8(1),
+    view.getUint8(2),
+    view.getUint8(3)
+  );
+  if (magic !== AUDIO_NOTES_MAGIC) {
+    throw new Error("Not a packed audio_notes file");
+  }
+
+  const partCount = view.getUint16(6, true);
+  const metaLength = view.getUint32(8, true);
+  let pos = 12;
+
+  const meta = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, pos, metaLength))
+  );
+  pos += metaLength;
+
+  const counts = [];
+  for (let i = 0; i < partCount; i++) {
+    counts.push(view.getUint32(pos, true));
+    pos += 4;
+  }
+
+  const pad4 = (n) => (4 - (n % 4)) % 4;
+
+  const parts = meta.parts.map((partMeta, i) => {
+    const n = counts[i];
+    const times = new Float32Array(buffer, pos, n);
+    pos += 4 * n;
+    const durations = new Float32Array(buffer, pos, n);
+    pos += 4 * n;
+    const measures = new Uint16Array(buffer, pos, n);
+    pos += 2 * n + pad4(2 * n);
+    const pitches = new Uint8Array(buffer, pos, n);
+    pos += n + pad4(n);
+
+    const notes = new Array(n);
+    for (let j = 0; j < n; j++) {
+      notes[j] = {
+        time: times[j],
+        pitch: pitches[j],
+        duration: durations[j],
+        measure: measures[j] || null,
+      };
+    }
+    return { name: partMeta.name, index: partMeta.index, notes };
+  });
+
+  return {
+    riem: meta.riem,
+    bwv: meta.bwv,
+    tempo_qpm: meta.tempo_qpm,
+    time_signature: meta.time_signature,
+    total_duration_beats: meta.total_duration_beats,
+    parts,
+  };
+}
+
+// Prefer the corpus bundle, then the packed file; if the site was built
+// with JSON only, fall back once and stop asking for .bin files.
+async function fetchAudioNotes(bwvStr) {
+  if (window.getBundleEntry) {
+    const packed = await getBundleEntry(`data/audio_notes/bwv${bwvStr}.bin`);
+    if (packed) return decodeAudioNotes(packed);
+
+    const json = await getBundleEntry(`data/audio_notes/bwv${bwvStr}.json`);
+    if (json) return JSON.parse(new TextDecoder().decode(json));
+  }
+
+  if (audioNotesBinaryAvailable) {
+    try {
+      const res = await fetch(`./data/audio_notes/bwv${bwvStr}.bin`);
+      if (res.ok) {
+        return decodeAudioNotes(await res.arrayBuffer());
+      }
+    } catch (e) {
+      console.warn("Packed audio notes unavailable, using JSON:", e);
+    }
+    audioNotesBinaryAvailable = false;
+  }
+
+  const res = await fetch(`./data/audio_notes/bwv${bwvStr}.json`);
+  return res.json();
+}
+
 async function loadAudioForChorale(ch) {
   if (!ch || !ch.bwv) return;
 
   const bwvStr = ch.bwv.toString().replace(".", "_");
-  const url = `./data/audio_notes/bwv${bwvStr}.json`;
 
   try {
-    const res = await fetch(url);
-    currentNoteData = await res.json();
+    currentNoteData = await fetchAudioNotes(bwvStr);
     setupToneParts();
   } catch (e) {
     console.error("Audio JSON load error:", e);
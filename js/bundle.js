@@ -0,0 +1,107 @@
+// Reader for data/corpus.bundle (written by scripts/bundle.py).
+// The header and fixed-width index are fetched once with a Range request;
+// each file is then one more Range request for its offset/length.
+// If the bundle is missing or the server ignores Range headers, every lookup
+// returns null and callers fall back to the individual files.
+const BUNDLE_URL = "./data/corpus.bundle";
+const BUNDLE_MAGIC = "BCB1";
+const BUNDLE_HEADER_SIZE = 24;
+
+let bundleIndexPromise = null;
+
+async function fetchRange(url, start, end) {
+  const res = await fetch(url, { headers: { Range: `bytes=${start}-${end - 1}` } });
+  if (res.status !== 206) {
+    // A 200 means the whole bundle is on its way; do not download it.
+    if (res.body) res.body.cancel();
+    throw new Error(`Range request not served (status ${res.status})`);
+  }
+  return res.arrayBuffer();
+}
+
+async function loadBundleIndex() {
+  const head = await fetchRange(BUNDLE_URL, 0, BUNDLE_HEADER_SIZE);
+  const view = new DataView(head);
+  const magic = String.fromCharCode(
+    view.getUint8(0),
+    view.getUint8(1),
+    view.getUint8(2),
+    view.getUint8(3)
+  );
+  if (magic !== BUNDLE_MAGIC) throw new Error("Not a chorale bundle");
+
+  const keyWidth = view.getUint16(6, true);
+  const count = view.getUint32(8, true);
+  const indexOffset = view.getUint32(12, true);
+  const entrySize = keyWidth + 16;
+
+  const indexBuffer = await fetchRange(
+    BUNDLE_URL,
+    indexOffset,
+    indexOffset + count * entrySize
+  );
+
+  const decoder = new TextDecoder();
+  const bytes = new Uint8Array(indexBuffer);
+  const indexView = new DataView(indexBuffer);
+  const entries = new Map();
+
+  for (let i = 0; i < count; i++) {
+    const base = i * entrySize;
+    let keyEnd = base;
+    while (keyEnd < base + keyWidth && bytes[keyEnd] !== 0) keyEnd++;
+    const key = decoder.decode(bytes.subarray(base, keyEnd));
+
+    // offset is uint64; bundles stay far below 2^53 bytes.
+    const offset =
+      indexView.getUint32(base + keyWidth, true) +
+      indexView.getUint32(base + keyWidth + 4, true) * 2 ** 32;
+    const length = indexView.getUint32(base + keyWidth + 8, true);
+    entries.set(key, { offset, length });
+  }
+
+  return entries;
+}
+
+function getBundleIndex() {
+  if (!bundleIndexPromise) {
+    bundleIndexPromise = loadBundleIndex().catch((e) => {
+      console.info("Corpus bundle not used:", e.message);
+      return null;
+    });
+  }
+  return bundleIndexPromise;
+}
+
+// ArrayBuffer for a repo-relative path (e.g. "xml/scores/bwv269.musicxml"), or null.
+async function getBundleEntry(path) {
+  const index = await getBundleIndex();
+  if (!index) return null;
+
+  const key = path.replace(/^\.\//, "");
+  const entry = index.get(key);
+  if (!entry) return null;
+  if (entry.length === 0) return new ArrayBuffer(0);
+
+  try {
+    return await fetchRange(BUNDLE_URL, entry.offset, entry.offset + entry.length);
+  } catch (e) {
+    console.warn("Bundle entry load error:", key, e);
+    return null;
+  }
+}
+
+// What to hand to osmd.load(): a virtual excerpt rendered from its source
+// (js/excerpt.js), else the MusicXML text from the bundle if present,
+// otherwise the original URL.
+async function resolveScoreSource(path) {
+  const excerpt = await renderExcerpt(path);
+  if (excerpt) return excerpt;
+
+  const buffer = await getBundleEntry(path);
+  if (!buffer) return path;
+  return new TextDecoder().decode(buffer);
+}
+
+window.getBundleEntry = getBundleEntry;
+window.resolveScoreSource = resolveScoreSource;
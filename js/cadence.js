@@ -42,6 +42,23 @@ window.initCadencePage = function () {
 
   let osmdCadence = null;
 
+  const CADENCE_INDEX_URL = "./data/cadences_index.json";
+  const CADENCE_INDEX_VERSION = 2;
+  const CADENCE_FULL_URL = "./data/cadences_meta.json";
+  const CADENCE_DETAIL_DIR = "./data/cadences";
+  const CADENCE_GROUPS_URL = "./data/cadence_groups.json";
+  const CADENCE_VOICES_URL = "./data/cadence_voices.json";
+
+  // Prebuilt groups per cadence type x final role filter (cadence_meta.py),
+  // usable while allCadences are the index rows they refer to.
+  let groupTables = null;
+  const groupTableCache = new Map();
+
+  let allCadencesPromise = null;
+  let allVoicesPromise = null;
+  let groupRequest = 0;
+  const detailCache = new Map();
+
   function safeNumber(v) {
     const n = Number(v);
     return Number.isFinite(n) ? n : null;
@@ -81,18 +98,97 @@ window.initCadencePage = function () {
     return String(d);
   }
 
-  async function loadCadences() {
+  // Slim filter index (scripts/cadence_meta.py); rows are expanded into
+  // cadence objects with the same fields as cadences_meta.json entries.
+  function cadencesFromIndex(index) {
+    const chorales = index.chorales.map((row) =>
+      Object.fromEntries(index.choraleFields.map((f, i) => [f, row[i]]))
+    );
+    return index.cadences.map((row) => {
+      const r = Object.fromEntries(index.cadenceFields.map((f, i) => [f, row[i]]));
+      const ch = chorales[r.chorale];
+      const id = `${ch.stem}_cad${r.cadence}_m${r.start_measure}-${r.end_measure}`;
+      return {
+        id,
+        musicxml_path: `xml/scores_cadence/${id}.musicxml`,
+        source_musicxml: ch.source_musicxml,
+        stem: ch.stem,
+        bwv: ch.bwv,
+        riemenschneider: ch.riemenschneider,
+        chorale_title: ch.chorale_title,
+        key_original: ch.key_original,
+        time_signature: ch.time_signature,
+        start_measure: r.start_measure,
+        end_measure: r.end_measure,
+        cadence_type: index.cadenceTypes[r.cadence_type] ?? null,
+        final_soprano_role: index.sopranoRoles[r.final_soprano_role] ?? null,
+        final_soprano_name: r.final_soprano_name,
+        final_bass_name: r.final_bass_name,
+        soprano_signature: r.soprano_signature,
+        bass_signature: r.bass_signature,
+      };
+    });
+  }
+
+  async function fetchCadenceIndex() {
     try {
-      console.log("[Cadence] loading cadences_meta.json...");
-      const res = await fetch("./data/cadences_meta.json");
-      if (!res.ok) {
-        detailEl.innerHTML = "<p>Error loading cadences (fetch failed)</p>";
-        return;
+      const res = await fetch(CADENCE_INDEX_URL);
+      if (!res.ok) return null;
+      const index = await res.json();
+      return index.version === CADENCE_INDEX_VERSION ? index : null;
+    } catch (err) {
+      return null;
+    }
+  }
+
+  async function fetchGroupTables(cadenceCount) {
+    try {
+      const res = await fetch(CADENCE_GROUPS_URL);
+      if (!res.ok) return null;
+      const data = await res.json();
+      if (data.version !== CADENCE_INDEX_VERSION || data.cadenceCount !== cadenceCount) {
+        return null;
       }
-      const json = await res.json();
-      allCadences = Array.isArray(json) ? json : Object.values(json);
+      return data;
+    } catch (err) {
+      return null;
+    }
+  }
 
-      applyFiltersGroupAndSort();
+  // Every cadence (index rows, or the full file for older builds) with the
+  // prebuilt group tables. With the query API running this is only needed
+  // for melody search, so it is loaded on first use.
+  async function fetchCadences() {
+    console.log("[Cadence] loading cadences_index.json...");
+    const index = await fetchCadenceIndex();
+    if (index) {
+      allCadences = cadencesFromIndex(index);
+      groupTables = await fetchGroupTables(allCadences.length);
+      return;
+    }
+    // No index (older build): everything comes from the full file.
+    const res = await fetch(CADENCE_FULL_URL);
+    if (!res.ok) throw new Error("fetch failed");
+    const json = await res.json();
+    allCadences = Array.isArray(json) ? json : Object.values(json);
+  }
+
+  function ensureCadences() {
+    if (!allCadencesPromise) {
+      allCadencesPromise = fetchCadences().catch((err) => {
+        allCadencesPromise = null;
+        throw err;
+      });
+    }
+    return allCadencesPromise;
+  }
+
+  async function loadCadences() {
+    try {
+      const status = await getApiStatus();
+      if (!status || !status.cadences) await ensureCadences();
+
+      await applyFiltersGroupAndSort();
 
       if (filteredGroups.length > 0) {
         const g0 = filteredGroups[0];
@@ -106,10 +202,77 @@ window.initCadencePage = function () {
         updateToggleButton();
       }
     } catch (err) {
-      detailEl.innerHTML = "<p>Error loading cadences (JSON parse failed)</p>";
+      const reason = err && err.message === "fetch failed" ? "fetch failed" : "JSON parse failed";
+      detailEl.innerHTML = `<p>Error loading cadences (${reason})</p>`;
     }
   }
 
+  // Voices of every cadence, for melody search, fetched the first time a
+  // search runs: cadence_voices.json (one row per index row), or the full
+  // cadences_meta.json for builds without it.
+  async function fetchVoicesFile() {
+    try {
+      const res = await fetch(CADENCE_VOICES_URL);
+      if (!res.ok) return null;
+      const data = await res.json();
+      if (data.version !== CADENCE_INDEX_VERSION || data.cadences.length !== allCadences.length) {
+        return null;
+      }
+      const voices = new Map();
+      data.cadences.forEach((row, i) => {
+        const v = {};
+        data.voiceNames.forEach((name, k) => {
+          if (row[k]) v[name] = { midi: row[k][0], durations: row[k][1] };
+        });
+        voices.set(allCadences[i].id, v);
+      });
+      return voices;
+    } catch (err) {
+      return null;
+    }
+  }
+
+  function getAllVoices() {
+    if (!allVoicesPromise) {
+      allVoicesPromise = (async () => {
+        const voices = new Map();
+        if (allCadences.length && allCadences[0].voices) {
+          allCadences.forEach((c) => voices.set(c.id, c.voices));
+          return voices;
+        }
+        const fromFile = await fetchVoicesFile();
+        if (fromFile) return fromFile;
+
+        const res = await fetch(CADENCE_FULL_URL);
+        if (!res.ok) throw new Error("cadences_meta.json fetch failed");
+        const json = await res.json();
+        (Array.isArray(json) ? json : Object.values(json)).forEach((c) =>
+          voices.set(c.id, c.voices)
+        );
+        return voices;
+      })().catch((err) => {
+        allVoicesPromise = null;
+        throw err;
+      });
+    }
+    return allVoicesPromise;
+  }
+
+  // Full records of one chorale's cadences (data/cadences/<stem>.json).
+  function getCadenceDetail(c) {
+    const stem = c.stem || (c.id || "").split("_cad")[0];
+    if (!detailCache.has(stem)) {
+      detailCache.set(
+        stem,
+        fetch(`${CADENCE_DETAIL_DIR}/${stem}.json`)
+          .then((res) => (res.ok ? res.json() : []))
+          .then((records) => new Map(records.map((r) => [r.id, r])))
+          .catch(() => new Map())
+      );
+    }
+    return detailCache.get(stem).then((records) => records.get(c.id) || null);
+  }
+
   function refreshMelodyDisplay() {
     if (!melodyDisplayEl) return;
     if (melodyPattern.length === 0) {
@@ -121,7 +284,7 @@ window.initCadencePage = function () {
       .join(" – ");
   }
 
-  function performMelodySearch() {
+  async function performMelodySearch() {
     if (!voiceSelect) return;
 
     const voiceName = voiceSelect.value || "soprano";
@@ -146,10 +309,20 @@ window.initCadencePage = function () {
       }
     }
 
+    let allVoices;
+    try {
+      if (melodyResultsEl) melodyResultsEl.textContent = "Searching...";
+      await ensureCadences();
+      allVoices = await getAllVoices();
+    } catch (err) {
+      if (melodyResultsEl) melodyResultsEl.textContent = "Voice data could not be loaded.";
+      return;
+    }
+
     const resultIds = new Set();
 
     allCadences.forEach((c) => {
-      const v = (c.voices || {})[voiceName];
+      const v = (allVoices.get(c.id) || {})[voiceName];
       if (!v) return;
 
       const Praw = Array.isArray(v.midi) ? v.midi.map(Number) : [];
@@ -244,7 +417,11 @@ window.initCadencePage = function () {
   function buildGroups(arr) {
     const map = new Map();
     arr.forEach((c) => {
-      const sig = c.soprano_signature || "__NO_SIG__" + c.id;
+      // Index signatures are IDs into cadence_signatures.json; 0 is a real one.
+      const sig =
+        c.soprano_signature == null || c.soprano_signature === ""
+          ? "__NO_SIG__" + c.id
+          : c.soprano_signature;
       if (!map.has(sig)) map.set(sig, []);
       map.get(sig).push(c);
     });
@@ -276,6 +453,36 @@ window.initCadencePage = function () {
     return groups;
   }
 
+  // Groups for the current type/role filters from the prebuilt tables, or
+  // null when another filter is active (those groups are built here).
+  function lookupGroups() {
+    if (!groupTables || melodyFilterSet) return null;
+    if (keyModeSelect?.value || keyRootSelect?.value) return null;
+
+    const key = `${cadenceTypeSelect?.value || ""}|${finalRoleSelect?.value || ""}`;
+    const table = groupTables.tables[key];
+    if (!table) return null;
+
+    if (!groupTableCache.has(key)) {
+      groupTableCache.set(
+        key,
+        table.groups.map((rows, idx) => {
+          const list = rows.map((i) => allCadences[i]);
+          return {
+            groupId: "grp_" + String(idx).padStart(4, "0"),
+            signature: list[0].soprano_signature,
+            size: list.length,
+            cadences: list,
+            rep: list[0],
+          };
+        })
+      );
+    }
+    const groups = groupTableCache.get(key);
+    const order = table.orders[currentSort] || table.orders.default;
+    return order.map((g) => groups[g]);
+  }
+
   function sortGroups(groups) {
     const m = currentSort;
 
@@ -324,8 +531,8 @@ window.initCadencePage = function () {
 
     if (m === "soprano-line") {
       groups.sort((a, b) => {
-        const sa = a.signature || "";
-        const sb = b.signature || "";
+        const sa = a.signature ?? "";
+        const sb = b.signature ?? "";
         if (sa !== sb) return sa < sb ? -1 : 1;
         const na = a.rep.riemenschneider ?? a.rep.id;
         const nb = b.rep.riemenschneider ?? b.rep.id;
@@ -336,8 +543,8 @@ window.initCadencePage = function () {
 
     if (m === "bass-line") {
       groups.sort((a, b) => {
-        const sa = a.rep.bass_signature || "";
-        const sb = b.rep.bass_signature || "";
+        const sa = a.rep.bass_signature ?? "";
+        const sb = b.rep.bass_signature ?? "";
         if (sa !== sb) return sa < sb ? -1 : 1;
         const na = a.rep.riemenschneider ?? a.rep.id;
         const nb = b.rep.riemenschneider ?? b.rep.id;
@@ -347,7 +554,49 @@ window.initCadencePage = function () {
     }
   }
 
-  function applyFiltersGroupAndSort() {
+  // Groups for the current filters from the query API, or null without it.
+  // The melody filter only exists here, so with it the groups are built here.
+  async function fetchApiGroups() {
+    if (melodyFilterSet) return null;
+    const params = {
+      type: cadenceTypeSelect?.value,
+      role: finalRoleSelect?.value,
+      key_mode: keyModeSelect?.value,
+      key_root: keyRootSelect?.value,
+      sort: currentSort,
+      limit: 500,
+    };
+
+    const groups = await apiQueryAll("cadences", "cadences/groups", params);
+    return groups && groups.map((g) => ({ ...g, rep: g.cadences[0] }));
+  }
+
+  async function applyFiltersGroupAndSort() {
+    // Only the latest filter change may render; earlier answers are dropped.
+    const request = ++groupRequest;
+    const fromApi = await fetchApiGroups();
+    if (request !== groupRequest) return;
+    if (fromApi) {
+      filteredGroups = fromApi;
+      renderGroupList();
+      return;
+    }
+
+    try {
+      await ensureCadences();
+    } catch (err) {
+      detailEl.innerHTML = "<p>Error loading cadences (fetch failed)</p>";
+      return;
+    }
+    if (request !== groupRequest) return;
+
+    const prebuilt = lookupGroups();
+    if (prebuilt) {
+      filteredGroups = prebuilt;
+      renderGroupList();
+      return;
+    }
+
     const filteredCadences = allCadences.filter((c) => {
       if (!passKeyFilter(c)) return false;
       if (!passCadenceTypeFilter(c)) return false;
@@ -482,6 +731,8 @@ window.initCadencePage = function () {
       rows.push(`<div class="detail-row"><span class="detail-label">Final chord:</span> ${info.join(" / ")}</div>`);
     }
 
+    rows.push(`<div class="cadence-voice-detail"></div>`);
+
     const listHtml = (group.cadences || [])
       .map((cad) => {
         const active = cad.id === selectedCadenceId;
@@ -507,6 +758,7 @@ window.initCadencePage = function () {
     `);
 
     detailEl.innerHTML = rows.join("");
+    renderVoiceDetail(c);
 
     detailEl.querySelectorAll(".phrase-item").forEach((el) => {
       el.addEventListener("click", () => {
@@ -524,6 +776,26 @@ window.initCadencePage = function () {
     });
   }
 
+  // Sonority and outer voices come from the chorale's detail file, fetched
+  // once per chorale when one of its cadences is shown.
+  async function renderVoiceDetail(c) {
+    const record = await getCadenceDetail(c);
+    const el = detailEl.querySelector(".cadence-voice-detail");
+    if (!record || !el || currentCadence !== c) return;
+
+    const rows = [];
+    if (record.final_chord && record.final_chord.length) {
+      rows.push(`<div class="detail-row"><span class="detail-label">Final sonority:</span> ${record.final_chord.join(" ")}</div>`);
+    }
+    [["soprano", "Soprano"], ["bass", "Bass"]].forEach(([voice, label]) => {
+      const names = ((record.voices || {})[voice] || {}).names || [];
+      if (names.length) {
+        rows.push(`<div class="detail-row"><span class="detail-label">${label}:</span> ${names.join(" ")}</div>`);
+      }
+    });
+    el.innerHTML = rows.join("");
+  }
+
   async function renderScore(c) {
     if (!c) {
       scoreContainer.innerHTML = "<p>No cadence selected.</p>";
@@ -570,7 +842,7 @@ window.initCadencePage = function () {
     }
 
     try {
-      await osmdCadence.load(xmlPath);
+      await osmdCadence.load(await resolveScoreSource(xmlPath));
       osmdCadence.render();
 
       const svg = host.querySelector("svg");
@@ -3,6 +3,8 @@ let filteredChorales = [];
 let selectedId = null;
 
 let melodyIndex = [];
+let melodySearchIndex = null;
+let melodyIndexPromise = null;
 let melodyPattern = [];
 let melodySearchHits = null;
 
@@ -63,6 +65,37 @@ async function loadMelodyIndex() {
   } catch (e) {
     console.error("Failed to load melody_index.json", e);
   }
+
+  // Suffix array from melody_index.py; without it search falls back to a scan.
+  try {
+    const res = await fetch("./data/melody_search_index.json");
+    if (res.ok) {
+      const index = await res.json();
+      index.voiceStarts = index.voices.map((v) => v[2]);
+      melodySearchIndex = index;
+      console.log("melody search index loaded:", index.suffixes.length);
+    }
+  } catch (e) {
+    console.warn("melody_search_index.json unavailable, using linear search", e);
+  }
+}
+
+function ensureMelodyIndex() {
+  if (!melodyIndexPromise) melodyIndexPromise = loadMelodyIndex();
+  return melodyIndexPromise;
+}
+
+// Hits from the query API when it is running (all pages of them),
+// otherwise from the melody index searched here.
+async function findMelody(pattern, mode) {
+  const params = { pitches: pattern.pitches, durations: pattern.durations, mode, limit: 500 };
+  if (mode === "approximate") params.k = APPROX_MAX_EDITS;
+
+  const hits = await apiQueryAll("melody", "melody", params);
+  if (hits) return hits;
+
+  await ensureMelodyIndex();
+  return searchMelodyPattern(pattern, mode);
 }
 
 function setupFilters() {
@@ -230,7 +263,7 @@ async function renderScore(ch) {
   }
 
   try {
-    await osmd.load(ch.musicxml_path);
+    await osmd.load(await resolveScoreSource(ch.musicxml_path));
     osmd.render();
   } catch (e) {
     scoreContainer.innerHTML = "<p>Score load error.</p>";
@@ -238,9 +271,301 @@ async function renderScore(ch) {
   }
 }
 
-function searchMelodyPattern(pattern, mode = "absolute") {
+function matchesAt(part, i, pattern, mode) {
   const { intervals: targetInt, durations: targetDur, pitches: targetPitch } = pattern;
   const L = targetDur.length;
+  const P = part.pitches;
+  const D = part.durations;
+  const I = part.intervals;
+
+  if (!D || i + L > D.length) return false;
+
+  if (mode === "relative") {
+    for (let k = 0; k < L - 1; k++) {
+      if (I[i + k] !== targetInt[k]) return false;
+    }
+    for (let k = 0; k < L; k++) {
+      if (D[i + k] !== targetDur[k]) return false;
+    }
+    return true;
+  }
+
+  for (let k = 0; k < L; k++) {
+    const pcEntry = P[i + k] % 12;
+    const pcTarget = targetPitch[k] % 12;
+    if (pcEntry !== pcTarget || D[i + k] !== targetDur[k]) return false;
+  }
+  return true;
+}
+
+// Compare the suffix at pos with the query codes over their first m symbols.
+function compareSuffix(index, pos, codes, m) {
+  const seq = index.sequence;
+  for (let k = 0; k < m; k++) {
+    const a = pos + k < seq.length ? seq[pos + k] : -1;
+    if (a !== codes[k]) return a < codes[k] ? -1 : 1;
+  }
+  return 0;
+}
+
+function suffixBound(index, codes, m, upper) {
+  let lo = 0;
+  let hi = index.suffixes.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    const c = compareSuffix(index, index.suffixes[mid], codes, m);
+    if (c < 0 || (upper && c === 0)) lo = mid + 1;
+    else hi = mid;
+  }
+  return lo;
+}
+
+function voiceForPosition(index, pos) {
+  let lo = 0;
+  let hi = index.voiceStarts.length - 1;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (index.voiceStarts[mid] <= pos) lo = mid;
+    else hi = mid - 1;
+  }
+  return index.voices[lo];
+}
+
+// Both match modes agree on intervals mod 12, so one suffix-array range
+// gives every candidate; each is then checked exactly.
+function searchWithIndex(pattern, mode) {
+  const index = melodySearchIndex;
+  const codes = pattern.pitches
+    .slice(1)
+    .map((p, k) => (((p - pattern.pitches[k]) % 12) + 12) % 12);
+  const m = Math.min(codes.length, index.depth);
+
+  const lo = suffixBound(index, codes, m, false);
+  const hi = suffixBound(index, codes, m, true);
+  const positions = index.suffixes.slice(lo, hi).sort((a, b) => a - b);
+
+  const results = [];
+  positions.forEach((pos) => {
+    const [entryIdx, partIdx, start] = voiceForPosition(index, pos);
+    const entry = melodyIndex[entryIdx];
+    const part = entry.parts[partIdx];
+    const i = pos - start;
+
+    if (!matchesAt(part, i, pattern, mode)) return;
+
+    results.push({
+      riem: entry.riem,
+      bwv: entry.bwv,
+      measure: part.measures ? part.measures[i] : null,
+      voice: part.name,
+      noteIndex: i
+    });
+  });
+  return results;
+}
+
+// ---- Approximate search (mode "approximate") ----
+// Voices are compared as signed diatonic steps, so transposition and
+// major/minor interval quality are ignored; up to APPROX_MAX_EDITS
+// inserted, deleted or changed steps are tolerated (Myers bit-parallel
+// kernel, same as scripts/melody_search.py). Hits are ranked by edits,
+// then by rhythm distance.
+const APPROX_MAX_EDITS = 1;
+const DIATONIC_STEPS = [0, 1, 1, 2, 2, 3, 3, 4, 5, 5, 6, 6];
+
+function diatonicCodes(pitches) {
+  const codes = new Int8Array(Math.max(pitches.length - 1, 0));
+  for (let i = 0; i < codes.length; i++) {
+    const iv = pitches[i + 1] - pitches[i];
+    const size = Math.abs(iv);
+    const steps = DIATONIC_STEPS[size % 12] + 7 * Math.floor(size / 12);
+    codes[i] = iv < 0 ? -steps : steps;
+  }
+  return codes;
+}
+
+// End positions in text within k edits of pattern, as [end, distance].
+// Patterns longer than 31 steps use a plain DP column instead.
+function approxEnds(pattern, text, k) {
+  const m = pattern.length;
+  const out = [];
+  if (m === 0) return out;
+
+  if (m > 31) {
+    let prev = Array.from({ length: m + 1 }, (_, i) => i);
+    for (let j = 0; j < text.length; j++) {
+      const cur = [0];
+      for (let i = 1; i <= m; i++) {
+        const cost = pattern[i - 1] === text[j] ? 0 : 1;
+        cur.push(Math.min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + cost));
+      }
+      prev = cur;
+      if (cur[m] <= k) out.push([j, cur[m]]);
+    }
+    return out;
+  }
+
+  const peq = new Map();
+  for (let i = 0; i < m; i++) {
+    peq.set(pattern[i], (peq.get(pattern[i]) || 0) | (1 << i));
+  }
+  const mask = m === 31 ? 0x7fffffff : (1 << m) - 1;
+  const high = 1 << (m - 1);
+  let pv = mask;
+  let mv = 0;
+  let score = m;
+
+  for (let j = 0; j < text.length; j++) {
+    const eq = peq.get(text[j]) || 0;
+    const xv = eq | mv;
+    const xh = ((((eq & pv) + pv) & mask) ^ pv) | eq;
+    let ph = mv | (~(xh | pv) & mask);
+    let mh = pv & xh;
+
+    if (ph & high) score++;
+    else if (mh & high) score--;
+
+    ph = (ph << 1) & mask;
+    mh = (mh << 1) & mask;
+    pv = mh | (~(xv | ph) & mask);
+    mv = ph & xv;
+
+    if (score <= k) out.push([j, score]);
+  }
+  return out;
+}
+
+function rhythmDistance(queryDur, durs) {
+  const n = Math.min(queryDur.length, durs.length);
+  if (n === 0) return 0;
+  let total = 0;
+  for (let i = 0; i < n; i++) {
+    total += queryDur[i] > 0 && durs[i] > 0
+      ? Math.abs(Math.log2(durs[i] / queryDur[i]))
+      : (queryDur[i] === durs[i] ? 0 : 1);
+  }
+  return total / n;
+}
+
+// Leftmost-shortest start of a window ending at end that is within
+// distance edits of pattern (same DP as match_start in melody_search.py).
+function matchStart(pattern, text, end, distance) {
+  const m = pattern.length;
+  let prev = Array.from({ length: m + 1 }, (_, i) => i);
+
+  for (let length = 1; length <= m + distance; length++) {
+    const j = end - length + 1;
+    if (j < 0) break;
+    const cur = [length];
+    for (let i = 1; i <= m; i++) {
+      const cost = pattern[m - i] === text[j] ? 0 : 1;
+      cur.push(Math.min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + cost));
+    }
+    prev = cur;
+    if (prev[m] <= distance) return j;
+  }
+  return Math.max(0, end - m + 1);
+}
+
+// Diatonic codes of every voice back to back, APPROX_SEPARATOR after each
+// (the layout melody_search.py searches, so hits line up with the API).
+const APPROX_SEPARATOR = 1000;
+let approxText = null;
+
+function buildApproxText() {
+  const voices = [];
+  let length = 0;
+  melodyIndex.forEach((entry) => {
+    (entry.parts || []).forEach((part) => {
+      const codes = diatonicCodes(part.pitches);
+      voices.push({ entry, part, start: length, codes });
+      length += codes.length + 1;
+    });
+  });
+
+  const codes = new Int16Array(length);
+  voices.forEach((v) => {
+    codes.set(v.codes, v.start);
+    codes[v.start + v.codes.length] = APPROX_SEPARATOR;
+    delete v.codes;
+  });
+  return { index: melodyIndex, codes, voices };
+}
+
+function locateVoice(voices, pos) {
+  let lo = 0;
+  let hi = voices.length - 1;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (voices[mid].start <= pos) lo = mid;
+    else hi = mid - 1;
+  }
+  return voices[lo];
+}
+
+function searchApproximate(pattern) {
+  if (!approxText || approxText.index !== melodyIndex) approxText = buildApproxText();
+  const text = approxText.codes;
+  const query = diatonicCodes(pattern.pitches);
+  const m = query.length;
+  const k = Math.min(APPROX_MAX_EDITS, m - 1);
+
+  // Consecutive ends are one occurrence; keep the closest end of each run.
+  const runs = [];
+  let prevEnd = -2;
+  approxEnds(query, text, k).forEach(([end, dist]) => {
+    if (end === prevEnd + 1) {
+      if (dist < runs[runs.length - 1][1]) runs[runs.length - 1] = [end, dist];
+    } else {
+      runs.push([end, dist]);
+    }
+    prevEnd = end;
+  });
+
+  const found = [];
+  runs.forEach(([end, dist]) => {
+    const start = dist === 0 ? end - m + 1 : matchStart(query, text, end, dist);
+    if (text.subarray(start, end + 1).includes(APPROX_SEPARATOR)) return;
+    found.push([dist, start, end]);
+  });
+
+  // Overlapping windows are one match; keep the closest of each run.
+  found.sort((a, b) => a[0] - b[0] || (a[2] - a[1]) - (b[2] - b[1]) || a[1] - b[1]);
+  const covered = new Set();
+  const results = [];
+  found.forEach(([dist, start, end]) => {
+    for (let pos = start; pos <= end; pos++) {
+      if (covered.has(pos)) return;
+    }
+    for (let pos = start; pos <= end; pos++) covered.add(pos);
+
+    const { entry, part, start: voiceStart } = locateVoice(approxText.voices, start);
+    const i = start - voiceStart;
+    const notes = end - start + 2;
+    const rhythm = rhythmDistance(pattern.durations, part.durations.slice(i, i + notes));
+    results.push({
+      riem: entry.riem,
+      bwv: entry.bwv,
+      measure: part.measures ? part.measures[i] : null,
+      voice: part.name,
+      noteIndex: i,
+      distance: dist,
+      rhythm: Math.round(rhythm * 1000) / 1000
+    });
+  });
+
+  results.sort(
+    (a, b) =>
+      a.distance - b.distance ||
+      a.rhythm - b.rhythm ||
+      (a.riem || 0) - (b.riem || 0) ||
+      a.noteIndex - b.noteIndex
+  );
+  return results;
+}
+
+function searchMelodyPattern(pattern, mode = "absolute") {
+  const L = pattern.durations.length;
 
   if (L < 2) return [];
   if (!Array.isArray(melodyIndex)) {
@@ -248,59 +573,30 @@ function searchMelodyPattern(pattern, mode = "absolute") {
     return [];
   }
 
+  if (mode === "approximate") {
+    return searchApproximate(pattern);
+  }
+
+  if (melodySearchIndex && melodySearchIndex.voices.length > 0) {
+    return searchWithIndex(pattern, mode);
+  }
+
   const results = [];
 
   melodyIndex.forEach((entry) => {
-    const riem = entry.riem;
-    const bwv = entry.bwv;
-
     (entry.parts || []).forEach((part) => {
-      const P = part.pitches;
       const D = part.durations;
-      const I = part.intervals;
-      const M = part.measures;
-      const voice = part.name;
-
       if (!D || D.length < L) return;
 
-      const maxStart = D.length - L;
-
-      for (let i = 0; i <= maxStart; i++) {
-        let ok = true;
-
-        if (mode === "relative") {
-          for (let k = 0; k < L - 1; k++) {
-            if (I[i + k] !== targetInt[k]) {
-              ok = false;
-              break;
-            }
-          }
-          if (!ok) continue;
-
-          for (let k = 0; k < L; k++) {
-            if (D[i + k] !== targetDur[k]) {
-              ok = false;
-              break;
-            }
-          }
-        } else {
-          for (let k = 0; k < L; k++) {
-            const pcEntry = P[i + k] % 12;
-            const pcTarget = targetPitch[k] % 12;
-            if (pcEntry !== pcTarget || D[i + k] !== targetDur[k]) {
-              ok = false;
-              break;
-            }
-          }
-        }
-
-        if (!ok) continue;
+      for (let i = 0; i <= D.length - L; i++) {
+        if (!matchesAt(part, i, pattern, mode)) continue;
 
         results.push({
-          riem,
-          bwv,
-          measure: M ? M[i] : null,
-          voice
+          riem: entry.riem,
+          bwv: entry.bwv,
+          measure: part.measures ? part.measures[i] : null,
+          voice: part.name,
+          noteIndex: i
         });
       }
     });
@@ -342,7 +638,7 @@ btnMelodyClear.addEventListener("click", () => {
   renderList();
 });
 
-btnMelodySearch.addEventListener("click", () => {
+btnMelodySearch.addEventListener("click", async () => {
   if (melodyPattern.length < 2) {
     alert("Melody must contain at least 2 notes.");
     return;
@@ -362,7 +658,7 @@ btnMelodySearch.addEventListener("click", () => {
     ? melodyMatchModeSelect.value
     : "relative";
 
-  const results = searchMelodyPattern(pattern, mode);
+  const results = await findMelody(pattern, mode);
 
   const hitsByRiem = {};
   results.forEach((r) => {
@@ -378,6 +674,17 @@ btnMelodySearch.addEventListener("click", () => {
     return hitRiemSet.has(riemNum);
   });
 
+  // Approximate results are ranked; list chorales by their best hit.
+  if (mode === "approximate") {
+    const rank = new Map();
+    results.forEach((r, i) => {
+      if (!rank.has(Number(r.riem))) rank.set(Number(r.riem), i);
+    });
+    filteredChorales.sort(
+      (a, b) => rank.get(a.riemenschneider ?? a.id) - rank.get(b.riemenschneider ?? b.id)
+    );
+  }
+
   renderList();
 
   if (results.length === 0) {
@@ -388,5 +695,8 @@ btnMelodySearch.addEventListener("click", () => {
 });
 
 loadChorales();
-loadMelodyIndex();
+// With the query API running, melody search never needs the index files.
+getApiStatus().then((status) => {
+  if (!status || !status.melody) ensureMelodyIndex();
+});
 updateMelodyDisplay();
@@ -194,7 +194,7 @@ window.initEarPage = function () {
     }
 
     try {
-      await osmd.load(pathToLoad);
+      await osmd.load(await resolveScoreSource(pathToLoad));
       osmd.render();
 
       const svg = host.querySelector("svg");
@@ -0,0 +1,311 @@
+// Virtual cadence/phrase excerpts.
+// When data/excerpts_index.json exists (scripts/build.py --virtual-excerpts),
+// xml/scores_cadence and xml/scores_phrase paths are cut from their source
+// chorale in the browser instead of being fetched, the same way
+// scripts/xml_slice.py does it. Parsed source scores are kept in a small LRU.
+const EXCERPT_INDEX_URL = "./data/excerpts_index.json";
+const EXCERPT_INDEX_VERSION = 1;
+const EXCERPT_SOURCE_CACHE_SIZE = 8;
+const EXCERPT_EPS = 1e-6;
+
+const EXCERPT_ATTRIBUTE_ORDER = [
+  "footnote",
+  "level",
+  "divisions",
+  "key",
+  "time",
+  "staves",
+  "part-symbol",
+  "instruments",
+  "clef",
+  "staff-details",
+  "transpose",
+  "directive",
+  "measure-style",
+];
+const EXCERPT_POSITIONED_TAGS = new Set(["direction", "harmony", "figured-bass", "sound"]);
+
+let excerptIndexPromise = null;
+const excerptSourceCache = new Map();
+
+function getExcerptIndex() {
+  if (!excerptIndexPromise) {
+    excerptIndexPromise = fetch(EXCERPT_INDEX_URL)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data) =>
+        data && data.version === EXCERPT_INDEX_VERSION ? data.excerpts : null
+      )
+      .catch(() => null);
+  }
+  return excerptIndexPromise;
+}
+
+async function loadExcerptSource(source) {
+  if (excerptSourceCache.has(source)) {
+    const cached = excerptSourceCache.get(source);
+    excerptSourceCache.delete(source);
+    excerptSourceCache.set(source, cached);
+    return cached;
+  }
+
+  let text;
+  const buffer = await getBundleEntry(source);
+  if (buffer) {
+    text = new TextDecoder().decode(buffer);
+  } else {
+    const res = await fetch(source);
+    if (!res.ok) throw new Error(`Source score not found: ${source}`);
+    text = await res.text();
+  }
+
+  const doc = new DOMParser().parseFromString(text, "application/xml");
+  excerptSourceCache.set(source, doc);
+  if (excerptSourceCache.size > EXCERPT_SOURCE_CACHE_SIZE) {
+    excerptSourceCache.delete(excerptSourceCache.keys().next().value);
+  }
+  return doc;
+}
+
+function childElements(el, name) {
+  return Array.from(el.children).filter((c) => !name || c.localName === name);
+}
+
+function childText(el, name) {
+  const c = childElements(el, name)[0];
+  return c ? c.textContent : null;
+}
+
+function parseMeasureNumber(value) {
+  const m = /\d+/.exec(value || "");
+  return m ? Number(m[0]) : null;
+}
+
+function makeElement(doc, name, text) {
+  const el = doc.createElementNS(doc.documentElement.namespaceURI, name);
+  if (text !== undefined) el.textContent = text;
+  return el;
+}
+
+function makeClef(doc, sign, line) {
+  const clef = makeElement(doc, "clef");
+  clef.appendChild(makeElement(doc, "sign", sign));
+  clef.appendChild(makeElement(doc, "line", String(line)));
+  return clef;
+}
+
+function makeMove(doc, name, amount) {
+  const el = makeElement(doc, name);
+  el.appendChild(makeElement(doc, "duration", String(Math.round(amount * 1e6) / 1e6)));
+  return el;
+}
+
+// Same rules as SourceScore._trim_measure; m is edited in place.
+function trimMeasure(doc, m, divisions, lo, hi, hiInclusive, shift, dropTrailingRests) {
+  let pos = 0;
+  let lastOnset = 0;
+  const items = [];
+
+  for (const child of childElements(m)) {
+    const name = child.localName;
+    if (name === "note") {
+      const dur = childElements(child, "grace").length
+        ? 0
+        : Number(childText(child, "duration") || 0);
+      const isChord = childElements(child, "chord").length > 0;
+      const onset = isChord ? lastOnset : pos;
+      if (!isChord) {
+        pos += dur;
+        lastOnset = onset;
+      }
+      items.push({ kind: "note", child, onset, dur, isChord });
+    } else if (name === "backup") {
+      pos -= Number(childText(child, "duration") || 0);
+    } else if (name === "forward") {
+      pos += Number(childText(child, "duration") || 0);
+    } else if (name === "attributes") {
+      items.push({ kind: "attributes", child, onset: pos, dur: 0, isChord: false });
+    } else if (EXCERPT_POSITIONED_TAGS.has(name)) {
+      items.push({ kind: "positioned", child, onset: pos, dur: 0, isChord: false });
+    } else {
+      items.push({ kind: "fixed", child, onset: null, dur: 0, isChord: false });
+    }
+  }
+
+  const loDiv = lo === null ? null : lo * divisions;
+  const hiDiv = hi === null ? null : hi * divisions;
+  const shiftDiv = shift * divisions;
+
+  const inRange = (onset) => {
+    if (loDiv !== null && onset < loDiv - EXCERPT_EPS) return false;
+    if (hiDiv !== null) {
+      return hiInclusive ? onset <= hiDiv + EXCERPT_EPS : onset < hiDiv - EXCERPT_EPS;
+    }
+    return true;
+  };
+
+  let kept = items
+    .filter((it) => !(it.kind === "note" || it.kind === "positioned") || inRange(it.onset))
+    .map((it) => ({
+      ...it,
+      target: it.onset === null ? null : Math.max(0, it.onset - shiftDiv),
+    }));
+
+  const isRest = (it) => childElements(it.child, "rest").length > 0;
+
+  if (dropTrailingRests) {
+    let lastNoteEnd = 0;
+    for (const it of kept) {
+      if (it.kind === "note" && !isRest(it)) {
+        lastNoteEnd = Math.max(lastNoteEnd, it.target + it.dur);
+      }
+    }
+    if (lastNoteEnd > 0) {
+      kept = kept.filter(
+        (it) => !(it.kind === "note" && isRest(it) && it.target >= lastNoteEnd - EXCERPT_EPS)
+      );
+    }
+  }
+
+  while (m.firstChild) m.removeChild(m.firstChild);
+
+  let cursor = 0;
+  for (const it of kept) {
+    if (it.target !== null && !it.isChord) {
+      if (it.target > cursor + EXCERPT_EPS) {
+        m.appendChild(makeMove(doc, "forward", it.target - cursor));
+      } else if (it.target < cursor - EXCERPT_EPS) {
+        m.appendChild(makeMove(doc, "backup", cursor - it.target));
+      }
+      cursor = it.target;
+    }
+    m.appendChild(it.child);
+    if (it.kind === "note" && !it.isChord) cursor += it.dur;
+  }
+}
+
+function openingClef(doc, partIdx, m, state, clefMode) {
+  if (clefMode === "cadence") {
+    return partIdx < 2 ? makeClef(doc, "G", 2) : makeClef(doc, "F", 4);
+  }
+  if (partIdx === 2 || partIdx === 3) return makeClef(doc, "F", 4);
+
+  const attrs = childElements(m, "attributes")[0];
+  let clef = attrs ? childElements(attrs, "clef")[0] : null;
+  if (!clef && state.clef) clef = state.clef.cloneNode(true);
+  if (!clef && (partIdx === 0 || partIdx === 1)) clef = makeClef(doc, "G", 2);
+  return clef || null;
+}
+
+function injectAttributes(doc, m, state, clef) {
+  let attrs = null;
+  for (const child of childElements(m)) {
+    if (child.localName === "attributes") {
+      attrs = child;
+      break;
+    }
+    if (["note", "backup", "forward"].includes(child.localName)) break;
+  }
+  if (!attrs) {
+    attrs = makeElement(doc, "attributes");
+    m.insertBefore(attrs, m.firstChild);
+  }
+
+  const present = new Set(childElements(attrs).map((c) => c.localName));
+  if (!present.has("divisions") && state.divisions !== null) {
+    attrs.appendChild(makeElement(doc, "divisions", state.divisions));
+  }
+  for (const name of ["key", "time"]) {
+    if (!present.has(name) && state[name]) attrs.appendChild(state[name].cloneNode(true));
+  }
+  for (const c of childElements(attrs, "clef")) {
+    if (c !== clef) attrs.removeChild(c);
+  }
+  if (clef && clef.parentNode !== attrs) attrs.appendChild(clef);
+
+  const order = (c) => {
+    const i = EXCERPT_ATTRIBUTE_ORDER.indexOf(c.localName);
+    return i < 0 ? EXCERPT_ATTRIBUTE_ORDER.length : i;
+  };
+  childElements(attrs)
+    .map((c, i) => [c, i])
+    .sort((a, b) => order(a[0]) - order(b[0]) || a[1] - b[1])
+    .forEach(([c]) => attrs.appendChild(c));
+}
+
+// MusicXML text of one excerpt index record.
+function cutExcerpt(sourceDoc, record) {
+  const doc = sourceDoc.cloneNode(true);
+  const [startMeasure, startOffset] = record.start;
+  const [endMeasure, endOffset] = record.end;
+
+  childElements(doc.documentElement, "part").forEach((part, partIdx) => {
+    const state = { divisions: null, key: null, time: null, clef: null };
+    let first = true;
+
+    for (const m of childElements(part, "measure")) {
+      const num = parseMeasureNumber(m.getAttribute("number"));
+      const atStart = { ...state };
+      for (const attrs of childElements(m, "attributes")) {
+        for (const name of Object.keys(state)) {
+          const c = childElements(attrs, name)[0];
+          if (c) state[name] = name === "divisions" ? c.textContent : c;
+        }
+      }
+
+      if (num === null || num < startMeasure || num > endMeasure) {
+        part.removeChild(m);
+        continue;
+      }
+
+      const trimStart = num === startMeasure && startOffset > EXCERPT_EPS;
+      const trimEnd = num === endMeasure && endOffset !== null;
+      if (trimStart || trimEnd || first) {
+        let divisions = Number(atStart.divisions || 1);
+        for (const attrs of childElements(m, "attributes")) {
+          const d = childText(attrs, "divisions");
+          if (d) {
+            divisions = Number(d);
+            break;
+          }
+        }
+        trimMeasure(
+          doc,
+          m,
+          divisions,
+          trimStart ? startOffset : null,
+          trimEnd ? endOffset : null,
+          record.endInclusive,
+          trimStart ? startOffset : 0,
+          first && record.clef === "phrase"
+        );
+      }
+
+      if (first) {
+        injectAttributes(doc, m, atStart, openingClef(doc, partIdx, m, atStart, record.clef));
+        first = false;
+      }
+    }
+  });
+
+  const text = new XMLSerializer().serializeToString(doc);
+  // osmd.load() only treats strings starting with an XML declaration as content.
+  return text.startsWith("<?xml") ? text : `<?xml version="1.0" encoding="UTF-8"?>\n${text}`;
+}
+
+// MusicXML text for an indexed excerpt path, or null if the path is not virtual.
+async function renderExcerpt(path) {
+  const index = await getExcerptIndex();
+  if (!index) return null;
+
+  const record = index[path.replace(/^\.\//, "")];
+  if (!record) return null;
+
+  try {
+    return cutExcerpt(await loadExcerptSource(record.source), record);
+  } catch (e) {
+    console.warn("Excerpt render error:", path, e);
+    return null;
+  }
+}
+
+window.renderExcerpt = renderExcerpt;
@@ -144,7 +144,7 @@ window.initHarmonyPage = function () {
     }
 
     try {
-      await osmd.load(pathToLoad);
+      await osmd.load(await resolveScoreSource(pathToLoad));
       osmd.render();
 
       const svg = host.querySelector("svg");
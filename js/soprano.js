@@ -17,6 +17,12 @@ let sopranoShowFull       = false;
 
 let sopranoOsmd = null;
 
+// With the query API running, groups are listed from its summaries (first
+// phrase only) and each group's full record is fetched when it is opened.
+let sopranoFromApi = false;
+let sopranoRequest = 0;
+const sopranoGroupCache = new Map();
+
 function arraysEqual(a, b) {
   if (!Array.isArray(a) || !Array.isArray(b)) return false;
   if (a.length !== b.length) return false;
@@ -70,28 +76,58 @@ function extractRiemNumberFromTitle(title) {
   return Number(m[1]);
 }
 
-async function loadSopranoGroups() {
-  try {
-    const res  = await fetch("./data/soprano_groups.json");
-    const data = await res.json();
+async function fetchSopranoGroupsFile() {
+  const res  = await fetch("./data/soprano_groups.json");
+  const data = await res.json();
 
-    let groups = data.groups || [];
+  let groups = data.groups || [];
 
-    groups = groups.filter(g => {
-      const sizeFromField  = g.size || 0;
-      const sizeFromArray  = (g.phrases || []).length;
-      const size = sizeFromField || sizeFromArray;
-      return size > 1;
-    });
+  groups = groups.filter(g => {
+    const sizeFromField  = g.size || 0;
+    const sizeFromArray  = (g.phrases || []).length;
+    const size = sizeFromField || sizeFromArray;
+    return size > 1;
+  });
+
+  groups.sort(
+    (a, b) =>
+      (b.size || (b.phrases || []).length || 0) -
+      (a.size || (a.phrases || []).length || 0)
+  );
+  return groups;
+}
 
-    groups.sort(
-      (a, b) =>
-        (b.size || (b.phrases || []).length || 0) -
-        (a.size || (a.phrases || []).length || 0)
+// Summaries of groups with more than one phrase, largest first, or null
+// without the API.
+async function fetchApiSopranoGroups(params) {
+  const groups = await apiQueryAll("soprano", "soprano/groups", {
+    ...params,
+    min_size: 2,
+    limit: 500,
+  });
+  return groups && groups.map((g) => ({ ...g, phrases: [g.example], partial: true }));
+}
+
+async function fullSopranoGroup(g) {
+  if (!g.partial) return g;
+  if (!sopranoGroupCache.has(g.groupId)) {
+    sopranoGroupCache.set(
+      g.groupId,
+      apiQuery("soprano", `soprano/groups/${encodeURIComponent(g.groupId)}`)
     );
+  }
+  const group = await sopranoGroupCache.get(g.groupId);
+  if (!group) sopranoGroupCache.delete(g.groupId);
+  return group || g;
+}
+
+async function loadSopranoGroups() {
+  try {
+    const fromApi = await fetchApiSopranoGroups({});
+    sopranoFromApi = fromApi !== null;
 
-    allSopranoGroups      = groups;
-    filteredSopranoGroups = groups.slice();
+    allSopranoGroups      = fromApi || (await fetchSopranoGroupsFile());
+    filteredSopranoGroups = allSopranoGroups.slice();
     renderSopranoGroupList();
   } catch (err) {
     console.error("Failed to load soprano_groups.json", err);
@@ -99,12 +135,36 @@ async function loadSopranoGroups() {
   }
 }
 
-function applySopranoFilters() {
+async function applySopranoFilters() {
   const numValRaw = (sopranoSearchNumberEl?.value || "").trim();
   const titleVal  = (sopranoSearchTitleEl?.value || "").trim().toLowerCase();
 
   const numVal = numValRaw === "" ? null : Number(numValRaw);
 
+  // Only the latest keystroke may render; earlier answers are dropped.
+  const request = ++sopranoRequest;
+  if (sopranoFromApi) {
+    const fromApi = await fetchApiSopranoGroups({ number: numValRaw, title: titleVal });
+    if (request !== sopranoRequest) return;
+    if (fromApi) {
+      filteredSopranoGroups = fromApi;
+      renderSopranoGroupList();
+      return;
+    }
+
+    // The API stopped answering (or refused the query): filter the file here.
+    try {
+      const groups = await fetchSopranoGroupsFile();
+      if (request !== sopranoRequest) return;
+      sopranoFromApi   = false;
+      allSopranoGroups = groups;
+    } catch (err) {
+      console.error("Failed to load soprano_groups.json", err);
+      sopranoDetailEl.innerHTML = "<p>Data load error</p>";
+      return;
+    }
+  }
+
   let groups = allSopranoGroups.slice();
 
   if (numVal !== null || titleVal) {
@@ -176,16 +236,18 @@ function renderSopranoGroupList() {
       li.classList.add("active");
     }
 
-    li.addEventListener("click", () => {
+    li.addEventListener("click", async () => {
       selectedGroupId  = g.groupId;
       selectedPhraseId = first.id || null;
       currentPhraseForScore = first;
       sopranoShowFull = false;
 
       renderSopranoGroupList();
-      renderSopranoDetail(g, first);
       renderSopranoScore(first);
       updateSopranoToggleButton();
+
+      const group = await fullSopranoGroup(g);
+      if (selectedGroupId === g.groupId) renderSopranoDetail(group, first);
     });
 
     sopranoGroupListEl.appendChild(li);
@@ -201,9 +263,11 @@ function renderSopranoGroupList() {
       currentPhraseForScore = first;
       sopranoShowFull       = false;
       renderSopranoGroupList();
-      renderSopranoDetail(g0, first);
       renderSopranoScore(first);
       updateSopranoToggleButton();
+      fullSopranoGroup(g0).then((group) => {
+        if (selectedGroupId === g0.groupId) renderSopranoDetail(group, first);
+      });
     }
   }
 }
@@ -236,6 +300,17 @@ function renderSopranoDetail(group, phrase) {
       ", "
     )}</div>`
   );
+  // Present when soprano_index.py ran with --similarity.
+  if (group.clusterId) {
+    const related = allSopranoGroups.filter(
+      (g) => g.clusterId === group.clusterId && g.groupId !== group.groupId
+    );
+    rows.push(
+      `<div class="detail-row"><span class="detail-label">Similar groups:</span> ${
+        related.length
+      } (${group.clusterId}, similarity ${group.similarity ?? 1})</div>`
+    );
+  }
   rows.push(
     `<div class="detail-row"><span class="detail-label">Example:</span> ${phrase.title || ""} (${phrase.pieceId ||
       ""}, ${phrase.measures || ""})</div>`
@@ -323,7 +398,7 @@ async function renderSopranoScore(phrase) {
   }
 
   try {
-    await sopranoOsmd.load(xmlPath);
+    await sopranoOsmd.load(await resolveScoreSource(xmlPath));
     sopranoOsmd.render();
 
     const svg = host.querySelector("svg");
@@ -0,0 +1,619 @@
+import argparse
+import asyncio
+import json
+import mimetypes
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import cadence_meta
+import soprano_index
+from cadence_features import CADENCE_TYPES, SOPRANO_ROLES
+from melody_search import REPRESENTATIONS, MelodySearch, load_json
+from signatures import SignatureTable
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CHORALE_META_JSON = BASE_DIR / "data" / "chorales_meta.json"
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# Bounds on one melody query, so a request cannot make the server scan
+# (and verify) nearly every position of the index.
+MAX_QUERY_NOTES = 64
+MAX_EDITS = 3
+# Ranked hit lists kept for recent melody queries, so paging through one
+# query does not repeat the whole search for every page.
+MELODY_CACHE_SIZE = 64
+MAX_HEAD_BYTES = 16 * 1024
+KEEP_ALIVE_SECONDS = 15
+
+# Precompressed siblings written by release.py, in order of preference.
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+
+# Fields of a cadence in API responses; voices and signatures stay server-side.
+CADENCE_SUMMARY_FIELDS = [
+    "id",
+    "musicxml_path",
+    "source_musicxml",
+    "riemenschneider",
+    "bwv",
+    "chorale_title",
+    "key_original",
+    "time_signature",
+    "start_measure",
+    "end_measure",
+    "cadence_type",
+    "final_soprano_role",
+    "final_soprano_name",
+    "final_bass_name",
+]
+
+STATUS_TEXT = {
+    200: "OK",
+    206: "Partial Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def one(params: Dict[str, List[str]], name: str, default: str = "") -> str:
+    values = params.get(name)
+    return values[-1].strip() if values else default
+
+
+def int_param(params, name: str, default: Optional[int] = None) -> Optional[int]:
+    raw = one(params, name)
+    if raw == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+
+
+def number_list(params, name: str, cast=float) -> List:
+    raw = one(params, name)
+    if raw == "":
+        return []
+    try:
+        return [cast(x) for x in raw.split(",")]
+    except ValueError:
+        raise ApiError(400, f"{name} must be a comma-separated list of numbers")
+
+
+def paginate(items: list, params) -> dict:
+    """offset/limit slice of items, with the total for the client's pager."""
+    offset = max(int_param(params, "offset", 0), 0)
+    limit = min(max(int_param(params, "limit", DEFAULT_LIMIT), 0), MAX_LIMIT)
+    return {
+        "total": len(items),
+        "offset": offset,
+        "limit": limit,
+        "items": items[offset:offset + limit],
+    }
+
+
+def parse_key(key_original):
+    """("D", "minor") from "D minor", as parseKeyString in js/cadence.js."""
+    parts = (key_original or "").split()
+    root = parts[0] if parts else None
+    mode = parts[1].lower() if len(parts) > 1 else None
+    return root, mode
+
+
+class ChoraleCatalog:
+    """chorales_meta.json in Riemenschneider order, indexed by key and meter."""
+
+    def __init__(self, chorales: List[dict]):
+        self.chorales = sorted(
+            chorales, key=lambda ch: ch.get("riemenschneider") or ch.get("id") or 0
+        )
+        self.by_number = {}
+        self.by_key: Dict[str, List[int]] = {}
+        self.by_meter: Dict[str, List[int]] = {}
+        for i, ch in enumerate(self.chorales):
+            self.by_number[ch.get("riemenschneider") or ch.get("id")] = ch
+            self.by_key.setdefault(ch.get("key_original"), []).append(i)
+            self.by_meter.setdefault(ch.get("time_signature"), []).append(i)
+
+    def query(self, params) -> List[dict]:
+        """Same filters as applyFilter in js/chorale.js: number, title, key, meter."""
+        number = int_param(params, "number")
+        if number is not None:
+            ch = self.by_number.get(number)
+            rows = [self.chorales.index(ch)] if ch else []
+        else:
+            rows = range(len(self.chorales))
+
+        for name, index in (("key", self.by_key), ("meter", self.by_meter)):
+            value = one(params, name)
+            if value:
+                allowed = set(index.get(value, []))
+                rows = [i for i in rows if i in allowed]
+
+        title = one(params, "title").lower()
+        items = [self.chorales[i] for i in rows]
+        if title:
+            items = [ch for ch in items if title in (ch.get("title") or "").lower()]
+        return items
+
+
+class CadenceCatalog:
+    """
+    cadences_meta.json with the cadence page's group tables built in memory
+    (cadence_meta.build_group_tables). Key filters, which the tables do not
+    cover, regroup just the matching cadences.
+    """
+
+    def __init__(self, records: List[dict]):
+        self.records = records
+        self.by_id = {r["id"]: r for r in records}
+        self.signatures = SignatureTable.from_records(records)
+        self.tables = cadence_meta.build_group_tables(records, self.signatures)["tables"]
+
+    def summary(self, record: dict) -> dict:
+        return {f: record.get(f) for f in CADENCE_SUMMARY_FIELDS}
+
+    def groups(self, params) -> List[dict]:
+        type_filter = one(params, "type")
+        role_filter = one(params, "role")
+        key_mode = one(params, "key_mode").lower()
+        key_root = one(params, "key_root")
+        sort = one(params, "sort", "default")
+
+        if type_filter and type_filter not in CADENCE_TYPES:
+            raise ApiError(400, f"type must be one of {CADENCE_TYPES}")
+        if role_filter and role_filter not in SOPRANO_ROLES:
+            raise ApiError(400, f"role must be one of {SOPRANO_ROLES}")
+        if sort not in cadence_meta.GROUP_SORTS:
+            raise ApiError(400, f"sort must be one of {cadence_meta.GROUP_SORTS}")
+
+        table = self.tables[f"{type_filter}|{role_filter}"]
+        if key_mode or key_root:
+            rows = [
+                i for g in table["groups"] for i in g
+                if self.matches_key(self.records[i], key_mode, key_root)
+            ]
+            rows.sort()
+            groups = cadence_meta.group_cadences(self.records, rows, self.signatures)
+            order = cadence_meta.group_orders(self.records, groups, self.signatures)[sort]
+        else:
+            groups = table["groups"]
+            order = table["orders"][sort]
+
+        return [
+            {
+                "groupId": "grp_" + str(g).zfill(4),
+                "size": len(groups[g]),
+                "cadences": [self.summary(self.records[i]) for i in groups[g]],
+            }
+            for g in order
+        ]
+
+    @staticmethod
+    def matches_key(record, key_mode, key_root) -> bool:
+        root, mode = parse_key(record.get("key_original"))
+        if key_mode and mode != key_mode:
+            return False
+        if key_root and root != key_root:
+            return False
+        return True
+
+
+RIEM_LABEL = re.compile(r"^(\d+)\s*\.")
+
+
+def group_size(group: dict) -> int:
+    return group.get("size") or len(group.get("phrases", []))
+
+
+def phrase_matches(phrase: dict, number: Optional[int], title: str) -> bool:
+    """extractRiemNumberFromTitle and the title search of js/soprano.js."""
+    label = phrase.get("title") or ""
+    if number is not None:
+        m = RIEM_LABEL.match(label)
+        if not m or int(m.group(1)) != number:
+            return False
+    return title in label.lower()
+
+
+class SopranoCatalog:
+    """soprano_groups.json, indexed by group id and by chorale."""
+
+    def __init__(self, data: dict):
+        self.groups = data.get("groups", [])
+        self.signatures = SignatureTable.from_json(data.get("signatures", []))
+        self.by_id = {g["groupId"]: g for g in self.groups}
+        self.by_piece: Dict[str, List[int]] = {}
+        for i, g in enumerate(self.groups):
+            for phrase in g.get("phrases", []):
+                rows = self.by_piece.setdefault(phrase.get("pieceId"), [])
+                if not rows or rows[-1] != i:
+                    rows.append(i)
+
+    def summary(self, group: dict) -> dict:
+        first = group["phrases"][0] if group.get("phrases") else {}
+        return {
+            "groupId": group["groupId"],
+            "size": group_size(group),
+            "clusterId": group.get("clusterId"),
+            "intervals": group.get("intervals"),
+            "durations": group.get("durations"),
+            "example": first,
+        }
+
+    def query(self, params) -> List[dict]:
+        """
+        Group summaries, largest first. number and title match a phrase's
+        "<riem>. <title>" label as the soprano page's search boxes do.
+        """
+        piece = one(params, "piece")
+        number = int_param(params, "number")
+        title = one(params, "title").lower()
+        cluster = one(params, "cluster")
+        min_size = int_param(params, "min_size", 1)
+        rows = self.by_piece.get(piece, []) if piece else range(len(self.groups))
+
+        found = []
+        for i in rows:
+            group = self.groups[i]
+            if group_size(group) < min_size:
+                continue
+            if cluster and group.get("clusterId") != cluster:
+                continue
+            if (number is not None or title) and not any(
+                phrase_matches(ph, number, title) for ph in group.get("phrases", [])
+            ):
+                continue
+            found.append(group)
+
+        found.sort(key=group_size, reverse=True)
+        return [self.summary(g) for g in found]
+
+
+class Datasets:
+    """
+    Every dataset the API serves, loaded once at startup. A missing file
+    leaves its dataset as None; its endpoints then answer 503 and the
+    pages keep using the static JSON.
+    """
+
+    def __init__(self):
+        self.chorales = self._load("chorales", lambda: ChoraleCatalog(load_json(CHORALE_META_JSON)))
+        self.melody = self._load("melody", MelodySearch.load)
+        self.cadences = self._load(
+            "cadences", lambda: CadenceCatalog(load_json(cadence_meta.OUT_JSON))
+        )
+        self.soprano = self._load(
+            "soprano", lambda: SopranoCatalog(load_json(soprano_index.OUTPUT_JSON))
+        )
+
+    @staticmethod
+    def _load(name, loader):
+        t0 = time.perf_counter()
+        try:
+            dataset = loader()
+        except (OSError, ValueError) as e:
+            print(f"  {name}: unavailable ({e})")
+            return None
+        print(f"  {name}: loaded in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        return dataset
+
+    def need(self, name: str):
+        dataset = getattr(self, name)
+        if dataset is None:
+            raise ApiError(503, f"{name} data is not loaded")
+        return dataset
+
+    def status(self) -> dict:
+        return {
+            name: getattr(self, name) is not None
+            for name in ("chorales", "melody", "cadences", "soprano")
+        }
+
+
+@lru_cache(maxsize=MELODY_CACHE_SIZE)
+def ranked_melody_hits(search: MelodySearch, pitches, durations, mode, k, representation):
+    """Every hit of one melody query, ranked; shared by all its pages."""
+    if mode == "approximate":
+        return search.find_approximate(
+            list(pitches),
+            list(durations),
+            k=k,
+            representation=representation,
+            limit=0,
+        )
+    return search.find(list(pitches), list(durations), mode)
+
+
+def melody_hits(search: MelodySearch, params) -> dict:
+    pitches = number_list(params, "pitches", int)
+    durations = number_list(params, "durations") or [1.0] * len(pitches)
+    mode = one(params, "mode", "relative")
+
+    if len(pitches) < 2:
+        raise ApiError(400, "pitches needs at least two notes")
+    if len(pitches) > MAX_QUERY_NOTES:
+        raise ApiError(400, f"pitches allows at most {MAX_QUERY_NOTES} notes")
+    if len(durations) != len(pitches):
+        raise ApiError(400, "durations must have one value per pitch")
+
+    k, representation = None, None
+    if mode == "approximate":
+        representation = one(params, "representation", "diatonic")
+        if representation not in REPRESENTATIONS:
+            raise ApiError(400, f"representation must be one of {sorted(REPRESENTATIONS)}")
+        k = int_param(params, "k", 1)
+        if not 0 <= k <= MAX_EDITS:
+            raise ApiError(400, f"k must be between 0 and {MAX_EDITS}")
+    elif mode not in ("relative", "absolute"):
+        raise ApiError(400, "mode must be relative, absolute or approximate")
+
+    hits = ranked_melody_hits(
+        search, tuple(pitches), tuple(durations), mode, k, representation
+    )
+    return paginate(hits, params)
+
+
+def route(data: Datasets, path: str, params) -> dict:
+    """Answer one /api/ request; raises ApiError for anything else."""
+    parts = [unquote(p) for p in path.strip("/").split("/")[1:]]
+
+    if parts == ["status"]:
+        return data.status()
+
+    if parts == ["chorales"]:
+        return paginate(data.need("chorales").query(params), params)
+    if len(parts) == 2 and parts[0] == "chorales":
+        try:
+            chorale = data.need("chorales").by_number.get(int(parts[1]))
+        except ValueError:
+            chorale = None
+        if chorale is None:
+            raise ApiError(404, f"no chorale {parts[1]}")
+        return chorale
+
+    if parts == ["melody"]:
+        return melody_hits(data.need("melody"), params)
+
+    if parts == ["cadences", "groups"]:
+        return paginate(data.need("cadences").groups(params), params)
+    if len(parts) == 2 and parts[0] == "cadences":
+        record = data.need("cadences").by_id.get(parts[1])
+        if record is None:
+            raise ApiError(404, f"no cadence {parts[1]}")
+        return record
+
+    if parts == ["soprano", "groups"]:
+        return paginate(data.need("soprano").query(params), params)
+    if len(parts) == 3 and parts[:2] == ["soprano", "groups"]:
+        group = data.need("soprano").by_id.get(parts[2])
+        if group is None:
+            raise ApiError(404, f"no soprano group {parts[2]}")
+        return group
+
+    raise ApiError(404, f"unknown endpoint {path}")
+
+
+def parse_range(header: str, size: int):
+    """(start, end) of a single "bytes=a-b" range, end exclusive; None to send everything."""
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].partition("-")
+    try:
+        if first == "":
+            start, end = max(size - int(last), 0), size
+        else:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        return None
+    if start >= end:
+        raise ApiError(416, "range not satisfiable")
+    return start, end
+
+
+def accepted_encodings(header: str) -> set:
+    """Codings an Accept-Encoding header allows (q=0 entries excluded)."""
+    codings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            codings.add(name.strip().lower())
+    return codings
+
+
+def precompressed(target: Path, accept_encoding: str):
+    """(coding, sibling path) of a release.py sibling the client accepts, or None."""
+    codings = accepted_encodings(accept_encoding)
+    for coding, suffix in PRECOMPRESSED:
+        sibling = target.with_name(target.name + suffix)
+        if coding in codings and sibling.is_file():
+            return coding, sibling
+    return None
+
+
+def read_static(root: Path, path: str, range_header: str, accept_encoding: str = ""):
+    """
+    (status, content type, body, extra headers) of a file under root.
+    Whole-file requests get a precompressed .br/.gz sibling when there is
+    one and the client accepts it; ranges are always read from the file.
+    """
+    target = (root / unquote(path).lstrip("/")).resolve()
+    if target != root and root not in target.parents:
+        raise ApiError(404, "not found")
+    if target.is_dir():
+        target = target / "index.html"
+    if not target.is_file():
+        raise ApiError(404, "not found")
+
+    content_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+    size = target.stat().st_size
+    span = parse_range(range_header, size) if range_header else None
+
+    if span is None:
+        found = precompressed(target, accept_encoding)
+        if found:
+            coding, sibling = found
+            return 200, content_type, sibling.read_bytes(), {
+                "Content-Encoding": coding,
+                "Vary": "Accept-Encoding",
+            }
+
+    with target.open("rb") as f:
+        if span is None:
+            return 200, content_type, f.read(), {"Accept-Ranges": "bytes"}
+        start, end = span
+        f.seek(start)
+        body = f.read(end - start)
+    return 206, content_type, body, {
+        "Accept-Ranges": "bytes",
+        "Content-Range": f"bytes {start}-{end - 1}/{size}",
+    }
+
+
+class ApiServer:
+    """
+    Minimal HTTP/1.1 server on asyncio streams: /api/ paths are answered
+    from the in-memory datasets as JSON, everything else is served from the
+    site folder, so the pages work unchanged behind it.
+    """
+
+    def __init__(self, data: Datasets, root: Path = BASE_DIR):
+        self.data = data
+        self.root = root.resolve()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS
+                    )
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, 431, "text/plain", b"request head too large", {}, False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+
+                keep_alive = await self.respond(writer, head.decode("latin-1"))
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, head: str) -> bool:
+        lines = head.split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self.send(writer, 400, "text/plain", b"bad request line", {}, False)
+            return False
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = (
+            version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        )
+
+        url = urlsplit(target)
+        extra = {}
+        try:
+            if method not in ("GET", "HEAD"):
+                raise ApiError(405, f"{method} not allowed")
+            if url.path == "/api" or url.path.startswith("/api/"):
+                # Melody searches take tens of milliseconds; keep them off the loop.
+                result = await asyncio.to_thread(
+                    route, self.data, url.path, parse_qs(url.query)
+                )
+                status, content_type = 200, "application/json; charset=utf-8"
+                body = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                extra["Access-Control-Allow-Origin"] = "*"
+            else:
+                status, content_type, body, extra = await asyncio.to_thread(
+                    read_static,
+                    self.root,
+                    url.path,
+                    headers.get("range", ""),
+                    headers.get("accept-encoding", ""),
+                )
+        except ApiError as e:
+            status, content_type = e.status, "application/json; charset=utf-8"
+            body = json.dumps({"error": e.message}).encode("utf-8")
+        except Exception as e:
+            print(f"  {method} {target} failed: {e!r}")
+            status, content_type = 500, "application/json; charset=utf-8"
+            body = json.dumps({"error": "internal error"}).encode("utf-8")
+
+        await self.send(
+            writer, status, content_type, b"" if method == "HEAD" else body, extra, keep_alive,
+            length=len(body),
+        )
+        return keep_alive
+
+    @staticmethod
+    async def send(writer, status, content_type, body, extra, keep_alive, length=None):
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body) if length is None else length}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{k}: {v}" for k, v in extra.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, root: Path = BASE_DIR):
+    print("Loading datasets...")
+    server = ApiServer(Datasets(), root)
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEAD_BYTES)
+    print(f"Serving {server.root} on http://{host}:{port}/ (API under /api/)")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the site with a query API over in-memory indexes."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=BASE_DIR,
+        help="site folder to serve (e.g. dist/ from release.py for precompressed files)",
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.root))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
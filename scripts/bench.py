@@ -0,0 +1,383 @@
+from pathlib import Path
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import music21
+from music21 import corpus
+
+import cadence_meta
+import cadences
+import export_notes
+import extract_phrases
+import melody_index
+import score_cache
+import soprano_index
+import structure_index
+from melody_search import MelodySearch
+from score_cache import parse_corpus, parse_file
+from signatures import SignatureTable
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = BASE_DIR / "bench"
+# Local to each machine (baselines are per host), so it is not committed.
+HISTORY_JSONL = BENCH_DIR / "history.jsonl"
+
+# Chorales in the default (subset) run, spread evenly over the Riemenschneider order.
+SUBSET_SIZE = 12
+# Runs of each query; their median is the query's latency.
+QUERY_REPEAT = 5
+# Melody queries are cut from the soprano of every Nth chorale.
+QUERY_EVERY = 60
+QUERY_NOTES = 8
+
+# A benchmark regresses when it is slower than the median of its last
+# BASELINE_RUNS recorded results (same scope and host) by more than the
+# tolerance, and by at least MIN_REGRESSION_SECONDS (timer noise).
+BASELINE_RUNS = 5
+QUERY_SCOPE = "queries"
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.005
+
+
+class Bench:
+    """Wall-time samples per benchmark name; stage output is silenced while timed."""
+
+    def __init__(self):
+        self.samples = {}
+        self.kinds = {}
+
+    def time(self, name: str, kind: str, func, *args, **kwargs):
+        out = io.StringIO()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(out):
+            result = func(*args, **kwargs)
+        self.samples.setdefault(name, []).append(time.perf_counter() - t0)
+        self.kinds[name] = kind
+        return result
+
+    def results(self) -> dict:
+        out = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            out[name] = {
+                "kind": self.kinds[name],
+                "n": len(samples),
+                "total": round(sum(samples), 6),
+                "median": round(statistics.median(samples), 6),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+                "min": round(ordered[0], 6),
+            }
+        return out
+
+
+def metric(stats: dict) -> float:
+    """What a regression is judged on: a stage's total time, a query's median latency."""
+    return stats["total"] if stats["kind"] == "stage" else stats["median"]
+
+
+def select_chorales(full: bool, size: int = SUBSET_SIZE):
+    """Chorale records that have a score in xml/scores; every one, or an even spread of size."""
+    with cadence_meta.CHORALE_META_JSON.open(encoding="utf-8") as f:
+        records = json.load(f)
+
+    chorales = sorted(
+        (
+            ch for ch in records
+            if ch.get("musicxml_path") and (BASE_DIR / ch["musicxml_path"]).exists()
+        ),
+        key=lambda ch: ch.get("riemenschneider") or 0,
+    )
+    if full or len(chorales) <= size:
+        return chorales
+    step = len(chorales) / size
+    return [chorales[int(i * step)] for i in range(size)]
+
+
+def bench_stages(bench: Bench, chorales):
+    """
+    The build pipeline, one chorale at a time. Stage outputs are not
+    written; the score cache goes to a temporary folder, so every run
+    times a cache miss (.cold) and a hit (.warm) of each parse.
+    """
+    cache_dir = score_cache.CACHE_DIR
+    with tempfile.TemporaryDirectory(prefix="bench-cache-") as tmp:
+        score_cache.CACHE_DIR = Path(tmp)
+        try:
+            run_stages(bench, chorales)
+        finally:
+            score_cache.CACHE_DIR = cache_dir
+
+
+def run_stages(bench: Bench, chorales):
+    chorale_meta_map = cadence_meta.build_chorale_meta_map(chorales)
+    structures = {}
+    phrase_entries = []
+    notes_records = []
+
+    for n, ch in enumerate(chorales, 1):
+        score_path = BASE_DIR / ch["musicxml_path"]
+        stem = score_path.stem
+        print(f"  [{n}/{len(chorales)}] {stem}")
+
+        # forceSource: music21's own pickle cache would make this a warm read.
+        corpus_score = bench.time(
+            "corpus.parse", "stage", corpus.parse, ch["corpus_path"], forceSource=True
+        )
+        bench.time("score_cache.parse_corpus.cold", "stage", parse_corpus, ch["corpus_path"])
+        bench.time("score_cache.parse_corpus.warm", "stage", parse_corpus, ch["corpus_path"])
+        bench.time(
+            "export_notes.extract_parts_notes", "stage",
+            export_notes.extract_parts_notes, corpus_score,
+        )
+
+        structure = bench.time(
+            "structure_index.build_structure", "stage",
+            structure_index.build_structure, score_path,
+        )
+        structures[stem] = structure
+        bench.time("score_cache.parse_file.cold", "stage", parse_file, score_path)
+        score = bench.time("score_cache.parse_file.warm", "stage", parse_file, score_path)
+        bench.time(
+            "extract_phrases.process_score", "stage",
+            extract_phrases.process_score, score, structure, write=False,
+        )
+        bench.time(
+            "cadences.process_score", "stage",
+            cadences.process_score, score, structure, write=False,
+        )
+
+        for path in sorted(cadence_meta.CADENCE_DIR.glob(f"{stem}_cad*.musicxml")):
+            bench.time(
+                "cadence_meta.process_cadence_file", "stage",
+                cadence_meta.process_cadence_file, path, chorale_meta_map, structures,
+            )
+
+        for path in sorted(soprano_index.PHRASE_DIR.glob(f"{stem}_phrase*.musicxml")):
+            phrase_score = parse_file(path)
+            entry = bench.time(
+                "soprano_index.extract_phrase_entry", "stage",
+                soprano_index.extract_phrase_entry, path, phrase_score,
+            )
+            if entry is not None:
+                phrase_entries.append(entry)
+
+        notes_path = melody_index.AUDIO_NOTES_DIR / export_notes.notes_filename_for(ch.get("bwv"))
+        if notes_path.exists():
+            with notes_path.open(encoding="utf-8") as f:
+                notes_records.append(json.load(f))
+
+    bench.time(
+        "soprano_index.group_phrase_entries", "stage",
+        soprano_index.group_phrase_entries, phrase_entries,
+    )
+
+    entries = []
+    for record in notes_records:
+        entry = bench.time("melody_index.build_entry", "stage", melody_index.build_entry, record)
+        if entry is not None:
+            entries.append(entry)
+    bench.time(
+        "melody_index.build_search_index", "stage", melody_index.build_search_index, entries
+    )
+
+
+def melody_queries(search: MelodySearch):
+    """(pitches, durations) of the opening notes of every QUERY_EVERY-th chorale's top voice."""
+    queries = []
+    for entry in search.entries[::QUERY_EVERY]:
+        part = entry["parts"][0]
+        if len(part["pitches"]) >= QUERY_NOTES:
+            queries.append((part["pitches"][:QUERY_NOTES], part["durations"][:QUERY_NOTES]))
+    return queries
+
+
+def bench_queries(bench: Bench, repeat: int = QUERY_REPEAT):
+    """Melody search and cadence grouping over the full generated indexes."""
+    if melody_index.OUTPUT_PATH.exists():
+        search = bench.time("melody_search.load", "query", MelodySearch.load)
+        queries = melody_queries(search)
+        for _ in range(repeat):
+            for pitches, durations in queries:
+                bench.time("melody_search.find.relative", "query", search.find, pitches, durations)
+                bench.time(
+                    "melody_search.find.absolute", "query",
+                    search.find, pitches, durations, "absolute",
+                )
+                bench.time(
+                    "melody_search.find_approximate.diatonic", "query",
+                    search.find_approximate, pitches, durations, k=1,
+                )
+                bench.time(
+                    "melody_search.find_approximate.contour", "query",
+                    search.find_approximate, pitches, durations, k=2, representation="contour",
+                )
+    else:
+        print("Melody index not found, skipping melody queries:", melody_index.OUTPUT_PATH)
+
+    if cadence_meta.OUT_JSON.exists():
+        with cadence_meta.OUT_JSON.open(encoding="utf-8") as f:
+            records = json.load(f)
+        table = SignatureTable.from_records(records)
+        rows = range(len(records))
+        major = [i for i in rows if (records[i].get("key_original") or "").endswith("major")]
+        for _ in range(repeat):
+            bench.time(
+                "cadence_meta.group_cadences.all", "query",
+                cadence_meta.group_cadences, records, rows, table,
+            )
+            groups = bench.time(
+                "cadence_meta.group_cadences.major", "query",
+                cadence_meta.group_cadences, records, major, table,
+            )
+            bench.time(
+                "cadence_meta.group_orders.major", "query",
+                cadence_meta.group_orders, records, groups, table,
+            )
+        bench.time(
+            "cadence_meta.build_group_tables", "query",
+            cadence_meta.build_group_tables, records, table,
+        )
+    else:
+        print("Cadence metadata not found, skipping cadence queries:", cadence_meta.OUT_JSON)
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def load_history(path: Path = HISTORY_JSONL):
+    if not path.exists():
+        return []
+    runs = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                runs.append(json.loads(line))
+    return runs
+
+
+def append_history(run: dict, path: Path = HISTORY_JSONL):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False, separators=(",", ":")) + "\n")
+    print("Recorded run in", path)
+
+
+def result_scope(run: dict, stats: dict) -> str:
+    """
+    Scope a result is compared within: stages by the chorales they ran on,
+    queries always as "queries" (they do not depend on the stage subset).
+    """
+    return QUERY_SCOPE if stats["kind"] == "query" else run.get("scope")
+
+
+def baselines(history, run: dict, runs: int = BASELINE_RUNS) -> dict:
+    """Per benchmark, the median metric of its last `runs` comparable results."""
+    scopes = {name: result_scope(run, stats) for name, stats in run["results"].items()}
+    values = {}
+    for r in history:
+        if r.get("host") != run["host"]:
+            continue
+        for name, stats in r.get("results", {}).items():
+            if name in scopes and result_scope(r, stats) == scopes[name]:
+                values.setdefault(name, []).append(metric(stats))
+    return {name: statistics.median(v[-runs:]) for name, v in values.items()}
+
+
+def compare(run: dict, base: dict, tolerance: float):
+    """Print each benchmark against its baseline; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':44} {'n':>5} {'time':>10} {'baseline':>10} {'change':>8}")
+    for name, stats in run["results"].items():
+        value = metric(stats)
+        line = f"{name:44} {stats['n']:>5} {value * 1000:>8.1f}ms"
+        if name in base and base[name] > 0:
+            change = value / base[name] - 1
+            line += f" {base[name] * 1000:>8.1f}ms {change:>+7.0%}"
+            if change > tolerance and value - base[name] >= MIN_REGRESSION_SECONDS:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the build stages and the query paths, and compare with earlier runs."
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help=f"run the stages over every chorale instead of a fixed subset of {SUBSET_SIZE}",
+    )
+    parser.add_argument(
+        "--only",
+        choices=["stages", "queries"],
+        help="run just the build stages or just the queries",
+    )
+    parser.add_argument("--repeat", type=int, default=QUERY_REPEAT, help="runs of each query")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="allowed slowdown over the baseline before a benchmark counts as a "
+        f"regression (default {DEFAULT_TOLERANCE})",
+    )
+    parser.add_argument("--no-record", action="store_true", help=f"do not append to {HISTORY_JSONL.name}")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    bench = Bench()
+    scope = "full" if args.full else "subset"
+    chorales = []
+
+    if args.only != "queries":
+        chorales = select_chorales(args.full)
+        print(f"Benchmarking build stages on {len(chorales)} chorales ({scope})")
+        bench_stages(bench, chorales)
+    if args.only != "stages":
+        print("Benchmarking queries")
+        bench_queries(bench, args.repeat)
+
+    run = {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "scope": scope if args.only != "queries" else QUERY_SCOPE,
+        "chorales": len(chorales),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "music21": music21.VERSION_STR,
+        "tolerance": args.tolerance,
+        "results": bench.results(),
+    }
+
+    regressions = compare(run, baselines(load_history(), run), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+
+    if not args.no_record:
+        append_history(run)
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
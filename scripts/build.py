@@ -0,0 +1,578 @@
+import argparse
+import io
+import json
+from functools import partial
+from pathlib import Path
+
+from music21 import corpus
+from music21.corpus.chorales import ChoraleListRKBWV
+
+import bass
+import blank_scores
+import build_meta
+import cadence_features
+import cadence_meta
+import cadences
+import excerpts
+import export_musicxml
+import export_notes
+import extract_phrases
+import instrument
+import manifest
+import melody_index
+import pickup_beats
+import release
+import soprano_index
+import structure_index
+from parallel import add_jobs_argument, run_jobs
+from score_cache import parse_corpus, parse_file
+from signatures import SignatureTable
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SCORES_DIR = BASE_DIR / "xml" / "scores"
+
+CORPUS_STAGE_SCRIPTS = [
+    "build.py",
+    "build_meta.py",
+    "export_musicxml.py",
+    "export_notes.py",
+    "melody_index.py",
+    "jsonstream.py",
+    "notes_binary.py",
+    "score_cache.py",
+]
+SCORE_STAGE_SCRIPTS = [
+    "build.py",
+    "structure_index.py",
+    "pickup_beats.py",
+    "cadences.py",
+    "cadence_meta.py",
+    "cadence_features.py",
+    "sonority.py",
+    "extract_phrases.py",
+    "soprano_index.py",
+    "phrase_clusters.py",
+    "signatures.py",
+    "jsonstream.py",
+    "bass.py",
+    "blank_scores.py",
+    "score_cache.py",
+    "xml_notes.py",
+    "xml_slice.py",
+    "excerpts.py",
+]
+
+
+def load_json(path: Path, default):
+    if not path.exists():
+        return default
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_corpus_group(group, export_xml: bool, notes_format: str = "json"):
+    """
+    One corpus parse feeds the metadata record, the optional MusicXML
+    export and the audio_notes file(s) with its melody index entry.
+    group holds every (riem_num, info) sharing one BWV file, in Riemenschneider
+    order, so shared outputs are written in the same order as a serial run.
+    """
+    bwv = group[0][1].get("bwv")
+    with instrument.stage("corpus", f"bwv{bwv}"):
+        result = build_corpus_chorales(group, bwv, export_xml, notes_format)
+        instrument.add_outputs(result["outputs"])
+    return result
+
+
+def build_corpus_chorales(group, bwv, export_xml: bool, notes_format: str):
+    result = {"ok": False, "chorales": [], "outputs": []}
+
+    try:
+        with instrument.phase("parse"):
+            score = parse_corpus(f"bach/bwv{bwv}")
+    except Exception as e:
+        for riem_num, info in group:
+            print(f"Error: R{riem_num} BWV{bwv} {info.get('title')} -> {e}")
+        return result
+
+    result["ok"] = True
+
+    for riem_num, info in group:
+        try:
+            record = build_meta.build_record(riem_num, info, score)
+
+            if export_xml:
+                out_path = SCORES_DIR / Path(record["musicxml_path"]).name
+                with instrument.phase("write"):
+                    export_musicxml.export_chorale(record, score, out_path)
+                result["outputs"].append(out_path)
+
+            notes_name = export_notes.notes_filename_for(bwv)
+            notes_obj = export_notes.build_notes_record(record, score)
+            melody_entry = None
+
+            if notes_obj is None:
+                print(f"Warning R{riem_num}: BWV{bwv} has no parts data")
+            else:
+                with instrument.phase("write"):
+                    result["outputs"].extend(
+                        export_notes.save_notes_outputs(notes_obj, bwv, notes_format)
+                    )
+                melody_entry = melody_index.build_entry(notes_obj)
+
+        except Exception as e:
+            print(f"Error: R{riem_num} BWV{bwv} {info.get('title')} -> {e}")
+            result["ok"] = False
+            continue
+
+        result["chorales"].append((riem_num, record, notes_name, melody_entry))
+        print(f"OK: R{riem_num} BWV{bwv} {info.get('title')}")
+
+    return result
+
+
+def corpus_group_inputs(group):
+    corpus_file = corpus.getWork(f"bach/bwv{group[0][1].get('bwv')}")
+    if isinstance(corpus_file, list):
+        corpus_file = corpus_file[0]
+    return {
+        "corpus": manifest.file_hash(corpus_file),
+        "chorales": manifest.json_hash(
+            [[riem_num, dict(info)] for riem_num, info in group]
+        ),
+    }
+
+
+def build_corpus_stage(
+    export_xml: bool, notes_format: str, jobs: int, build_manifest, force: bool
+):
+    riem_dict = ChoraleListRKBWV().byRiemenschneider
+    print(f"Chorales found: {len(riem_dict)}")
+
+    groups = {}
+    for riem_num in sorted(riem_dict.keys()):
+        info = riem_dict[riem_num]
+        groups.setdefault(str(info.get("bwv")), []).append((riem_num, info))
+
+    version = manifest.scripts_version(
+        CORPUS_STAGE_SCRIPTS, f"export_xml={export_xml};notes_format={notes_format}"
+    )
+    keys = {bwv: f"corpus/bwv{bwv}" for bwv in groups}
+    inputs = {bwv: corpus_group_inputs(group) for bwv, group in groups.items()}
+
+    aggregates = [build_meta.OUTPUT_PATH, melody_index.OUTPUT_PATH]
+    stale = [
+        bwv
+        for bwv in groups
+        if force or not manifest.is_fresh(build_manifest, keys[bwv], inputs[bwv], version)
+    ]
+    if stale and not all(p.exists() for p in aggregates):
+        stale = list(groups)
+
+    gone = [
+        key
+        for key in manifest.units_with_prefix(build_manifest, "corpus/")
+        if key not in keys.values()
+    ]
+
+    if not stale and not gone:
+        print("Corpus stage up to date.")
+        return load_json(build_meta.OUTPUT_PATH, [])
+
+    print(f"Rebuilding {len(stale)} of {len(groups)} corpus chorales.")
+
+    group_results = run_jobs(
+        partial(build_corpus_group, export_xml=export_xml, notes_format=notes_format),
+        [groups[bwv] for bwv in stale],
+        jobs,
+    )
+
+    rebuilt = set(stale) | {key[len("corpus/bwv"):] for key in gone}
+    records = {}
+    melody_entries = {}
+
+    if len(stale) < len(groups):
+        for record in load_json(build_meta.OUTPUT_PATH, []):
+            if str(record.get("bwv")) not in rebuilt:
+                records[record["riemenschneider"]] = record
+        for entry in load_json(melody_index.OUTPUT_PATH, []):
+            if str(entry.get("bwv")) not in rebuilt:
+                melody_entries[export_notes.notes_filename_for(entry["bwv"])] = entry
+
+    for result in group_results:
+        for riem_num, record, notes_name, melody_entry in result["chorales"]:
+            records[riem_num] = record
+            if melody_entry is not None:
+                melody_entries[notes_name] = melody_entry
+
+    records = [records[k] for k in sorted(records)]
+    melody_entries = [melody_entries[k] for k in sorted(melody_entries)]
+    with instrument.stage("corpus.aggregate"):
+        build_meta.save_records(records)
+        melody_index.save_entries(melody_entries)
+        melody_index.save_search_index(melody_index.build_search_index(melody_entries))
+        instrument.add_outputs(aggregates + [melody_index.SEARCH_INDEX_PATH])
+
+    for bwv, result in zip(stale, group_results):
+        if result["ok"]:
+            manifest.record_unit(
+                build_manifest, keys[bwv], inputs[bwv], version, result["outputs"]
+            )
+    for key in gone:
+        manifest.drop_unit(build_manifest, key)
+
+    return records
+
+
+def build_score_chorale(path: Path, chorale_meta_map: dict, virtual_excerpts: bool = False):
+    """
+    Parse one xml/scores chorale and run every per-score producer on it.
+    Fermatas, bar lengths, pickup and first onset are read once into the
+    chorale's structure index entry, and every producer slices from it.
+    Returns plain data for the aggregate outputs and the build manifest:
+      {"ok": bool, "structure": ChoraleStructure, "pickup": float,
+       "cadences": [(name, record)], "phrases": [(name, entry)],
+       "excerpts": [(excerpt path, record)], "outputs": [Path]}
+    ok is False unless the parse and every producer succeeded, so a partly
+    built chorale is not recorded as fresh and is rebuilt on the next run.
+    With virtual_excerpts the cadence and phrase files are not written;
+    their excerpt index records are returned instead and cadence voices are
+    read from the excerpt as excerpts.py will render it.
+    """
+    print(f"Processing: {path.name}")
+    result = {
+        "ok": False,
+        "structure": None,
+        "pickup": None,
+        "cadences": [],
+        "phrases": [],
+        "excerpts": [],
+        "outputs": [],
+    }
+
+    stem = path.stem
+    try:
+        with instrument.stage("score.parse", stem), instrument.phase("parse"):
+            score = parse_file(path)
+            structure = structure_index.build_structure(path)
+    except Exception as e:
+        print("  Parse failed:", e)
+        return result
+
+    result["ok"] = True
+    result["structure"] = structure
+    result["pickup"] = structure.pickup
+
+    if virtual_excerpts:
+        with instrument.stage("score.excerpts", stem):
+            try:
+                result["excerpts"] = excerpts.excerpt_records(path, structure)
+            except Exception as e:
+                print(f"  Excerpt index failed: {e}")
+                result["ok"] = False
+
+    with instrument.stage("score.cadences", stem):
+        try:
+            if virtual_excerpts:
+                # Cadence voices are read from the excerpt exactly as excerpts.py renders it.
+                cadence_items = [
+                    (
+                        BASE_DIR / key,
+                        record["fermataBeat"],
+                        io.BytesIO(excerpts.render_record(record)),
+                    )
+                    for key, record in result["excerpts"]
+                    if record["kind"] == "cadence"
+                ]
+            else:
+                cadence_items = [
+                    (out_path, beat, None)
+                    for out_path, _, beat in cadences.process_score(score, structure)
+                ]
+                result["outputs"].extend(out_path for out_path, _, _ in cadence_items)
+                instrument.add_outputs(out_path for out_path, _, _ in cadence_items)
+
+            for out_path, beat, xml_source in cadence_items:
+                record = cadence_meta.build_cadence_record(
+                    out_path, chorale_meta_map, beat, xml_source
+                )
+                result["cadences"].append((out_path.name, record))
+        except Exception as e:
+            print(f"  Cadences failed: {e}")
+            result["ok"] = False
+
+    with instrument.stage("score.phrases", stem):
+        try:
+            for out_path, phrase_score in extract_phrases.process_score(
+                score, structure, write=not virtual_excerpts
+            ):
+                if not virtual_excerpts:
+                    result["outputs"].append(out_path)
+                    instrument.add_outputs([out_path])
+                entry = soprano_index.extract_phrase_entry(out_path, phrase_score)
+                if entry is not None:
+                    result["phrases"].append((out_path.name, entry))
+        except Exception as e:
+            print(f"  Phrases failed: {e}")
+            result["ok"] = False
+
+    bass_path = bass.OUT_DIR / (stem + "_bass" + path.suffix)
+    ear_path = blank_scores.OUT_DIR / (stem + "_ear" + path.suffix)
+    with instrument.stage("score.bass", stem):
+        try:
+            bass.make_bass_only(path, bass_path)
+            blank_scores.make_blank_score(path, ear_path)
+            instrument.add_outputs([bass_path, ear_path])
+            result["outputs"].extend([bass_path, ear_path])
+        except Exception as e:
+            print(f"  Bass/ear scores failed: {e}")
+            result["ok"] = False
+
+    return result
+
+
+def source_stem_of_cadence(record) -> str:
+    return Path(record["musicxml_path"]).name.split("_cad")[0]
+
+
+def phrase_entries_from_groups(data):
+    """Flatten an existing soprano_groups.json back into extract_phrase_entry items."""
+    table = SignatureTable.from_json(data.get("signatures", []))
+    items = []
+    for g in data.get("groups", []):
+        signature = g.get("signature") or table.string_of(g.get("signatureId"))
+        for phrase in g.get("phrases", []):
+            entry = {
+                "signature": signature,
+                "intervals": g["intervals"],
+                "durations": g["durations"],
+                "phrase": phrase,
+            }
+            items.append((Path(phrase["xmlPath"]).name, entry))
+    return items
+
+
+def save_soprano_groups(phrase_entries, similarity):
+    soprano_index.save_soprano_groups(
+        soprano_index.group_phrase_entries(
+            [entry for _, entry in sorted(phrase_entries, key=lambda item: item[0])],
+            similarity,
+        )
+    )
+
+
+def build_score_stage(
+    chorale_meta_map: dict,
+    jobs: int,
+    build_manifest,
+    force: bool,
+    soprano_similarity=None,
+    virtual_excerpts: bool = False,
+):
+    xml_files = sorted(SCORES_DIR.glob("*.xml")) + sorted(SCORES_DIR.glob("*.musicxml"))
+    print("Source chorale files:", len(xml_files))
+
+    extract_phrases.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    version = manifest.scripts_version(
+        SCORE_STAGE_SCRIPTS, f"virtual_excerpts={virtual_excerpts}"
+    )
+    keys = {path: f"score/{path.name}" for path in xml_files}
+    inputs = {
+        path: {
+            "score": manifest.file_hash(path),
+            "meta": manifest.json_hash(chorale_meta_map.get(path.stem)),
+        }
+        for path in xml_files
+    }
+
+    aggregates = [
+        structure_index.OUTPUT_JSON,
+        pickup_beats.OUTPUT_JSON,
+        cadence_meta.OUT_JSON,
+        soprano_index.OUTPUT_JSON,
+    ]
+    if virtual_excerpts:
+        aggregates.append(excerpts.INDEX_PATH)
+    stale = [
+        path
+        for path in xml_files
+        if force or not manifest.is_fresh(build_manifest, keys[path], inputs[path], version)
+    ]
+    if stale and not all(p.exists() for p in aggregates):
+        stale = list(xml_files)
+
+    gone = [
+        key
+        for key in manifest.units_with_prefix(build_manifest, "score/")
+        if key not in keys.values()
+    ]
+
+    if not stale and not gone:
+        groups = load_json(soprano_index.OUTPUT_JSON, {})
+        if groups.get("clustering", {}).get("threshold") != soprano_similarity:
+            # Only the clustering option changed: regroup the stored phrases.
+            save_soprano_groups(phrase_entries_from_groups(groups), soprano_similarity)
+        print("Score stage up to date.")
+        return
+
+    print(f"Rebuilding {len(stale)} of {len(xml_files)} scores.")
+
+    results = run_jobs(
+        partial(
+            build_score_chorale,
+            chorale_meta_map=chorale_meta_map,
+            virtual_excerpts=virtual_excerpts,
+        ),
+        stale,
+        jobs,
+    )
+
+    rebuilt = {path.stem for path in stale} | {
+        Path(key[len("score/"):]).stem for key in gone
+    }
+    structures = []
+    pickup = {}
+    cadence_records = []
+    phrase_entries = []
+    excerpt_items = []
+
+    if len(stale) < len(xml_files):
+        for name, structure in structure_index.load_structures().items():
+            if Path(name).stem not in rebuilt:
+                structures.append(structure)
+        for name, beats in load_json(pickup_beats.OUTPUT_JSON, {}).items():
+            if Path(name).stem not in rebuilt:
+                pickup[name] = beats
+        for record in load_json(cadence_meta.OUT_JSON, []):
+            if source_stem_of_cadence(record) not in rebuilt:
+                cadence_records.append((Path(record["musicxml_path"]).name, record))
+        for name, entry in phrase_entries_from_groups(load_json(soprano_index.OUTPUT_JSON, {})):
+            if entry["phrase"]["pieceId"] not in rebuilt:
+                phrase_entries.append((name, entry))
+        for key, record in (excerpts.load_index() or {}).items():
+            if excerpts.source_stem_of(record) not in rebuilt:
+                excerpt_items.append((key, record))
+
+    for path, result in zip(stale, results):
+        if result["structure"] is not None:
+            structures.append(result["structure"])
+        if result["pickup"] is not None:
+            pickup[path.name] = result["pickup"]
+        cadence_records.extend(result["cadences"])
+        phrase_entries.extend(result["phrases"])
+        excerpt_items.extend(result["excerpts"])
+
+    cadence_records.sort(key=lambda item: item[0])
+
+    with instrument.stage("score.aggregate"):
+        structure_index.save_structures(structures)
+        pickup_beats.save_pickup_beats(dict(sorted(pickup.items())))
+        cadence_meta.save_results(
+            cadence_features.classify_records([record for _, record in cadence_records])
+        )
+        save_soprano_groups(phrase_entries, soprano_similarity)
+        if virtual_excerpts:
+            excerpts.save_index(excerpt_items)
+        elif excerpts.INDEX_PATH.exists():
+            # Excerpt files are materialized again; the viewer must not prefer the index.
+            excerpts.INDEX_PATH.unlink()
+            print("Removed", excerpts.INDEX_PATH)
+        instrument.add_outputs(
+            aggregates
+            + [
+                cadence_meta.INDEX_JSON,
+                cadence_meta.GROUPS_JSON,
+                cadence_meta.SIGNATURES_JSON,
+                cadence_meta.VOICES_JSON,
+            ]
+        )
+
+    for path, result in zip(stale, results):
+        if result["ok"]:
+            manifest.record_unit(
+                build_manifest, keys[path], inputs[path], version, result["outputs"]
+            )
+    for key in gone:
+        manifest.drop_unit(build_manifest, key)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild every generated chorale artifact. Each stage parses a chorale "
+        "once: the corpus stage reads the music21 corpus, the score stage reads xml/scores."
+    )
+    parser.add_argument(
+        "--skip-corpus",
+        action="store_true",
+        help="reuse chorales_meta.json and audio_notes instead of re-reading the music21 corpus",
+    )
+    parser.add_argument(
+        "--export-musicxml",
+        action="store_true",
+        help="re-export xml/scores from the corpus before the per-score stage; the new "
+        "files miss the score cache, so each chorale is parsed twice on that run",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="ignore the build manifest and rebuild every chorale",
+    )
+    parser.add_argument(
+        "--soprano-similarity",
+        type=float,
+        metavar="T",
+        help="cluster near-identical soprano phrase groups at Jaccard similarity >= T",
+    )
+    parser.add_argument(
+        "--virtual-excerpts",
+        action="store_true",
+        help="index cadence/phrase excerpts in excerpts_index.json instead of writing "
+        "xml/scores_cadence and xml/scores_phrase (see excerpts.py)",
+    )
+    parser.add_argument(
+        "--release",
+        action="store_true",
+        help="afterwards write dist/ with compact JSON and precompressed siblings (see release.py)",
+    )
+    export_notes.add_format_argument(parser)
+    add_jobs_argument(parser)
+    instrument.add_profile_argument(parser)
+    args = parser.parse_args()
+    soprano_index.check_similarity(parser, args.soprano_similarity, "--soprano-similarity")
+
+    instrument.configure(args.profile)
+    build_manifest = manifest.load_manifest()
+
+    try:
+        if args.skip_corpus:
+            chorale_meta_map = cadence_meta.load_chorale_meta()
+        else:
+            records = build_corpus_stage(
+                args.export_musicxml,
+                args.notes_format,
+                args.jobs,
+                build_manifest,
+                args.force,
+            )
+            chorale_meta_map = cadence_meta.build_chorale_meta_map(records)
+
+        build_score_stage(
+            chorale_meta_map,
+            args.jobs,
+            build_manifest,
+            args.force,
+            args.soprano_similarity,
+            args.virtual_excerpts,
+        )
+    finally:
+        manifest.save_manifest(build_manifest)
+
+    if args.release:
+        release.write_release(jobs=args.jobs)
+
+    print("Build done.")
+
+
+if __name__ == "__main__":
+    main()
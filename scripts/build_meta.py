@@ -1,69 +1,98 @@
-from music21 import corpus
 from music21.corpus.chorales import ChoraleListRKBWV
+from functools import partial
 from pathlib import Path
+import argparse
 import json
 
+from parallel import add_jobs_argument, run_jobs
+from score_cache import parse_corpus
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 OUTPUT_PATH = DATA_DIR / "chorales_meta.json"
 
-bcl = ChoraleListRKBWV()
-riem_dict = bcl.byRiemenschneider
-
-print(f"Chorales found: {len(riem_dict)}")
 
-records = []
+def musicxml_path_for(bwv) -> str:
+    bwv_str = str(bwv).replace(".", "_")
+    return f"xml/scores/bwv{bwv_str}.musicxml"
 
-for riem_num in sorted(riem_dict.keys()):
-    info = riem_dict[riem_num]
 
+def build_record(riem_num, info, score):
     bwv = info.get("bwv")
     kalmus = info.get("kalmus")
     title = info.get("title")
 
+    try:
+        key_obj = score.analyze("key")
+        key_original = f"{key_obj.tonic.name} {key_obj.mode}"
+    except Exception:
+        key_original = None
+
+    time_sigs = list(score.recurse().getTimeSignatures())
+    if time_sigs:
+        ts = time_sigs[0]
+        time_signature = f"{ts.numerator}/{ts.denominator}"
+    else:
+        time_signature = None
+
+    return {
+        "id": riem_num,
+        "riemenschneider": riem_num,
+        "bwv": bwv,
+        "kalmus": kalmus,
+        "title": title,
+        "key_original": key_original,
+        "time_signature": time_signature,
+        "corpus_path": f"bach/bwv{bwv}",
+        "musicxml_path": musicxml_path_for(bwv),
+    }
+
+
+def save_records(records):
+    with OUTPUT_PATH.open("w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+    print(f"Saved {len(records)} records to {OUTPUT_PATH}")
+
+
+def build_chorale_record(riem_num, riem_dict):
+    info = riem_dict[riem_num]
+
+    bwv = info.get("bwv")
+    title = info.get("title")
     corpus_path = f"bach/bwv{bwv}"
 
     try:
-        score = corpus.parse(corpus_path)
-
-        try:
-            key_obj = score.analyze("key")
-            key_original = f"{key_obj.tonic.name} {key_obj.mode}"
-        except Exception:
-            key_original = None
-
-        time_sigs = list(score.recurse().getTimeSignatures())
-        if time_sigs:
-            ts = time_sigs[0]
-            time_signature = f"{ts.numerator}/{ts.denominator}"
-        else:
-            time_signature = None
-
-        bwv_str = str(bwv).replace(".", "_")
-        musicxml_filename = f"bwv{bwv_str}.musicxml"
-        musicxml_path = f"xml/scores/{musicxml_filename}"
-
-        record = {
-            "id": riem_num,
-            "riemenschneider": riem_num,
-            "bwv": bwv,
-            "kalmus": kalmus,
-            "title": title,
-            "key_original": key_original,
-            "time_signature": time_signature,
-            "corpus_path": corpus_path,
-            "musicxml_path": musicxml_path,
-        }
-
-        records.append(record)
+        score = parse_corpus(corpus_path)
+        record = build_record(riem_num, info, score)
         print(f"OK: R{riem_num} BWV{bwv} {title}")
+        return record
 
     except Exception as e:
         print(f"Error: R{riem_num} BWV{bwv} {title} -> {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build chorales_meta.json from the music21 corpus.")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    bcl = ChoraleListRKBWV()
+    riem_dict = bcl.byRiemenschneider
+
+    print(f"Chorales found: {len(riem_dict)}")
+
+    records = run_jobs(
+        partial(build_chorale_record, riem_dict=riem_dict),
+        sorted(riem_dict.keys()),
+        args.jobs,
+    )
+
+    save_records([record for record in records if record is not None])
 
-with OUTPUT_PATH.open("w", encoding="utf-8") as f:
-    json.dump(records, f, ensure_ascii=False, indent=2)
 
-print(f"Saved {len(records)} records to {OUTPUT_PATH}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+from pathlib import Path
+import argparse
+import mmap
+import os
+import struct
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BUNDLE_PATH = BASE_DIR / "data" / "corpus.bundle"
+
+NOTES_DIR = BASE_DIR / "data" / "audio_notes"
+XML_DIRS = [
+    BASE_DIR / "xml" / "scores",
+    BASE_DIR / "xml" / "scores_bass",
+    BASE_DIR / "xml" / "scores_cadence",
+    BASE_DIR / "xml" / "scores_ear",
+    BASE_DIR / "xml" / "scores_phrase",
+]
+
+MAGIC = b"BCB1"
+VERSION = 1
+KEY_WIDTH = 64
+ALIGN = 8
+
+# magic, version, key width, entry count, index offset, data offset
+HEADER = struct.Struct("<4sHHIIQ")
+# offset, length, reserved (after the fixed-width key)
+ENTRY_TAIL = struct.Struct("<QII")
+ENTRY_SIZE = KEY_WIDTH + ENTRY_TAIL.size
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def bundle_key(path: Path) -> str:
+    """Repo-relative POSIX path, the same string the site uses as a URL."""
+    return Path(path).resolve().relative_to(BASE_DIR).as_posix()
+
+
+def collect_files(with_xml: bool):
+    files = sorted(NOTES_DIR.glob("bwv*.json")) + sorted(NOTES_DIR.glob("bwv*.bin"))
+    if with_xml:
+        for d in XML_DIRS:
+            if d.exists():
+                files += sorted(d.glob("*.musicxml")) + sorted(d.glob("*.xml"))
+    return files
+
+
+def write_bundle(files, out_path: Path = BUNDLE_PATH):
+    """
+    Concatenate files into one bundle:
+
+      header  HEADER.size bytes
+      index   entry_count fixed-width entries, sorted by key:
+                key      UTF-8, NUL-padded to KEY_WIDTH bytes
+                offset   uint64 (absolute, ALIGN-aligned)
+                length   uint32
+                reserved uint32
+      data    file bytes, each blob padded to ALIGN
+
+    Any entry can then be read with two range requests (header+index once,
+    then offset/length) or by memory-mapping the file.
+    """
+    entries = []
+    for path in files:
+        key = bundle_key(path).encode("utf-8")
+        if len(key) > KEY_WIDTH:
+            raise ValueError(f"bundle key longer than {KEY_WIDTH} bytes: {key!r}")
+        entries.append((key, path))
+    entries.sort(key=lambda e: e[0])
+
+    index_offset = HEADER.size
+    data_offset = _align(index_offset + ENTRY_SIZE * len(entries))
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".tmp")
+
+    with tmp_path.open("wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, KEY_WIDTH, len(entries), index_offset, data_offset))
+        f.write(b"\0" * (data_offset - index_offset))
+
+        index = []
+        pos = data_offset
+        for key, path in entries:
+            data = path.read_bytes()
+            f.write(data)
+            f.write(b"\0" * (_align(len(data)) - len(data)))
+            index.append(key.ljust(KEY_WIDTH, b"\0") + ENTRY_TAIL.pack(pos, len(data), 0))
+            pos += _align(len(data))
+
+        f.seek(index_offset)
+        f.write(b"".join(index))
+
+    os.replace(tmp_path, out_path)
+    return len(entries), pos
+
+
+class BundleReader:
+    """Memory-mapped view of a bundle; get(key) binary-searches the index."""
+
+    def __init__(self, path: Path = BUNDLE_PATH):
+        self._file = Path(path).open("rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, key_width, count, index_offset, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"not a chorale bundle: {path}")
+        if version != VERSION:
+            raise ValueError(f"unsupported bundle version: {version}")
+
+        self.key_width = key_width
+        self.entry_size = key_width + ENTRY_TAIL.size
+        self.count = count
+        self.index_offset = index_offset
+
+    def _key_at(self, i: int) -> bytes:
+        start = self.index_offset + i * self.entry_size
+        return self._map[start:start + self.key_width].rstrip(b"\0")
+
+    def _entry_at(self, i: int):
+        start = self.index_offset + i * self.entry_size + self.key_width
+        offset, length, _ = ENTRY_TAIL.unpack_from(self._map, start)
+        return offset, length
+
+    def keys(self):
+        return [self._key_at(i).decode("utf-8") for i in range(self.count)]
+
+    def locate(self, key: str):
+        """(offset, length) of key, or None."""
+        target = key.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key_at(lo) == target:
+            return self._entry_at(lo)
+        return None
+
+    def get(self, key: str):
+        found = self.locate(key)
+        if found is None:
+            return None
+        offset, length = found
+        return self._map[offset:offset + length]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pack audio_notes (and optionally xml/scores*) into data/corpus.bundle."
+    )
+    parser.add_argument(
+        "--with-xml",
+        action="store_true",
+        help="also pack every MusicXML variant under xml/",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="read every entry back through the index and compare with its source file",
+    )
+    args = parser.parse_args()
+
+    files = collect_files(args.with_xml)
+    count, size = write_bundle(files)
+    print(f"Packed {count} files ({size / 1e6:.1f} MB) -> {BUNDLE_PATH}")
+
+    if args.verify:
+        bad = 0
+        with BundleReader() as reader:
+            for path in files:
+                if reader.get(bundle_key(path)) != path.read_bytes():
+                    print("Mismatch:", bundle_key(path))
+                    bad += 1
+        print(f"Verified {len(files)} entries, {bad} mismatches.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from xml_notes import STEP_TO_PC
+
+REST = -1
+
+CADENCE_TYPES = ["authentic", "plagal/half", "deceptive", "phrygian", "other"]
+SOPRANO_ROLES = ["root", "third", "fifth", "other"]
+
+STEPS = "CDEFGAB"
+
+NOTE_TO_PC = {
+    "C": 0,
+    "B#": 0,
+    "C#": 1,
+    "Db": 1,
+    "D": 2,
+    "D#": 3,
+    "Eb": 3,
+    "E": 4,
+    "Fb": 4,
+    "E#": 5,
+    "F": 5,
+    "F#": 6,
+    "Gb": 6,
+    "G": 7,
+    "G#": 8,
+    "Ab": 8,
+    "A": 9,
+    "A#": 10,
+    "Bb": 10,
+    "B": 11,
+    "Cb": 11,
+    "B-": 10,
+    "E-": 3,
+    "A-": 8,
+}
+
+
+def parse_key_root_pc(key_original: str):
+    """Return tonic pitch class from key string like 'D minor' or 'G major'."""
+    if not key_original or not isinstance(key_original, str):
+        return None
+    parts = key_original.strip().split()
+    if not parts:
+        return None
+    root_str = parts[0]
+    return NOTE_TO_PC.get(root_str)
+
+
+def name_to_midi(name: str) -> int:
+    """MIDI number of a music21 nameWithOctave such as "E-4" or "F#3"."""
+    step = name[0]
+    octave_at = len(name.rstrip("0123456789"))
+    accidental = name[1:octave_at]
+    alter = accidental.count("#") - accidental.count("-")
+    return (int(name[octave_at:]) + 1) * 12 + STEP_TO_PC[step] + alter
+
+
+def build_root_rank():
+    """
+    rank[step_mask, step]: how likely each letter step of a chord (a 7-bit
+    mask over C..B) is its root, following music21's Chord.root(). A step
+    with every other step stacked in thirds above it wins outright;
+    otherwise the 3rd, 5th, 7th, 9th, 11th and 13th above it score
+    1/6, 1/7, ... 1/11. Ranks are small integers so that ties can be
+    broken by chord order, as music21 does.
+    """
+    ordered_chord_steps = (3, 5, 7, 2, 4, 6)
+    scores = {}
+    for mask in range(1 << 7):
+        steps = [s for s in range(7) if mask >> s & 1]
+        for s in steps:
+            if all(mask >> ((s + 2 * k) % 7) & 1 for k in range(len(steps))):
+                scores[mask, s] = None
+            else:
+                scores[mask, s] = sum(
+                    Fraction(1, idx + 6)
+                    for idx, chord_step in enumerate(ordered_chord_steps)
+                    if mask >> ((s + chord_step - 1) % 7) & 1
+                )
+
+    levels = sorted({v for v in scores.values() if v is not None})
+    stacked = len(levels) + 1
+    rank = np.zeros((1 << 7, 7), dtype=np.int16)
+    for (mask, s), value in scores.items():
+        rank[mask, s] = stacked if value is None else levels.index(value) + 1
+    return rank
+
+
+ROOT_RANK = build_root_rank()
+
+
+def pad_rows(rows: Sequence[Sequence[int]], fill: int = REST, dtype=np.int16) -> np.ndarray:
+    """[N, max_len] matrix of ragged integer rows, padded with fill."""
+    width = max((len(r) for r in rows), default=0)
+    out = np.full((len(rows), max(width, 1)), fill, dtype=dtype)
+    for i, row in enumerate(rows):
+        out[i, : len(row)] = row
+    return out
+
+
+@dataclass
+class CadenceArrays:
+    """
+    Everything classification looks at, for N cadences at once.
+    Melodies are MIDI numbers with REST for rests and padding; the final
+    chord lists its pitches in chord order with their letter steps.
+    """
+
+    soprano: np.ndarray
+    bass: np.ndarray
+    chord_midi: np.ndarray
+    chord_step: np.ndarray
+    tonic_pc: np.ndarray
+
+    @classmethod
+    def from_records(cls, records) -> "CadenceArrays":
+        def melody(record, voice):
+            midis = record.get("voices", {}).get(voice, {}).get("midi", [])
+            return [REST if m is None else m for m in midis]
+
+        chords = [record.get("final_chord") or [] for record in records]
+        tonics = [parse_key_root_pc(record.get("key_original")) for record in records]
+
+        return cls(
+            soprano=pad_rows([melody(r, "soprano") for r in records]),
+            bass=pad_rows([melody(r, "bass") for r in records]),
+            chord_midi=pad_rows([[name_to_midi(n) for n in names] for names in chords]),
+            chord_step=pad_rows([[STEPS.index(n[0]) for n in names] for names in chords]),
+            tonic_pc=np.array([REST if t is None else t for t in tonics], dtype=np.int16),
+        )
+
+    def __len__(self):
+        return len(self.tonic_pc)
+
+
+def last_notes(melodies: np.ndarray, count: int = 2) -> np.ndarray:
+    """[N, count] MIDI numbers of the last count notes of each row, last first."""
+    positions = np.where(melodies != REST, np.arange(melodies.shape[1]), -1)
+    positions = -np.sort(-positions, axis=1)[:, :count]
+    if positions.shape[1] < count:
+        missing = count - positions.shape[1]
+        positions = np.pad(positions, ((0, 0), (0, missing)), constant_values=-1)
+    notes = np.take_along_axis(melodies, np.maximum(positions, 0), axis=1)
+    return np.where(positions >= 0, notes, REST)
+
+
+def pitch_class_masks(midi: np.ndarray) -> np.ndarray:
+    """12-bit pitch-class set of each row."""
+    bits = np.where(midi != REST, 1 << (midi.astype(np.int32) % 12), 0)
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def has_pc(masks: np.ndarray, pcs: np.ndarray) -> np.ndarray:
+    return (masks >> (pcs % 12)) & 1 == 1
+
+
+def chord_roots(arrays: CadenceArrays) -> np.ndarray:
+    """Root pitch class of every final chord (REST when there is none)."""
+    present = arrays.chord_step != REST
+    steps = np.maximum(arrays.chord_step, 0)
+    step_masks = np.bitwise_or.reduce(np.where(present, 1 << steps, 0), axis=1)
+
+    width = arrays.chord_step.shape[1]
+    rank = ROOT_RANK[step_masks[:, None], steps].astype(np.int32)
+    # Highest rank wins; among equals (and repeated steps) the first pitch does.
+    key = np.where(present, rank * width + (width - 1 - np.arange(width)), -1)
+    root_at = key.argmax(axis=1)
+
+    roots = np.take_along_axis(arrays.chord_midi, root_at[:, None], axis=1)[:, 0] % 12
+    return np.where(present.any(axis=1), roots, REST)
+
+
+def soprano_roles(arrays: CadenceArrays, roots: np.ndarray) -> np.ndarray:
+    """
+    Index into SOPRANO_ROLES of the final soprano note within the final
+    chord: root, third (the higher pitch class if both a minor and a major
+    third are present), fifth, or other.
+    """
+    masks = pitch_class_masks(arrays.chord_midi)
+    sop = last_notes(arrays.soprano, 1)[:, 0]
+    sop_pc = np.where(sop != REST, sop % 12, REST)
+
+    minor_third = has_pc(masks, roots + 3)
+    major_third = has_pc(masks, roots + 4)
+    third_pc = np.where(
+        minor_third & major_third,
+        np.maximum((roots + 3) % 12, (roots + 4) % 12),
+        np.where(major_third, (roots + 4) % 12, (roots + 3) % 12),
+    )
+    has_third = minor_third | major_third
+    has_fifth = has_pc(masks, roots + 7)
+
+    known = (roots != REST) & (sop_pc != REST)
+    roles = np.full(len(arrays), SOPRANO_ROLES.index("other"), dtype=np.int8)
+    roles[known & has_fifth & (sop_pc == (roots + 7) % 12)] = SOPRANO_ROLES.index("fifth")
+    roles[known & has_third & (sop_pc == third_pc)] = SOPRANO_ROLES.index("third")
+    roles[known & (sop_pc == roots)] = SOPRANO_ROLES.index("root")
+    return roles
+
+
+def cadence_types(arrays: CadenceArrays, intervals: np.ndarray, has_interval: np.ndarray):
+    """
+    Index into CADENCE_TYPES from the final bass step and the key:
+    phrygian (down a semitone), authentic (bass down a fifth / up a fourth),
+    plagal/half (down a fourth / up a fifth, or ending on the dominant),
+    deceptive (up a step), otherwise other. Earlier rules win.
+    """
+    final_bass = last_notes(arrays.bass, 1)[:, 0]
+    ends_on_dominant = (
+        (arrays.tonic_pc != REST)
+        & (final_bass != REST)
+        & (final_bass % 12 == (arrays.tonic_pc + 7) % 12)
+    )
+
+    rules = [
+        ("phrygian", has_interval & (intervals == -1)),
+        ("authentic", has_interval & np.isin(intervals, (-7, 5))),
+        ("plagal/half", (has_interval & np.isin(intervals, (-5, 7))) | ends_on_dominant),
+        ("deceptive", has_interval & np.isin(intervals, (1, 2))),
+    ]
+    types = np.full(len(arrays), CADENCE_TYPES.index("other"), dtype=np.int8)
+    for name, hit in reversed(rules):
+        types[hit] = CADENCE_TYPES.index(name)
+    return types
+
+
+def compute_features(arrays: CadenceArrays) -> Dict[str, np.ndarray]:
+    """Final bass interval, chord root, soprano role and cadence type of every cadence."""
+    final, penult = last_notes(arrays.bass, 2).T
+    has_interval = (final != REST) & (penult != REST)
+    intervals = np.where(has_interval, final.astype(np.int32) - penult, 0)
+
+    roots = chord_roots(arrays)
+    return {
+        "final_bass_interval": intervals,
+        "has_interval": has_interval,
+        "root_pc": roots,
+        "soprano_role": soprano_roles(arrays, roots),
+        "cadence_type": cadence_types(arrays, intervals, has_interval),
+    }
+
+
+def classify_records(records: List[dict]) -> List[dict]:
+    """
+    Fill final_bass_interval, final_soprano_role and cadence_type of every
+    cadence record in one vectorized pass (records are updated in place).
+    """
+    if not records:
+        return records
+
+    features = compute_features(CadenceArrays.from_records(records))
+    for i, record in enumerate(records):
+        record["final_bass_interval"] = (
+            int(features["final_bass_interval"][i]) if features["has_interval"][i] else None
+        )
+        record["final_soprano_role"] = SOPRANO_ROLES[features["soprano_role"][i]]
+        record["cadence_type"] = CADENCE_TYPES[features["cadence_type"][i]]
+    return records
@@ -1,16 +1,33 @@
+from functools import partial
 from pathlib import Path
+import argparse
 import json
 import re
 
-from music21 import converter, note, stream, expressions, chord
+import cadence_features
+from jsonstream import JsonArrayWriter, iter_json_array, write_json_array
+from parallel import add_jobs_argument, iter_jobs
+from signatures import SIGNATURE_FIELDS, SignatureTable
+from sonority import SonorityIndex
+import structure_index
+from xml_notes import events_by_part, iter_events
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 CADENCE_DIR = BASE_DIR / "xml" / "scores_cadence"
 OUT_JSON = BASE_DIR / "data" / "cadences_meta.json"
+INDEX_JSON = BASE_DIR / "data" / "cadences_index.json"
+DETAIL_DIR = BASE_DIR / "data" / "cadences"
+SIGNATURES_JSON = BASE_DIR / "data" / "cadence_signatures.json"
+GROUPS_JSON = BASE_DIR / "data" / "cadence_groups.json"
+VOICES_JSON = BASE_DIR / "data" / "cadence_voices.json"
+INDEX_VERSION = 2
 CHORALE_META_JSON = BASE_DIR / "data" / "chorales_meta.json"
 
+# Records classified together; classification needs no other records.
+CLASSIFY_BATCH = 256
+
 
 def load_chorale_meta():
     """
@@ -25,6 +42,34 @@ def load_chorale_meta():
     with CHORALE_META_JSON.open(encoding="utf-8") as f:
         data = json.load(f)
 
+    mapping = build_chorale_meta_map(data)
+    print(f"Loaded metadata for {len(mapping)} chorales.")
+    return mapping
+
+
+def load_structures():
+    """
+    Read structure_index.json (written by cadences.py / structure_index.py):
+      original musicxml stem -> ChoraleStructure
+    """
+    structures = structure_index.load_structures()
+    if not structures:
+        print("Warning: structure_index.json not found (run cadences.py):",
+              structure_index.OUTPUT_JSON)
+    return {s.stem: s for s in structures.values()}
+
+
+def lookup_fermata_beat(structures: dict, stem: str):
+    """Beat of the fermata that closes cadence `stem` in its original chorale."""
+    structure = structures.get(stem.split("_cad")[0])
+    _, end_m = parse_measures_from_stem(stem)
+    if structure is None or end_m is None:
+        return None
+    return structure.fermata_beat(end_m)
+
+
+def build_chorale_meta_map(data):
+    """Map original musicxml stem -> metadata dict for a list of chorale records."""
     mapping = {}
     for ch in data:
         mpath = ch.get("musicxml_path")
@@ -32,25 +77,12 @@ def load_chorale_meta():
             continue
         stem = Path(mpath).stem
         mapping[stem] = ch
-
-    print(f"Loaded metadata for {len(mapping)} chorales.")
     return mapping
 
 
-def has_fermata(n):
-    """Return True if the note/rest has a fermata expression or articulation."""
-    for exp in getattr(n, "expressions", []):
-        if isinstance(exp, expressions.Fermata):
-            return True
-    for art in getattr(n, "articulations", []):
-        if getattr(art, "name", "").lower() == "fermata":
-            return True
-    return False
-
-
-def extract_voice_data(part: stream.Part):
+def extract_voice_data(events):
     """
-    For one voice (Part), extract:
+    For one voice (list of NoteEvents from xml_notes), extract:
       - midi: list of MIDI numbers (or None for rests)
       - names: pitch names like "C4", "F#3", or "rest"
       - durations: quarterLength values (float)
@@ -60,17 +92,10 @@ def extract_voice_data(part: stream.Part):
     name_list = []
     dur_list = []
 
-    for el in part.recurse().notesAndRests:
-        ql = float(el.quarterLength)
-
-        if isinstance(el, note.Note):
-            midi_list.append(int(el.pitch.midi))
-            name_list.append(el.pitch.nameWithOctave)
-        else:
-            midi_list.append(None)
-            name_list.append("rest")
-
-        dur_list.append(ql)
+    for ev in events:
+        midi_list.append(ev.midi)
+        name_list.append(ev.name if ev.midi is not None else "rest")
+        dur_list.append(ev.quarter_length)
 
     intervals = []
     prev = None
@@ -89,33 +114,19 @@ def extract_voice_data(part: stream.Part):
     }
 
 
-def get_last_note(part: stream.Part):
-    """Return the last Note in the part (ignoring rests)."""
-    notes = [n for n in part.recurse().notes if isinstance(n, note.Note)]
-    if not notes:
-        return None
-    return notes[-1]
-
-
-def get_fermata_beat_from_original(orig_xml_path: Path, fermata_measure: int):
+def read_excerpt_events(source):
     """
-    Open the original full chorale XML and find the beat of the fermata note
-    in the given measure (using the soprano part).
+    NoteEvents of every part of a cadence excerpt (a path or a binary file
+    object), streamed without music21.
     """
-    if not orig_xml_path.exists():
-        print("Warning: original XML not found:", orig_xml_path)
-        return None
+    return list(iter_events(source))
 
-    score = converter.parse(orig_xml_path)
-    soprano = score.parts[0]
-
-    for n in soprano.recurse().notesAndRests:
-        if getattr(n, "measureNumber", None) == fermata_measure and has_fermata(n):
-            try:
-                return float(n.beat)
-            except Exception:
-                return None
 
+def get_last_note(events):
+    """Return the last sounding NoteEvent of a voice (ignoring rests)."""
+    for ev in reversed(events):
+        if ev.midi is not None:
+            return ev
     return None
 
 
@@ -131,44 +142,6 @@ def parse_measures_from_stem(stem: str):
     return int(m.group(1)), int(m.group(2))
 
 
-def derive_soprano_role_from_chord(final_chord: chord.Chord, final_sop_note: note.Note):
-    """
-    Decide whether the final soprano note is the root, third, fifth, or other
-    within the final chord (local chord, not global key).
-    """
-    if final_chord is None or final_sop_note is None:
-        return "other"
-
-    pcs = sorted(set(p.pitchClass for p in final_chord.pitches))
-    if not pcs:
-        return "other"
-
-    try:
-        root_pc = final_chord.root().pitchClass
-    except Exception:
-        root_pc = pcs[0]
-
-    third_pc = None
-    fifth_pc = None
-
-    for pc in pcs:
-        interval = (pc - root_pc) % 12
-        if interval in (3, 4):
-            third_pc = pc
-        elif interval == 7:
-            fifth_pc = pc
-
-    sop_pc = final_sop_note.pitch.pitchClass
-
-    if sop_pc == root_pc:
-        return "root"
-    if third_pc is not None and sop_pc == third_pc:
-        return "third"
-    if fifth_pc is not None and sop_pc == fifth_pc:
-        return "fifth"
-    return "other"
-
-
 def build_melody_signature(midi_list, durations=None):
     """
     Build a string signature for a melody line.
@@ -188,106 +161,26 @@ def build_melody_signature(midi_list, durations=None):
     return ",".join(pairs)
 
 
-NOTE_TO_PC = {
-    "C": 0,
-    "B#": 0,
-    "C#": 1,
-    "Db": 1,
-    "D": 2,
-    "D#": 3,
-    "Eb": 3,
-    "E": 4,
-    "Fb": 4,
-    "E#": 5,
-    "F": 5,
-    "F#": 6,
-    "Gb": 6,
-    "G": 7,
-    "G#": 8,
-    "Ab": 8,
-    "A": 9,
-    "A#": 10,
-    "Bb": 10,
-    "B": 11,
-    "Cb": 11,
-    "B-": 10,
-    "E-": 3,
-    "A-": 8,
-}
-
-
-def parse_key_root_pc(key_original: str):
-    """Return tonic pitch class from key string like 'D minor' or 'G major'."""
-    if not key_original or not isinstance(key_original, str):
-        return None
-    parts = key_original.strip().split()
-    if not parts:
-        return None
-    root_str = parts[0]
-    return NOTE_TO_PC.get(root_str)
-
-
-def get_last_bass_interval_from_midis(bass_midis):
-    """
-    From a bass MIDI list, compute final - penultimate semitone interval.
-    Returns None if fewer than 2 notes.
-    """
-    notes = [m for m in bass_midis if m is not None]
-    if len(notes) < 2:
-        return None
-    penult, final = notes[-2], notes[-1]
-    return int(final - penult)
-
-
-def get_final_bass_pc(final_bass_pitch):
-    """Return pitch class (0–11) from final bass MIDI number."""
-    if final_bass_pitch is None:
-        return None
-    try:
-        return int(final_bass_pitch) % 12
-    except (TypeError, ValueError):
-        return None
+def process_cadence_file(path: Path, chorale_meta_map: dict, structures: dict):
+    """Read a single cadence MusicXML file and return a JSON-ready dict."""
+    print(f"Processing: {path.name}")
+    return build_cadence_record(
+        path, chorale_meta_map, lookup_fermata_beat(structures, path.stem)
+    )
 
 
-def classify_cadence(bass_midis, key_original, final_bass_pitch):
+def build_cadence_record(
+    path: Path, chorale_meta_map: dict, fermata_beat=None, xml_source=None
+):
     """
-    Classify cadence into:
-      authentic, plagal/half, deceptive, phrygian, other.
+    Build the JSON-ready dict for a cadence excerpt.
+    fermata_beat is the beat of the closing fermata in the structure index.
+    Voices are read from path, or from xml_source (a binary file object)
+    when the excerpt is virtual and path was never written.
+    final_soprano_role, final_bass_interval and cadence_type are left for
+    cadence_features.classify_records, which fills them for all records
+    at once from the voices and final_chord.
     """
-    last_interval = get_last_bass_interval_from_midis(bass_midis)
-    final_bass_pc = get_final_bass_pc(final_bass_pitch)
-    tonic_pc = parse_key_root_pc(key_original)
-
-    is_phrygian = last_interval == -1
-    is_authentic = last_interval in (-7, 5)
-    is_plagal_half_interval = last_interval in (-5, 7)
-
-    if tonic_pc is not None and final_bass_pc is not None:
-        dominant_pc = (tonic_pc + 7) % 12
-        is_plagal_half_global = final_bass_pc == dominant_pc
-    else:
-        is_plagal_half_global = False
-
-    is_plagal_half = is_plagal_half_interval or is_plagal_half_global
-    is_deceptive = last_interval in (1, 2)
-
-    if is_phrygian:
-        cadence_type = "phrygian"
-    elif is_authentic:
-        cadence_type = "authentic"
-    elif is_plagal_half:
-        cadence_type = "plagal/half"
-    elif is_deceptive:
-        cadence_type = "deceptive"
-    else:
-        cadence_type = "other"
-
-    return last_interval, cadence_type
-
-
-def process_cadence_file(path: Path, chorale_meta_map: dict):
-    """Parse a single cadence MusicXML file and return a JSON-ready dict."""
-    print(f"Processing: {path.name}")
     stem = path.stem
 
     orig_stem = stem.split("_cad")[0]
@@ -295,47 +188,32 @@ def process_cadence_file(path: Path, chorale_meta_map: dict):
 
     start_m, end_m = parse_measures_from_stem(stem)
 
-    score = converter.parse(path)
+    all_events = read_excerpt_events(xml_source if xml_source is not None else path)
+    part_events = events_by_part(all_events)
 
     voices = {}
     part_names = ["soprano", "alto", "tenor", "bass"]
-    for idx, part in enumerate(score.parts):
+    for idx, events in enumerate(part_events):
         if idx >= 4:
             break
         vname = part_names[idx]
-        voices[vname] = extract_voice_data(part)
+        voices[vname] = extract_voice_data(events)
 
-    soprano_part = score.parts[0] if len(score.parts) > 0 else None
-    bass_part = score.parts[3] if len(score.parts) > 3 else None
+    soprano_events = part_events[0] if len(part_events) > 0 else None
+    bass_events = part_events[3] if len(part_events) > 3 else None
 
-    final_sop_note = get_last_note(soprano_part) if soprano_part else None
-    final_bass_note = get_last_note(bass_part) if bass_part else None
+    final_sop_note = get_last_note(soprano_events) if soprano_events else None
+    final_bass_note = get_last_note(bass_events) if bass_events else None
 
-    final_sop_pitch = int(final_sop_note.pitch.midi) if final_sop_note else None
-    final_sop_name = (
-        final_sop_note.pitch.nameWithOctave if final_sop_note else None
-    )
+    final_sop_pitch = final_sop_note.midi if final_sop_note else None
+    final_sop_name = final_sop_note.name if final_sop_note else None
 
-    final_bass_pitch = int(final_bass_note.pitch.midi) if final_bass_note else None
-    final_bass_name = (
-        final_bass_note.pitch.nameWithOctave if final_bass_note else None
-    )
-
-    final_chord = None
-    try:
-        chs = score.chordify().recurse().getElementsByClass("Chord")
-        if chs:
-            final_chord = chs[-1]
-    except Exception:
-        final_chord = None
+    final_bass_pitch = final_bass_note.midi if final_bass_note else None
+    final_bass_name = final_bass_note.name if final_bass_note else None
 
-    final_soprano_role = derive_soprano_role_from_chord(final_chord, final_sop_note)
-
-    fermata_beat = None
-    orig_xml_rel = source_meta.get("musicxml_path")
-    if end_m is not None and orig_xml_rel:
-        orig_xml_path = BASE_DIR / "xml" / orig_xml_rel
-        fermata_beat = get_fermata_beat_from_original(orig_xml_path, end_m)
+    # The last sounding sonority across all parts (some excerpts have more than four).
+    last = SonorityIndex(all_events).final_chord()
+    final_chord = last.names if last else []
 
     sop_midi = voices.get("soprano", {}).get("midi", [])
     sop_dur = voices.get("soprano", {}).get("durations", [])
@@ -347,10 +225,6 @@ def process_cadence_file(path: Path, chorale_meta_map: dict):
     bass_signature = build_melody_signature(bass_midi)
     bass_signature_with_rhythm = build_melody_signature(bass_midi, bass_dur)
 
-    key_original = source_meta.get("key_original")
-    final_bass_interval, cadence_type = classify_cadence(
-        bass_midi, key_original, final_bass_pitch
-    )
 
     obj = {
         "id": stem,
@@ -367,11 +241,12 @@ def process_cadence_file(path: Path, chorale_meta_map: dict):
         "fermata_beat": fermata_beat,
         "final_soprano_pitch": final_sop_pitch,
         "final_soprano_name": final_sop_name,
-        "final_soprano_role": final_soprano_role,
+        "final_soprano_role": None,
         "final_bass_pitch": final_bass_pitch,
         "final_bass_name": final_bass_name,
-        "final_bass_interval": final_bass_interval,
-        "cadence_type": cadence_type,
+        "final_bass_interval": None,
+        "cadence_type": None,
+        "final_chord": final_chord,
         "voices": voices,
         "soprano_signature": soprano_signature,
         "soprano_signature_with_rhythm": soprano_signature_with_rhythm,
@@ -382,12 +257,42 @@ def process_cadence_file(path: Path, chorale_meta_map: dict):
     return obj
 
 
+def process_cadence_file_or_none(path: Path, chorale_meta_map: dict, structures: dict):
+    try:
+        return process_cadence_file(path, chorale_meta_map, structures)
+    except Exception as e:
+        print("Error while processing", path.name, "->", e)
+        return None
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Build cadences_meta.json from xml/scores_cadence.")
+    parser.add_argument(
+        "--reclassify",
+        action="store_true",
+        help="only recompute roles and cadence types of the existing cadences_meta.json",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="keep the cadences an interrupted run already wrote and process only the rest",
+    )
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.reclassify:
+        if not OUT_JSON.exists():
+            print("Cadence metadata not found (run without --reclassify):", OUT_JSON)
+            return
+        save_results(classify_in_batches(iter_json_array(OUT_JSON)))
+        return
+
     if not CADENCE_DIR.exists():
         print("Cadence XML folder not found:", CADENCE_DIR)
         return
 
     chorale_meta_map = load_chorale_meta()
+    structures = load_structures()
 
     cadence_files = sorted(
         list(CADENCE_DIR.glob("*.xml"))
@@ -395,20 +300,353 @@ def main():
     )
 
     print("Cadence files:", len(cadence_files))
-    results = []
+    with JsonArrayWriter(OUT_JSON, resume=args.resume) as out:
+        done = {r["id"] for r in out.records()}
+        results = iter_jobs(
+            partial(
+                process_cadence_file_or_none,
+                chorale_meta_map=chorale_meta_map,
+                structures=structures,
+            ),
+            [path for path in cadence_files if path.stem not in done],
+            args.jobs,
+        )
+        out.write_all(classify_in_batches(obj for obj in results if obj is not None))
+
+    print(f"Written cadence metadata ({out.count} cadences) to:", OUT_JSON)
+    save_derived_outputs()
+
+
+def classify_in_batches(records, size: int = CLASSIFY_BATCH):
+    """cadence_features.classify_records over a stream, size records at a time."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield from cadence_features.classify_records(batch)
+            batch = []
+    yield from cadence_features.classify_records(batch)
+
+
+def source_stem_of(record) -> str:
+    return record["id"].split("_cad")[0]
+
+
+INDEX_CHORALE_FIELDS = [
+    "stem",
+    "riemenschneider",
+    "bwv",
+    "chorale_title",
+    "key_original",
+    "time_signature",
+    "source_musicxml",
+]
+INDEX_CADENCE_FIELDS = [
+    "chorale",
+    "cadence",
+    "start_measure",
+    "end_measure",
+    "cadence_type",
+    "final_soprano_role",
+    "final_soprano_name",
+    "final_bass_name",
+    "soprano_signature",
+    "bass_signature",
+]
+
+
+def build_index(results, table: SignatureTable):
+    """
+    The filter index the cadence page starts from: chorale metadata once
+    per chorale, then one row per cadence (laid out as INDEX_CADENCE_FIELDS)
+    with cadence type and soprano role as codes into the index's tables and
+    signatures as IDs into the signature table (cadence_signatures.json).
+    """
+    types = cadence_features.CADENCE_TYPES
+    roles = cadence_features.SOPRANO_ROLES
+
+    chorales = []
+    chorale_idx = {}
+    cadences = []
+    for r in results:
+        stem = source_stem_of(r)
+        if stem not in chorale_idx:
+            chorale_idx[stem] = len(chorales)
+            chorales.append([stem] + [r.get(f) for f in INDEX_CHORALE_FIELDS[1:]])
+
+        number = re.search(r"_cad(\d+)_m", r["id"])
+        cadences.append([
+            chorale_idx[stem],
+            int(number.group(1)) if number else None,
+            r.get("start_measure"),
+            r.get("end_measure"),
+            types.index(r["cadence_type"]) if r.get("cadence_type") in types else None,
+            roles.index(r["final_soprano_role"]) if r.get("final_soprano_role") in roles else None,
+            r.get("final_soprano_name"),
+            r.get("final_bass_name"),
+            table.id_of(r.get("soprano_signature")),
+            table.id_of(r.get("bass_signature")),
+        ])
+
+    return {
+        "version": INDEX_VERSION,
+        "cadenceTypes": types,
+        "sopranoRoles": roles,
+        "choraleFields": INDEX_CHORALE_FIELDS,
+        "cadenceFields": INDEX_CADENCE_FIELDS,
+        "chorales": chorales,
+        "cadences": cadences,
+    }
+
+
+def save_index(index, out_path: Path = INDEX_JSON):
+    """Write the filter index with one compact line per chorale and per cadence."""
+    def rows(items):
+        return ",\n".join(json.dumps(row, ensure_ascii=False, separators=(",", ":")) for row in items)
+
+    header = {k: v for k, v in index.items() if k not in ("chorales", "cadences")}
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write(json.dumps(header, ensure_ascii=False, separators=(",", ":"))[:-1])
+        f.write(',"chorales":[\n' + rows(index["chorales"]) + "\n]")
+        f.write(',"cadences":[\n' + rows(index["cadences"]) + "\n]}\n")
+
+    print(f"Written cadence index ({len(index['cadences'])} cadences) to:", out_path)
+
+
+def write_detail_shard(out_dir: Path, stem: str, records, append: bool = False):
+    path = out_dir / f"{stem}.json"
+    if append and path.exists():
+        with path.open(encoding="utf-8") as f:
+            records = json.load(f) + records
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def save_details(results, table: SignatureTable, out_dir: Path = DETAIL_DIR):
+    """
+    Write the full records of each chorale to <out_dir>/<chorale stem>.json,
+    with signatures as IDs into the signature table. results may be a
+    stream; a chorale's shard is written once its run of records ends.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = set()
+    stem = None
+    records = []
+    for r in results:
+        if source_stem_of(r) != stem:
+            if stem is not None:
+                write_detail_shard(out_dir, stem, records, append=stem in written)
+                written.add(stem)
+            stem = source_stem_of(r)
+            records = []
+        records.append(table.intern_record(r))
+    if stem is not None:
+        write_detail_shard(out_dir, stem, records, append=stem in written)
+        written.add(stem)
+
+    for stale in out_dir.glob("*.json"):
+        if stale.stem not in written:
+            stale.unlink()
+
+    print(f"Written cadence details of {len(written)} chorales to:", out_dir)
+
+
+VOICE_NAMES = ["soprano", "alto", "tenor", "bass"]
+
 
-    for path in cadence_files:
-        try:
-            obj = process_cadence_file(path, chorale_meta_map)
-            results.append(obj)
-        except Exception as e:
-            print("Error while processing", path.name, "->", e)
+def save_voices(results, out_path: Path = VOICES_JSON):
+    """
+    Write the pitches and durations of every voice, all the cadence page's
+    melody search needs, as one compact line per index row:
+    [[midi, durations] or null for each of VOICE_NAMES]. results may be a
+    stream, in the same order as the index.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    header = {"version": INDEX_VERSION, "voiceNames": VOICE_NAMES}
+    count = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write(json.dumps(header, separators=(",", ":"))[:-1] + ',"cadences":[')
+        for r in results:
+            voices = r.get("voices") or {}
+            row = [
+                [voices[v].get("midi"), voices[v].get("durations")] if voices.get(v) else None
+                for v in VOICE_NAMES
+            ]
+            f.write(("\n" if count == 0 else ",\n") + json.dumps(row, separators=(",", ":")))
+            count += 1
+        f.write("\n]}\n")
+
+    print(f"Written cadence voices ({count} cadences) to:", out_path)
+
+
+GROUP_SORTS = ["default", "final-soprano", "cadence-type", "soprano-line", "bass-line"]
+
+
+def riemenschneider_key(record):
+    """Riemenschneider number, or the id for chorales without one (listed last)."""
+    riem = record.get("riemenschneider")
+    return (0, riem, "") if riem is not None else (1, 0, record["id"])
 
-    OUT_JSON.parent.mkdir(parents=True, exist_ok=True)
-    with OUT_JSON.open("w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
 
-    print("Written cadence metadata to:", OUT_JSON)
+def group_cadences(results, rows, table: SignatureTable):
+    """
+    Cadence rows grouped by soprano signature as the cadence page shows
+    them: groups of two or more, each listed by Riemenschneider number,
+    in order of first appearance. All sorts are stable, as in the browser.
+    """
+    by_sig = {}
+    for i in rows:
+        sig = table.id_of(results[i].get("soprano_signature"))
+        if sig is not None:
+            by_sig.setdefault(sig, []).append(i)
+
+    return [
+        sorted(members, key=lambda i: riemenschneider_key(results[i]))
+        for members in by_sig.values()
+        if len(members) > 1
+    ]
+
+
+def group_orders(results, groups, table: SignatureTable) -> dict:
+    """For every GROUP_SORTS option, the group positions in display order."""
+    types = cadence_features.CADENCE_TYPES
+    roles = cadence_features.SOPRANO_ROLES
+
+    def rep(g):
+        return results[groups[g][0]]
+
+    def riem(g):
+        return riemenschneider_key(rep(g))
+
+    def code(value, codes):
+        return codes.index(value) if value in codes else len(codes) - 1
+
+    def sig(g, field):
+        sig_id = table.id_of(rep(g).get(field))
+        return -1 if sig_id is None else sig_id
+
+    keys = {
+        "default": lambda g: riem(g),
+        "final-soprano": lambda g: (code(rep(g).get("final_soprano_role"), roles), riem(g)),
+        "cadence-type": lambda g: (code((rep(g).get("cadence_type") or "").lower(), types), riem(g)),
+        "soprano-line": lambda g: (sig(g, "soprano_signature"), riem(g)),
+        "bass-line": lambda g: (sig(g, "bass_signature"), riem(g)),
+    }
+    return {name: sorted(range(len(groups)), key=keys[name]) for name in GROUP_SORTS}
+
+
+def build_group_tables(results, table: SignatureTable):
+    """
+    The cadence page's groups for every cadence type x final soprano role
+    filter ("" for All), with their sort orders, so that switching filters
+    is a lookup. Groups are lists of row numbers in cadences_index.json.
+    """
+    types = cadence_features.CADENCE_TYPES
+    roles = cadence_features.SOPRANO_ROLES
+
+    tables = {}
+    for type_filter in [""] + types:
+        for role_filter in [""] + roles:
+            rows = [
+                i for i, r in enumerate(results)
+                if (not type_filter or r.get("cadence_type") == type_filter)
+                and (
+                    not role_filter
+                    or r.get("final_soprano_role") == role_filter
+                    or (role_filter == "other" and r.get("final_soprano_role") not in roles[:-1])
+                )
+            ]
+            groups = group_cadences(results, rows, table)
+            tables[f"{type_filter}|{role_filter}"] = {
+                "groups": groups,
+                "orders": group_orders(results, groups, table),
+            }
+
+    return {
+        "version": INDEX_VERSION,
+        "cadenceCount": len(results),
+        "sorts": GROUP_SORTS,
+        "tables": tables,
+    }
+
+
+def save_group_tables(data, out_path: Path = GROUPS_JSON):
+    """Write the group tables with one compact line per filter combination."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    header = {k: v for k, v in data.items() if k != "tables"}
+    lines = [
+        json.dumps(key) + ":" + json.dumps(t, separators=(",", ":"))
+        for key, t in data["tables"].items()
+    ]
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write(json.dumps(header, separators=(",", ":"))[:-1])
+        f.write(',"tables":{\n' + ",\n".join(lines) + "\n}}\n")
+
+    print(f"Written cadence group tables ({len(lines)} filters) to:", out_path)
+
+
+def save_signatures(table: SignatureTable, out_path: Path = SIGNATURES_JSON):
+    """Write the signature strings, one per line, in ID order."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write("[\n" + ",\n".join(json.dumps(s) for s in table.to_json()) + "\n]\n")
+
+    print(f"Written {len(table)} cadence signatures to:", out_path)
+
+
+# Record fields the index and group tables are built from.
+INDEX_RECORD_FIELDS = [
+    "id",
+    "riemenschneider",
+    "bwv",
+    "chorale_title",
+    "key_original",
+    "time_signature",
+    "source_musicxml",
+    "start_measure",
+    "end_measure",
+    "cadence_type",
+    "final_soprano_role",
+    "final_soprano_name",
+    "final_bass_name",
+    "soprano_signature",
+    "bass_signature",
+]
+
+
+def save_derived_outputs():
+    """
+    Build cadence_signatures.json, the slim cadences_index.json the cadence
+    page filters on with its prebuilt group tables, the voices its melody
+    search reads and the per-chorale detail shards from cadences_meta.json.
+    The file is streamed again for each of the last two, so only the index
+    fields of each record are held in memory.
+    """
+    strings = set()
+    rows = []
+    for r in iter_json_array(OUT_JSON):
+        strings.update(r.get(f) for f in SIGNATURE_FIELDS)
+        rows.append({f: r.get(f) for f in INDEX_RECORD_FIELDS})
+
+    table = SignatureTable(strings)
+    save_signatures(table)
+    save_index(build_index(rows, table))
+    save_group_tables(build_group_tables(rows, table))
+    save_voices(iter_json_array(OUT_JSON))
+    save_details(iter_json_array(OUT_JSON), table)
+
+
+def save_results(results):
+    """
+    Stream results (any iterable of records) into cadences_meta.json, then
+    write the outputs derived from it; the index and shards refer to
+    signatures by ID into cadence_signatures.json.
+    """
+    count = write_json_array(OUT_JSON, results)
+    print(f"Written cadence metadata ({count} cadences) to:", OUT_JSON)
+
+    save_derived_outputs()
 
 
 if __name__ == "__main__":
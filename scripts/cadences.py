@@ -1,5 +1,12 @@
+import argparse
 from pathlib import Path
-from music21 import converter, stream, expressions, clef
+from music21 import stream, clef
+
+from parallel import add_jobs_argument, run_jobs
+from score_cache import parse_file
+import instrument
+import structure_index
+import xml_slice
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -8,52 +15,12 @@ OUT_DIR = BASE_DIR / "xml" / "scores_cadence"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def has_fermata(n):
-    for exp in n.expressions:
-        if isinstance(exp, expressions.Fermata):
-            return True
-    for art in n.articulations:
-        if getattr(art, "name", "").lower() == "fermata":
-            return True
-    return False
-
-
-def find_fermata_points(score):
-    soprano = score.parts[0]
-    fermata_by_measure = {}
-
-    for n in soprano.recurse().notesAndRests:
-        if not has_fermata(n):
-            continue
-        mnum = n.measureNumber
-        if mnum is None:
-            continue
-
-        existing = fermata_by_measure.get(mnum)
-        if existing is None:
-            fermata_by_measure[mnum] = n
-        else:
-            if (n.beat < existing.beat) or (
-                n.beat == existing.beat and n.offset < existing.offset
-            ):
-                fermata_by_measure[mnum] = n
-
-    return [
-        (mnum, fermata_by_measure[mnum])
-        for mnum in sorted(fermata_by_measure.keys())
-    ]
-
-
-def extract_cadence(score, base_stem, idx, mnum, fermata_note):
-    fermata_beat = fermata_note.beat
-    fermata_offset = fermata_note.offset
-
-    if fermata_beat == 1 and mnum > 1:
-        start_measure = mnum - 1
-    else:
-        start_measure = mnum
-
-    end_measure = mnum
+def extract_cadence(score, base_stem, idx, bound, write: bool = True):
+    """
+    Slice one cadence; bound is (start_measure, end_measure, fermata_offset,
+    fermata_beat) from ChoraleStructure.cadence_bounds().
+    """
+    start_measure, end_measure, fermata_offset, fermata_beat = bound
 
     cad_score = stream.Score()
     if score.metadata:
@@ -88,26 +55,52 @@ def extract_cadence(score, base_stem, idx, mnum, fermata_note):
 
     out_name = f"{base_stem}_cad{idx + 1}_m{start_measure}-{end_measure}.musicxml"
     out_path = OUT_DIR / out_name
-    cad_score.write("musicxml", out_path)
-    print(f"Generated: {out_name} (measures {start_measure}–{end_measure})")
+    if write:
+        with instrument.phase("write"):
+            cad_score.write("musicxml", out_path)
+        print(f"Generated: {out_name} (measures {start_measure}–{end_measure})")
+
+    return out_path, cad_score, fermata_beat
+
+
+def process_score(score, structure, write: bool = True):
+    """
+    Slice every fermata cadence out of a parsed chorale, at the bounds its
+    structure index entry gives. Returns [(out_path, cad_score, fermata_beat)];
+    with write=False the excerpts stay in memory and out_path is only their
+    would-be name.
+    """
+    bounds = structure.cadence_bounds()
+    if not bounds:
+        print("  No fermata found. Skipped.")
+        return []
+
+    return [
+        extract_cadence(score, structure.stem, idx, bound, write)
+        for idx, bound in enumerate(bounds)
+    ]
 
 
 def process_file(path: Path):
     print(f"Processing: {path.name}")
-    score = converter.parse(path)
+    structure = structure_index.build_structure(path)
+    process_score(parse_file(path), structure)
+    return structure
 
-    fermata_points = find_fermata_points(score)
-    if not fermata_points:
-        print("  No fermata found. Skipped.")
-        return
-
-    base_stem = path.stem
 
-    for idx, (mnum, note_obj) in enumerate(fermata_points):
-        extract_cadence(score, base_stem, idx, mnum, note_obj)
+def process_file_xml(path: Path):
+    print(f"Processing: {path.name}")
+    structure = structure_index.build_structure(path)
+    xml_slice.write_cadences(path, OUT_DIR, structure)
+    return structure
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Slice fermata cadences out of xml/scores.")
+    add_jobs_argument(parser)
+    xml_slice.add_engine_argument(parser)
+    args = parser.parse_args()
+
     xml_files = sorted(SRC_DIR.glob("*.xml")) + sorted(SRC_DIR.glob("*.musicxml"))
 
     print("Source chorale files:", len(xml_files))
@@ -118,8 +111,9 @@ def main():
         print("No MusicXML files found.")
         return
 
-    for path in xml_files:
-        process_file(path)
+    job = process_file_xml if args.engine == "xml" else process_file
+    # cadence_meta.py reads each cadence's fermata beat from the structure index.
+    structure_index.save_structures(run_jobs(job, xml_files, args.jobs))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,257 @@
+import argparse
+from functools import lru_cache
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from structure_index import build_structure
+import xml_slice
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SCORES_DIR = BASE_DIR / "xml" / "scores"
+INDEX_PATH = BASE_DIR / "data" / "excerpts_index.json"
+INDEX_VERSION = 1
+
+SOURCE_CACHE_SIZE = 32
+
+
+def relative_path(path: Path) -> str:
+    return Path(path).resolve().relative_to(BASE_DIR).as_posix()
+
+
+def cadence_record(source: str, start, end, offset, beat) -> Dict[str, Any]:
+    return {
+        "kind": "cadence",
+        "source": source,
+        "start": [start, 0.0],
+        "end": [end, offset],
+        "endInclusive": True,
+        "clef": "cadence",
+        "fermataBeat": beat,
+    }
+
+
+def phrase_record(source: str, s_meas, s_off, e_meas, e_off) -> Dict[str, Any]:
+    return {
+        "kind": "phrase",
+        "source": source,
+        "start": [s_meas, s_off],
+        "end": [e_meas, e_off],
+        "endInclusive": False,
+        "clef": "phrase",
+    }
+
+
+def excerpt_records(path: Path, structure=None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    [(excerpt path, record)] for every cadence and phrase of one chorale,
+    named exactly like the files cadences.py and extract_phrases.py write.
+    A record is all xml_slice needs to cut the excerpt again.
+    """
+    if structure is None:
+        structure = build_structure(path)
+    source = relative_path(path)
+    cadence_dir = relative_path(xml_slice.CADENCE_DIR)
+    phrase_dir = relative_path(xml_slice.PHRASE_DIR)
+
+    items = []
+    for idx, (start, end, offset, beat) in enumerate(structure.cadence_bounds(), start=1):
+        name = f"{path.stem}_cad{idx}_m{start}-{end}.musicxml"
+        items.append((f"{cadence_dir}/{name}", cadence_record(source, start, end, offset, beat)))
+
+    for idx, bound in enumerate(structure.phrase_bounds(), start=1):
+        name = f"{path.stem}_phrase{idx:02d}.musicxml"
+        items.append((f"{phrase_dir}/{name}", phrase_record(source, *bound)))
+
+    return items
+
+
+def source_stem_of(record) -> str:
+    return Path(record["source"]).stem
+
+
+def save_index(items, out_path: Path = INDEX_PATH):
+    """Write the excerpt index (one compact line per excerpt, sorted by path)."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [
+        f"{json.dumps(key)}:{json.dumps(record, separators=(',', ':'))}"
+        for key, record in sorted(items, key=lambda item: item[0])
+    ]
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write('{"version":%d,"excerpts":{\n' % INDEX_VERSION)
+        f.write(",\n".join(lines))
+        f.write("\n}}\n")
+
+    print(f"Saved {len(lines)} excerpt records to:", out_path)
+
+
+def load_index(path: Path = INDEX_PATH) -> Optional[Dict[str, Dict[str, Any]]]:
+    if not path.exists():
+        return None
+    with path.open(encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != INDEX_VERSION:
+        return None
+    return data["excerpts"]
+
+
+@lru_cache(maxsize=SOURCE_CACHE_SIZE)
+def load_source(source: str) -> xml_slice.SourceScore:
+    return xml_slice.SourceScore(BASE_DIR / source)
+
+
+def render_record(record) -> bytes:
+    """MusicXML bytes of one excerpt record, cut from its (cached) source score."""
+    source = load_source(record["source"])
+    (s_meas, s_off), (e_meas, e_off) = record["start"], record["end"]
+    tree = source.excerpt(
+        s_meas,
+        s_off,
+        e_meas,
+        e_off,
+        end_inclusive=record["endInclusive"],
+        clef_mode=record["clef"],
+    )
+    return xml_slice.tree_bytes(tree)
+
+
+class ExcerptService:
+    """
+    On-demand excerpts for the paths listed in the excerpt index.
+    Rendered excerpts are small; the parsed source scores they are cut from
+    are what the LRU cache keeps (SOURCE_CACHE_SIZE chorales).
+    """
+
+    def __init__(self, index: Dict[str, Dict[str, Any]]):
+        self.index = index
+
+    @classmethod
+    def load(cls):
+        index = load_index()
+        if index is None:
+            raise FileNotFoundError(f"No excerpt index at {INDEX_PATH}; run excerpts.py index")
+        return cls(index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def render(self, key: str) -> bytes:
+        return render_record(self.index[key])
+
+
+def make_handler(service: ExcerptService):
+    class ExcerptRequestHandler(SimpleHTTPRequestHandler):
+        """Static site files, with indexed excerpt paths rendered on the fly."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(BASE_DIR), **kwargs)
+
+        def _excerpt_key(self):
+            key = unquote(urlsplit(self.path).path).lstrip("/")
+            return key if key in service else None
+
+        def _send_excerpt(self, key, with_body: bool):
+            try:
+                body = service.render(key)
+            except Exception as e:
+                self.send_error(500, f"Excerpt render failed: {e}")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.recordare.musicxml+xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "public, max-age=3600")
+            self.end_headers()
+            if with_body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            key = self._excerpt_key()
+            if key is None:
+                return super().do_GET()
+            self._send_excerpt(key, True)
+
+        def do_HEAD(self):
+            key = self._excerpt_key()
+            if key is None:
+                return super().do_HEAD()
+            self._send_excerpt(key, False)
+
+    return ExcerptRequestHandler
+
+
+def build_index(files) -> List[Tuple[str, Dict[str, Any]]]:
+    items = []
+    for path in files:
+        try:
+            items.extend(excerpt_records(path))
+        except Exception as e:
+            print("Error while indexing", path.name, "->", e)
+    return items
+
+
+def prune(index) -> int:
+    """Delete materialized excerpt files that the index can render instead."""
+    removed = 0
+    for key in index:
+        path = BASE_DIR / key
+        if path.exists():
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Describe cadence/phrase excerpts by their bounds and render them on demand."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("index", help=f"write {INDEX_PATH.relative_to(BASE_DIR)} from xml/scores")
+
+    render_p = sub.add_parser("render", help="print or save one excerpt")
+    render_p.add_argument("key", help="excerpt path, e.g. xml/scores_cadence/bwv101_7_cad1_m2-2.musicxml")
+    render_p.add_argument("-o", "--output", type=Path)
+
+    serve_p = sub.add_parser("serve", help="serve the site with excerpts rendered on request")
+    serve_p.add_argument("--port", type=int, default=8000)
+    serve_p.add_argument("--bind", default="127.0.0.1")
+
+    sub.add_parser("prune", help="delete materialized excerpt files covered by the index")
+
+    args = parser.parse_args()
+
+    if args.command == "index":
+        files = sorted(SCORES_DIR.glob("*.xml")) + sorted(SCORES_DIR.glob("*.musicxml"))
+        save_index(build_index(files))
+        return
+
+    service = ExcerptService.load()
+
+    if args.command == "render":
+        if args.key not in service:
+            print("Not in the excerpt index:", args.key)
+            return
+        body = service.render(args.key)
+        if args.output:
+            args.output.write_bytes(body)
+        else:
+            print(body.decode("utf-8"))
+
+    elif args.command == "serve":
+        server = ThreadingHTTPServer((args.bind, args.port), make_handler(service))
+        print(f"Serving {BASE_DIR} with {len(service.index)} virtual excerpts "
+              f"on http://{args.bind}:{args.port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == "prune":
+        print(f"Removed {prune(service.index)} excerpt files.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,102 @@
 from pathlib import Path
 import json
-from music21 import corpus
 import xml.etree.ElementTree as ET
 
+from score_cache import parse_corpus
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_PATH = BASE_DIR / "data" / "chorales_meta.json"
 SCORES_DIR = BASE_DIR / "xml" / "scores"
 SCORES_DIR.mkdir(parents=True, exist_ok=True)
 
-with DATA_PATH.open("r", encoding="utf-8") as f:
-    chorales = json.load(f)
 
-print(f"Exporting MusicXML for {len(chorales)} chorales...")
+def label_for(ch) -> str:
+    riem = ch.get("riemenschneider") or ch.get("id")
+    title = ch.get("title") or ""
+    return f"{riem}. {title}"
+
+
+def export_chorale(ch, score, out_path: Path):
+    """
+    Write one chorale to MusicXML, then replace the title fields with the
+    "<riem>. <title>" label and blank out composer/lyricist credits.
+    """
+    score.write("musicxml", fp=str(out_path))
+
+    tree = ET.parse(out_path)
+    root = tree.getroot()
+
+    if root.tag.startswith("{"):
+        ns_uri = root.tag.split("}")[0][1:]
+    else:
+        ns_uri = None
+
+    def q(tag: str) -> str:
+        return f"{{{ns_uri}}}{tag}" if ns_uri else tag
+
+    label = label_for(ch)
 
-for ch in chorales:
-    corpus_path = ch.get("corpus_path")
-    musicxml_path = ch.get("musicxml_path")
+    mts = root.findall(q("movement-title"))
+    if not mts:
+        mt = ET.Element(q("movement-title"))
+        root.insert(0, mt)
+        mts = [mt]
+    for mt in mts:
+        mt.text = label
 
-    if not corpus_path or not musicxml_path:
-        print(f"Skip: missing path info for R{ch.get('riemenschneider')}")
-        continue
+    works = root.findall(q("work"))
+    if not works:
+        work = ET.Element(q("work"))
+        root.insert(0, work)
+        works = [work]
+    work = works[0]
 
-    out_path = SCORES_DIR / Path(musicxml_path).name
+    wts = work.findall(q("work-title"))
+    if not wts:
+        wt = ET.SubElement(work, q("work-title"))
+        wts = [wt]
+    for wt in wts:
+        wt.text = label
 
-    try:
-        score = corpus.parse(corpus_path)
-        score.write("musicxml", fp=str(out_path))
+    for ident in root.findall(q("identification")):
+        for creator in ident.findall(q("creator")):
+            t = (creator.get("type") or "").lower()
+            if t in ("composer", "lyricist"):
+                creator.text = ""
 
-        tree = ET.parse(out_path)
-        root = tree.getroot()
+    for credit in root.findall(q("credit")):
+        for words in credit.findall(q("credit-words")):
+            words.text = ""
 
-        if root.tag.startswith("{"):
-            ns_uri = root.tag.split("}")[0][1:]
-        else:
-            ns_uri = None
+    tree.write(out_path, encoding="utf-8", xml_declaration=True)
 
-        def q(tag: str) -> str:
-            return f"{{{ns_uri}}}{tag}" if ns_uri else tag
 
-        riem = ch.get("riemenschneider") or ch.get("id")
-        title = ch.get("title") or ""
-        label = f"{riem}. {title}"
+def main():
+    with DATA_PATH.open("r", encoding="utf-8") as f:
+        chorales = json.load(f)
 
-        mts = root.findall(q("movement-title"))
-        if not mts:
-            mt = ET.Element(q("movement-title"))
-            root.insert(0, mt)
-            mts = [mt]
-        for mt in mts:
-            mt.text = label
+    print(f"Exporting MusicXML for {len(chorales)} chorales...")
 
-        works = root.findall(q("work"))
-        if not works:
-            work = ET.Element(q("work"))
-            root.insert(0, work)
-            works = [work]
-        work = works[0]
+    for ch in chorales:
+        corpus_path = ch.get("corpus_path")
+        musicxml_path = ch.get("musicxml_path")
 
-        wts = work.findall(q("work-title"))
-        if not wts:
-            wt = ET.SubElement(work, q("work-title"))
-            wts = [wt]
-        for wt in wts:
-            wt.text = label
+        if not corpus_path or not musicxml_path:
+            print(f"Skip: missing path info for R{ch.get('riemenschneider')}")
+            continue
 
-        for ident in root.findall(q("identification")):
-            for creator in ident.findall(q("creator")):
-                t = (creator.get("type") or "").lower()
-                if t in ("composer", "lyricist"):
-                    creator.text = ""
+        out_path = SCORES_DIR / Path(musicxml_path).name
 
-        for credit in root.findall(q("credit")):
-            for words in credit.findall(q("credit-words")):
-                words.text = ""
+        try:
+            score = parse_corpus(corpus_path)
+            export_chorale(ch, score, out_path)
+            print(f"OK: {corpus_path} -> {out_path.name}")
 
-        tree.write(out_path, encoding="utf-8", xml_declaration=True)
+        except Exception as e:
+            print(f"Error: {corpus_path} -> {e}")
 
-        print(f"OK: {corpus_path} -> {out_path.name}")
+    print("Done.")
 
-    except Exception as e:
-        print(f"Error: {corpus_path} -> {e}")
 
-print("Done.")
+if __name__ == "__main__":
+    main()
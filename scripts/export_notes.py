@@ -1,6 +1,11 @@
+from functools import partial
 from pathlib import Path
+import argparse
 import json
-from music21 import corpus
+
+from notes_binary import encode_notes_record
+from parallel import add_jobs_argument, run_jobs
+from score_cache import parse_corpus
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
@@ -11,10 +16,25 @@ AUDIO_NOTES_DIR.mkdir(parents=True, exist_ok=True)
 
 DEFAULT_TEMPO_QPM = 80
 
-with META_PATH.open("r", encoding="utf-8") as f:
-    chorales_meta = json.load(f)
+NOTES_FORMATS = ["json", "binary", "both"]
+
+
+def notes_filename_for(bwv) -> str:
+    bwv_str = str(bwv).replace(".", "_")
+    return f"bwv{bwv_str}.json"
+
 
-print(f"Loaded {len(chorales_meta)} chorales from chorales_meta.json")
+def notes_binary_filename_for(bwv) -> str:
+    return notes_filename_for(bwv)[: -len(".json")] + ".bin"
+
+
+def add_format_argument(parser):
+    parser.add_argument(
+        "--notes-format",
+        choices=NOTES_FORMATS,
+        default="json",
+        help="audio_notes output: pretty JSON (default), packed .bin columns, or both",
+    )
 
 
 def extract_parts_notes(score):
@@ -71,7 +91,51 @@ def extract_parts_notes(score):
     return parts_data
 
 
-for ch_meta in chorales_meta:
+def build_notes_record(ch_meta, score):
+    riem = (
+        ch_meta.get("riem")
+        or ch_meta.get("riemenschneider")
+        or ch_meta.get("id")
+    )
+
+    parts_data = extract_parts_notes(score)
+    if not parts_data:
+        return None
+
+    return {
+        "riem": riem,
+        "bwv": str(ch_meta.get("bwv")),
+        "tempo_qpm": DEFAULT_TEMPO_QPM,
+        "time_signature": ch_meta.get("time_signature"),
+        "total_duration_beats": float(score.highestTime),
+        "parts": parts_data,
+    }
+
+
+def save_notes_record(out_obj, out_path: Path):
+    with out_path.open("w", encoding="utf-8") as f:
+        json.dump(out_obj, f, ensure_ascii=False, indent=2)
+
+
+def save_notes_binary(out_obj, out_path: Path):
+    out_path.write_bytes(encode_notes_record(out_obj))
+
+
+def save_notes_outputs(out_obj, bwv, notes_format: str = "json"):
+    """Write the record in the requested format(s) and return the paths written."""
+    written = []
+    if notes_format in ("json", "both"):
+        out_path = AUDIO_NOTES_DIR / notes_filename_for(bwv)
+        save_notes_record(out_obj, out_path)
+        written.append(out_path)
+    if notes_format in ("binary", "both"):
+        out_path = AUDIO_NOTES_DIR / notes_binary_filename_for(bwv)
+        save_notes_binary(out_obj, out_path)
+        written.append(out_path)
+    return written
+
+
+def export_chorale_notes(ch_meta, notes_format: str = "json"):
     riem = (
         ch_meta.get("riem")
         or ch_meta.get("riemenschneider")
@@ -79,40 +143,67 @@ for ch_meta in chorales_meta:
     )
     bwv = ch_meta.get("bwv")
     corpus_path = ch_meta.get("corpus_path")
-    time_sig = ch_meta.get("time_signature")
 
-    if not corpus_path or not bwv:
-        print(f"Skip R{riem}: missing corpus_path or bwv")
-        continue
+    try:
+        score = parse_corpus(corpus_path)
 
-    bwv_str = str(bwv).replace(".", "_")
-    out_path = AUDIO_NOTES_DIR / f"bwv{bwv_str}.json"
+        out_obj = build_notes_record(ch_meta, score)
+        if out_obj is None:
+            print(f"Warning R{riem}: BWV{bwv} has no parts data")
+            return
 
-    try:
-        score = corpus.parse(corpus_path)
+        written = save_notes_outputs(out_obj, bwv, notes_format)
 
-        total_duration_beats = float(score.highestTime)
+        print(f"OK R{riem}: BWV{bwv} -> {', '.join(p.name for p in written)}")
 
-        parts_data = extract_parts_notes(score)
-        if not parts_data:
-            print(f"Warning R{riem}: BWV{bwv} has no parts data")
+    except Exception as e:
+        print(f"Error R{riem}: BWV{bwv} ({corpus_path}) -> {e}")
+
+
+def export_notes_group(group, notes_format: str = "json"):
+    """
+    Export chorales that share one output file, in metadata order, so the
+    last record wins exactly as in a serial run.
+    """
+    for ch_meta in group:
+        export_chorale_notes(ch_meta, notes_format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export per-chorale note JSON for audio playback.")
+    add_format_argument(parser)
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    with META_PATH.open("r", encoding="utf-8") as f:
+        chorales_meta = json.load(f)
+
+    print(f"Loaded {len(chorales_meta)} chorales from chorales_meta.json")
+
+    groups = {}
+
+    for ch_meta in chorales_meta:
+        riem = (
+            ch_meta.get("riem")
+            or ch_meta.get("riemenschneider")
+            or ch_meta.get("id")
+        )
+        bwv = ch_meta.get("bwv")
+
+        if not ch_meta.get("corpus_path") or not bwv:
+            print(f"Skip R{riem}: missing corpus_path or bwv")
             continue
 
-        out_obj = {
-            "riem": riem,
-            "bwv": str(bwv),
-            "tempo_qpm": DEFAULT_TEMPO_QPM,
-            "time_signature": time_sig,
-            "total_duration_beats": total_duration_beats,
-            "parts": parts_data,
-        }
+        groups.setdefault(notes_filename_for(bwv), []).append(ch_meta)
 
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(out_obj, f, ensure_ascii=False, indent=2)
+    run_jobs(
+        partial(export_notes_group, notes_format=args.notes_format),
+        list(groups.values()),
+        args.jobs,
+    )
 
-        print(f"OK R{riem}: BWV{bwv} -> {out_path.name}")
+    print("Done")
 
-    except Exception as e:
-        print(f"Error R{riem}: BWV{bwv} ({corpus_path}) -> {e}")
 
-print("Done")
+if __name__ == "__main__":
+    main()
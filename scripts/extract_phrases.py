@@ -1,171 +1,31 @@
-import copy
-from dataclasses import dataclass
+import argparse
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from music21 import (
-    articulations,
     clef,
-    converter,
-    expressions,
     key,
     meter,
     note,
     stream,
 )
 
-INPUT_DIR = Path("/Users/joeun/Desktop/ChoraleDictionary/xml/scores")
-OUTPUT_DIR = Path("/Users/joeun/Desktop/ChoraleDictionary/xml/scores_phrase")
+from parallel import add_jobs_argument, run_jobs
+from score_cache import parse_file
+import instrument
+import structure_index
+import xml_slice
 
-VALID_EXT = {".xml", ".musicxml", ".mxl"}
-
-
-@dataclass
-class FermataEvent:
-    measure: int
-    offset: float
-    length: float
-
-
-def has_fermata(note_or_rest):
-    for e in getattr(note_or_rest, "expressions", []):
-        if isinstance(e, expressions.Fermata):
-            return True
-    for a in getattr(note_or_rest, "articulations", []):
-        if isinstance(a, articulations.Fermata):
-            return True
-    return False
-
-
-def get_soprano_fermata_events(score: stream.Score):
-    parts = score.parts
-    if len(parts) == 0:
-        return []
-
-    soprano = parts[0]
-    events = []
-
-    for n in soprano.recurse().notesAndRests:
-        if not has_fermata(n):
-            continue
-
-        m = n.getContextByClass(stream.Measure)
-        if m is None or m.number is None:
-            continue
-
-        ev = FermataEvent(
-            measure=int(m.number),
-            offset=float(n.offset),
-            length=float(n.quarterLength),
-        )
-        events.append(ev)
-
-    events.sort(key=lambda e: (e.measure, e.offset))
-    return events
-
-
-def get_measure_range(score: stream.Score):
-    parts = score.parts
-    if len(parts) == 0:
-        return 1, 1
-
-    soprano = parts[0]
-    measure_numbers = [
-        m.number
-        for m in soprano.getElementsByClass(stream.Measure)
-        if m.number is not None
-    ]
-
-    if not measure_numbers:
-        return 1, 1
-
-    return int(min(measure_numbers)), int(max(measure_numbers))
-
-
-def get_first_soprano_onset(score: stream.Score):
-    parts = score.parts
-    if len(parts) == 0:
-        return None, None
-
-    soprano = parts[0]
-    first_meas = None
-    first_off = None
-
-    for n in soprano.recurse().notes:
-        m = n.getContextByClass(stream.Measure)
-        if m is None or m.number is None:
-            continue
-        meas = int(m.number)
-        off = float(n.offset)
+BASE_DIR = Path(__file__).resolve().parent.parent
 
-        if first_meas is None or (meas < first_meas or (meas == first_meas and off < first_off)):
-            first_meas = meas
-            first_off = off
-
-    return first_meas, first_off
-
-
-def build_phrase_bounds(score: stream.Score):
-    fermatas = get_soprano_fermata_events(score)
-    min_meas, max_meas = get_measure_range(score)
-
-    parts = score.parts
-    if len(parts) == 0:
-        return []
-
-    soprano = parts[0]
-
-    first_meas, first_off = get_first_soprano_onset(score)
-    if first_meas is None:
-        first_meas, first_off = min_meas, 0.0
-
-    if not fermatas:
-        return [(first_meas, first_off, max_meas, None)]
-
-    phrase_bounds = []
-    current_start_measure = first_meas
-    current_start_offset = first_off
-
-    for f in fermatas:
-        end_measure = f.measure
-        end_offset = f.offset + f.length
-
-        phrase_bounds.append(
-            (current_start_measure, current_start_offset, end_measure, end_offset)
-        )
-
-        next_start_measure = end_measure
-        next_start_offset = end_offset
-
-        m_obj = soprano.measure(end_measure)
-        bar_q = None
-        if m_obj is not None and m_obj.barDuration is not None:
-            bar_q = float(m_obj.barDuration.quarterLength)
-
-        if bar_q is not None and next_start_offset >= bar_q - 1e-6:
-            next_start_measure = end_measure + 1
-            next_start_offset = 0.0
-
-        current_start_measure = next_start_measure
-        current_start_offset = next_start_offset
-
-    if current_start_measure <= max_meas:
-        phrase_bounds.append(
-            (current_start_measure, current_start_offset, max_meas, None)
-        )
-
-    return phrase_bounds
+INPUT_DIR = BASE_DIR / "xml" / "scores"
+OUTPUT_DIR = BASE_DIR / "xml" / "scores_phrase"
 
+VALID_EXT = {".xml", ".musicxml", ".mxl"}
 
-def extract_phrase_score(
-    score: stream.Score,
-    start_measure,
-    start_offset: float,
-    end_measure,
-    end_offset: Optional[float],
-) -> stream.Score:
-    new_score = stream.Score()
 
+def get_part_base_attrs(score: stream.Score):
+    """First key signature, time signature and clef of every part, in part order."""
     part_base_attrs = []
     for p in score.parts:
         base_key = None
@@ -190,133 +50,212 @@ def extract_phrase_score(
 
         part_base_attrs.append((base_key, base_time, base_clef))
 
-    for part_idx, p in enumerate(score.parts):
-        new_part = stream.Part()
-        new_part.id = getattr(p, "id", None)
-        new_part.partName = getattr(p, "partName", None)
+    return part_base_attrs
 
-        for m in p.getElementsByClass(stream.Measure):
-            num = m.number
-            if num is None:
-                continue
-            num = int(num)
 
-            if num < start_measure or num > end_measure:
+def slice_measure(m: stream.Measure, elements, bound) -> stream.Measure:
+    """
+    New measure holding the elements of m inside bound.
+    elements is [(element, offset)] read from m once; the element objects
+    are shared with the source score, not copied.
+    """
+    start_measure, start_offset, end_measure, end_offset = bound
+    num = int(m.number)
+
+    new_measure = stream.Measure()
+    new_measure.number = m.number
+
+    for e, off in elements:
+        if num == start_measure and off < start_offset - 1e-6:
+            continue
+
+        if end_offset is not None and num == end_measure:
+            if off >= end_offset - 1e-6:
                 continue
 
-            new_measure = stream.Measure()
-            new_measure.number = m.number
+        if num == start_measure:
+            new_off = off - start_offset
+            if new_off < 0:
+                new_off = 0.0
+        else:
+            new_off = off
 
-            for e in m:
-                if not hasattr(e, "offset"):
-                    new_e = copy.deepcopy(e)
-                    new_measure.insert(0.0, new_e)
-                    continue
+        new_measure.insert(new_off, e)
 
-                off = float(e.offset)
-                keep = True
+    return new_measure
 
-                if num == start_measure and off < start_offset - 1e-6:
-                    keep = False
 
-                if end_offset is not None and num == end_measure:
-                    if off >= end_offset - 1e-6:
-                        keep = False
+def finish_first_measure(first_m: stream.Measure, part_idx: int, base_attrs):
+    """Give a phrase's opening measure its key, time and clef, and drop trailing rests."""
+    base_key, base_time, base_clef = base_attrs
 
-                if not keep:
-                    continue
+    if base_key is not None and not first_m.getElementsByClass(key.KeySignature):
+        first_m.insert(0.0, base_key)
 
-                new_e = copy.deepcopy(e)
+    if base_time is not None and not first_m.getElementsByClass(meter.TimeSignature):
+        first_m.insert(0.0, base_time)
 
-                if num == start_measure:
-                    new_off = off - start_offset
-                    if new_off < 0:
-                        new_off = 0.0
-                else:
-                    new_off = off
+    for cobj in list(first_m.getElementsByClass(clef.Clef)):
+        first_m.remove(cobj)
 
-                new_measure.insert(new_off, new_e)
+    if part_idx in (2, 3):
+        first_m.insert(0.0, clef.BassClef())
+    else:
+        if base_clef is not None:
+            first_m.insert(0.0, base_clef)
+        else:
+            if part_idx in (0, 1):
+                first_m.insert(0.0, clef.TrebleClef())
 
-            new_part.append(new_measure)
+    last_note_end = 0.0
+    for n in first_m.notes:
+        end_pos = float(n.offset) + float(n.quarterLength)
+        if end_pos > last_note_end:
+            last_note_end = end_pos
 
-        measures_in_new = list(new_part.getElementsByClass(stream.Measure))
-        if measures_in_new:
-            first_m = measures_in_new[0]
-            base_key, base_time, base_clef = part_base_attrs[part_idx]
+    if last_note_end > 0:
+        for r in list(first_m.getElementsByClass(note.Rest)):
+            if float(r.offset) >= last_note_end - 1e-6:
+                first_m.remove(r)
 
-            if base_key is not None and not first_m.getElementsByClass(key.KeySignature):
-                first_m.insert(0.0, copy.deepcopy(base_key))
 
-            if base_time is not None and not first_m.getElementsByClass(meter.TimeSignature):
-                first_m.insert(0.0, copy.deepcopy(base_time))
+def extract_phrase_scores(score: stream.Score, bounds) -> List[stream.Score]:
+    """
+    Slice every phrase in bounds [(start_measure, start_offset, end_measure,
+    end_offset)] out of score in a single pass over each part's measures.
 
-            for cobj in list(first_m.getElementsByClass(clef.Clef)):
-                first_m.remove(cobj)
+    Part base attributes are looked up once per score, each source measure
+    is read once whichever phrases it falls in, and notes, rests and the
+    key/time/clef objects added to opening measures are shared with the
+    source score rather than deep-copied. music21 keeps a separate offset
+    per containing stream, and the MusicXML writer works on its own copy,
+    so sharing never changes the source score or another phrase.
+    """
+    part_base_attrs = get_part_base_attrs(score)
+    phrase_scores = [stream.Score() for _ in bounds]
 
-            if part_idx in (2, 3):
-                first_m.insert(0.0, clef.BassClef())
-            else:
-                if base_clef is not None:
-                    first_m.insert(0.0, copy.deepcopy(base_clef))
-                else:
-                    if part_idx in (0, 1):
-                        first_m.insert(0.0, clef.TrebleClef())
+    for part_idx, p in enumerate(score.parts):
+        new_parts = []
+        for _ in bounds:
+            new_part = stream.Part()
+            new_part.id = getattr(p, "id", None)
+            new_part.partName = getattr(p, "partName", None)
+            new_parts.append(new_part)
 
-            last_note_end = 0.0
-            for n in first_m.notes:
-                end_pos = float(n.offset) + float(n.quarterLength)
-                if end_pos > last_note_end:
-                    last_note_end = end_pos
+        for m in p.getElementsByClass(stream.Measure):
+            if m.number is None:
+                continue
+            num = int(m.number)
 
-            if last_note_end > 0:
-                for r in list(first_m.getElementsByClass(note.Rest)):
-                    if float(r.offset) >= last_note_end - 1e-6:
-                        first_m.remove(r)
+            covering = [
+                idx for idx, (s_meas, _, e_meas, _) in enumerate(bounds)
+                if s_meas <= num <= e_meas
+            ]
+            if not covering:
+                continue
 
-        new_score.insert(0, new_part)
+            elements = [(e, float(e.offset)) for e in m]
+            for idx in covering:
+                new_parts[idx].append(slice_measure(m, elements, bounds[idx]))
 
-    new_score.metadata = score.metadata
-    return new_score
+        for idx, new_part in enumerate(new_parts):
+            measures_in_new = list(new_part.getElementsByClass(stream.Measure))
+            if measures_in_new:
+                finish_first_measure(measures_in_new[0], part_idx, part_base_attrs[part_idx])
+            phrase_scores[idx].insert(0, new_part)
 
+    for phrase_score in phrase_scores:
+        phrase_score.metadata = score.metadata
 
-def process_file(path: Path):
-    print(f"Processing: {path.name}")
-    try:
-        score = converter.parse(str(path))
-    except Exception as e:
-        print("  Parse failed:", e)
-        return
+    return phrase_scores
 
-    bounds = build_phrase_bounds(score)
+
+def extract_phrase_score(
+    score: stream.Score,
+    start_measure,
+    start_offset: float,
+    end_measure,
+    end_offset: Optional[float],
+) -> stream.Score:
+    return extract_phrase_scores(
+        score, [(start_measure, start_offset, end_measure, end_offset)]
+    )[0]
+
+
+def process_score(score: stream.Score, structure, write: bool = True):
+    """
+    Write every phrase of a parsed chorale, at the bounds its structure
+    index entry gives; returns [(out_path, phrase_score)].
+    With write=False the phrases stay in memory (out_path is only their name).
+    """
+    base_name = structure.stem
+    bounds = structure.phrase_bounds()
     if not bounds:
         print("  No phrase bounds. Skipped.")
-        return
+        return []
 
-    base_name = path.stem
+    try:
+        phrase_scores = extract_phrase_scores(score, bounds)
+    except Exception as e:
+        print("  Phrase slicing failed:", e)
+        return []
 
-    for idx, (s_meas, s_off, e_meas, e_off) in enumerate(bounds, start=1):
+    results = []
+
+    for idx, ((s_meas, s_off, e_meas, e_off), phrase_score) in enumerate(
+        zip(bounds, phrase_scores), start=1
+    ):
         try:
-            phrase_score = extract_phrase_score(score, s_meas, s_off, e_meas, e_off)
             out_name = f"{base_name}_phrase{idx:02d}.musicxml"
             out_path = OUTPUT_DIR / out_name
-            phrase_score.write("musicxml", fp=str(out_path))
-
-            if e_off is None:
-                print(
-                    f"  Saved: {out_name} "
-                    f"(measures {s_meas}:{s_off} ~ {e_meas}:end)"
-                )
-            else:
-                print(
-                    f"  Saved: {out_name} "
-                    f"(measures {s_meas}:{s_off} ~ {e_meas}:{e_off})"
-                )
+            if write:
+                with instrument.phase("write"):
+                    phrase_score.write("musicxml", fp=str(out_path))
+
+                if e_off is None:
+                    print(
+                        f"  Saved: {out_name} "
+                        f"(measures {s_meas}:{s_off} ~ {e_meas}:end)"
+                    )
+                else:
+                    print(
+                        f"  Saved: {out_name} "
+                        f"(measures {s_meas}:{s_off} ~ {e_meas}:{e_off})"
+                    )
+            results.append((out_path, phrase_score))
 
         except Exception as e:
             print(f"  Phrase save failed (#{idx}):", e)
 
+    return results
+
+
+def process_file(path: Path):
+    print(f"Processing: {path.name}")
+    try:
+        score = parse_file(path)
+        structure = structure_index.build_structure(path)
+    except Exception as e:
+        print("  Parse failed:", e)
+        return
+
+    process_score(score, structure)
+
+
+def process_file_xml(path: Path):
+    print(f"Processing: {path.name}")
+    try:
+        xml_slice.write_phrases(path, OUTPUT_DIR, structure_index.build_structure(path))
+    except Exception as e:
+        print("  Phrase slicing failed:", e)
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Write one MusicXML file per fermata phrase.")
+    add_jobs_argument(parser)
+    xml_slice.add_engine_argument(parser)
+    args = parser.parse_args()
+
     if not INPUT_DIR.exists():
         print("Input folder not found:", INPUT_DIR)
         return
@@ -332,8 +271,8 @@ def main():
         print("No MusicXML files in input folder:", INPUT_DIR)
         return
 
-    for path in sorted(files):
-        process_file(path)
+    job = process_file_xml if args.engine == "xml" else process_file
+    run_jobs(job, sorted(files), args.jobs)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,375 @@
+from pathlib import Path
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import signal
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILE_DIR = BASE_DIR / ".cache" / "profile"
+
+# CHORALE_PROFILE=MODE[:STAGE,STAGE...] turns instrumentation on (or --profile).
+#   time      per-stage wall time, parse/compute/write split, peak RSS, output bytes
+#   cprofile  the same, plus cProfile of the listed stages (all if none are listed)
+#   sample    the same, plus a signal-based sampling profile of the listed stages
+ENV_VAR = "CHORALE_PROFILE"
+# Run folder shared with worker processes, which inherit the environment.
+RUN_ENV_VAR = "CHORALE_PROFILE_RUN"
+MODES = ("time", "cprofile", "sample")
+
+SAMPLE_INTERVAL = 0.005
+TOP = 10
+
+_recorder = None
+
+
+def parse_spec(value):
+    """(mode, set of stage names or None for all) of a CHORALE_PROFILE value; mode None = off."""
+    value = (value or "").strip()
+    if value.lower() in ("", "0", "off", "false", "no"):
+        return None, None
+    mode, _, stages = value.partition(":")
+    mode = mode.strip().lower()
+    if mode in ("1", "on", "true", "yes"):
+        mode = "time"
+    if mode not in MODES:
+        print(f"Unknown {ENV_VAR} mode {mode!r}; timing only ({', '.join(MODES)}).")
+        mode = "time"
+    names = {s.strip() for s in stages.split(",") if s.strip()}
+    return mode, names or None
+
+
+def add_profile_argument(parser):
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="time",
+        metavar="MODE[:STAGES]",
+        help="record per-stage timing, memory and output size (time), optionally with "
+        f"cProfile (cprofile) or a sampling profiler (sample); same as {ENV_VAR}=MODE",
+    )
+
+
+def configure(spec=None) -> bool:
+    """
+    Start a profiled run if spec (a --profile value) or CHORALE_PROFILE asks
+    for one: create its run folder, hand it to worker processes through the
+    environment and print the report when the process exits.
+    """
+    if spec:
+        os.environ[ENV_VAR] = spec
+    mode, _ = parse_spec(os.environ.get(ENV_VAR))
+    if mode is None:
+        return False
+    if os.environ.get(RUN_ENV_VAR):
+        return True
+
+    run_dir = PROFILE_DIR / time.strftime("%Y%m%d-%H%M%S")
+    run_dir.mkdir(parents=True, exist_ok=True)
+    os.environ[RUN_ENV_VAR] = str(run_dir)
+    print(f"Profiling ({mode}) into {run_dir}")
+    atexit.register(report, run_dir)
+    return True
+
+
+def enabled() -> bool:
+    return recorder() is not None
+
+
+def recorder():
+    """This process's _Recorder, or None when instrumentation is off."""
+    global _recorder
+    if _recorder is not None and _recorder.pid == os.getpid():
+        return _recorder
+
+    mode, stages = parse_spec(os.environ.get(ENV_VAR))
+    if mode is None:
+        _recorder = None
+        return None
+    if not os.environ.get(RUN_ENV_VAR):
+        configure()
+    _recorder = _Recorder(mode, stages, Path(os.environ[RUN_ENV_VAR]))
+    return _recorder
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class _Sampler:
+    """
+    Counts collapsed stacks of the main thread, sampled on a CPU-time timer;
+    enable()/disable() like cProfile.Profile.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+            frame = frame.f_back
+        key = ";".join(reversed(stack))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def enable(self):
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+
+    def disable(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+
+    def dump(self, path: Path):
+        """Collapsed stacks ("a;b;c count" per line), the input of flamegraph tools."""
+        with path.open("w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class _Recorder:
+    """
+    Per-process event log: one NDJSON line per finished stage in
+    events-<pid>.ndjson of the run folder, plus one profile file per
+    profiled stage (<stage>.<pid>.prof or .folded).
+    """
+
+    def __init__(self, mode, stages, run_dir: Path):
+        self.mode = mode
+        self.stages = stages
+        self.run_dir = run_dir
+        self.pid = os.getpid()
+        self.current = None
+        self.profilers = {}
+        self._events = None
+
+    def profiles(self, name: str) -> bool:
+        return self.mode != "time" and (self.stages is None or name in self.stages)
+
+    def profiler(self, name: str):
+        if name not in self.profilers:
+            if self.mode == "cprofile":
+                self.profilers[name] = cProfile.Profile()
+            elif hasattr(signal, "setitimer"):
+                self.profilers[name] = _Sampler()
+            else:
+                print("Sampling profiler needs signal.setitimer (Unix); timing only.")
+                self.mode = "time"
+                return None
+        return self.profilers[name]
+
+    def dump_profile(self, name: str):
+        profiler = self.profilers[name]
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(self.run_dir / f"{name}.{self.pid}.prof")
+        else:
+            profiler.dump(self.run_dir / f"{name}.{self.pid}.folded")
+
+    def write_event(self, event: dict):
+        if self._events is None:
+            self._events = (self.run_dir / f"events-{self.pid}.ndjson").open("a", encoding="utf-8")
+        self._events.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._events.flush()
+
+
+@contextmanager
+def _stage(rec: _Recorder, name: str, chorale):
+    event = {"stage": name, "chorale": chorale, "pid": rec.pid, "phases": {}, "bytes": 0}
+    outer, rec.current = rec.current, event
+
+    # Profilers cannot nest; an inner stage is only timed.
+    profiler = rec.profiler(name) if outer is None and rec.profiles(name) else None
+    if profiler is not None:
+        profiler.enable()
+
+    t0 = time.perf_counter()
+    try:
+        yield event
+    finally:
+        wall = time.perf_counter() - t0
+        if profiler is not None:
+            profiler.disable()
+            rec.dump_profile(name)
+        rec.current = outer
+
+        event["wall"] = round(wall, 6)
+        event["compute"] = round(max(wall - sum(event["phases"].values()), 0.0), 6)
+        event["rss_mb"] = peak_rss_mb()
+        rec.write_event(event)
+
+
+def stage(name: str, chorale=None):
+    """
+    Context manager timing one stage (for one chorale, if given); a no-op
+    unless instrumentation is on. Time inside phase("parse") / phase("write")
+    is reported as such and the rest as compute.
+    """
+    rec = recorder()
+    if rec is None:
+        return nullcontext()
+    return _stage(rec, name, chorale)
+
+
+@contextmanager
+def _phase(event: dict, name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        event["phases"][name] = round(
+            event["phases"].get(name, 0.0) + time.perf_counter() - t0, 6
+        )
+
+
+def phase(name: str):
+    """Attribute the enclosed time to a phase ("parse", "write") of the current stage."""
+    rec = recorder()
+    if rec is None or rec.current is None:
+        return nullcontext()
+    return _phase(rec.current, name)
+
+
+def add_outputs(paths):
+    """Count the size of files the current stage wrote."""
+    rec = recorder()
+    if rec is None or rec.current is None:
+        return
+    for path in paths:
+        try:
+            rec.current["bytes"] += Path(path).stat().st_size
+        except OSError:
+            pass
+
+
+def load_events(run_dir: Path):
+    events = []
+    for path in sorted(run_dir.glob("events-*.ndjson")):
+        with path.open(encoding="utf-8") as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    return events
+
+
+def summarize(events):
+    """Per-stage and per-chorale totals of a run's events."""
+    stages = {}
+    chorales = {}
+    for e in events:
+        s = stages.setdefault(
+            e["stage"],
+            {"count": 0, "wall": 0.0, "parse": 0.0, "compute": 0.0, "write": 0.0,
+             "bytes": 0, "rss_mb": None, "slowest": None},
+        )
+        s["count"] += 1
+        s["wall"] += e["wall"]
+        s["compute"] += e["compute"]
+        for name in ("parse", "write"):
+            s[name] += e["phases"].get(name, 0.0)
+        s["compute"] += sum(v for k, v in e["phases"].items() if k not in ("parse", "write"))
+        s["bytes"] += e["bytes"]
+        if e.get("rss_mb") is not None:
+            s["rss_mb"] = max(s["rss_mb"] or 0, e["rss_mb"])
+        if e["chorale"] is not None:
+            if s["slowest"] is None or e["wall"] > s["slowest"][1]:
+                s["slowest"] = [e["chorale"], e["wall"]]
+            c = chorales.setdefault(e["chorale"], {"wall": 0.0, "stages": {}})
+            c["wall"] += e["wall"]
+            c["stages"][e["stage"]] = c["stages"].get(e["stage"], 0.0) + e["wall"]
+
+    for s in stages.values():
+        for k in ("wall", "parse", "compute", "write"):
+            s[k] = round(s[k], 6)
+    for c in chorales.values():
+        c["wall"] = round(c["wall"], 6)
+    return {"stages": stages, "chorales": chorales}
+
+
+def profile_files(run_dir: Path, suffix: str) -> dict:
+    """Stage name -> the per-process <stage>.<pid><suffix> files of a run."""
+    files = {}
+    for path in sorted(run_dir.glob(f"*{suffix}")):
+        name, _, pid = path.name[: -len(suffix)].rpartition(".")
+        if name and pid.isdigit():
+            files.setdefault(name, []).append(path)
+    return files
+
+
+def print_profiles(run_dir: Path, top: int = TOP):
+    for name, files in profile_files(run_dir, ".prof").items():
+        out = io.StringIO()
+        stats = pstats.Stats(*[str(p) for p in files], stream=out)
+        stats.sort_stats("cumulative").print_stats(top)
+        print(f"\ncProfile of {name} ({len(files)} process(es)), top {top} by cumulative time:")
+        print("\n".join(out.getvalue().strip().splitlines()[-top - 2:]))
+
+    for name, files in profile_files(run_dir, ".folded").items():
+        counts = {}
+        for path in files:
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    counts[stack] = counts.get(stack, 0) + int(count)
+        merged = run_dir / f"{name}.folded"
+        with merged.open("w", encoding="utf-8") as f:
+            for stack, count in sorted(counts.items()):
+                f.write(f"{stack} {count}\n")
+
+        total = sum(counts.values()) or 1
+        leaves = {}
+        for stack, count in counts.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        print(f"\nSampled {name}: {total} samples, top {top} functions (collapsed stacks in {merged.name}):")
+        for leaf, count in sorted(leaves.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"  {count / total:>6.1%}  {leaf}")
+
+
+def report(run_dir=None, top: int = TOP):
+    """Print which stages and chorales dominate a run and save summary.json next to its events."""
+    run_dir = Path(run_dir or os.environ.get(RUN_ENV_VAR, ""))
+    events = load_events(run_dir) if run_dir.is_dir() else []
+    if not events:
+        return
+
+    summary = summarize(events)
+    with (run_dir / "summary.json").open("w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    stages = summary["stages"]
+    total = sum(s["wall"] for s in stages.values()) or 1.0
+    print(f"\nProfile of {len(events)} stage runs ({run_dir}):")
+    print(
+        f"{'stage':20} {'runs':>5} {'wall':>9} {'share':>6} {'parse':>8} {'compute':>8}"
+        f" {'write':>8} {'output':>9} {'peak RSS':>9}  slowest"
+    )
+    for name, s in sorted(stages.items(), key=lambda kv: -kv[1]["wall"]):
+        rss = f"{s['rss_mb']:.0f} MB" if s["rss_mb"] is not None else "-"
+        slowest = f"{s['slowest'][0]} ({s['slowest'][1]:.2f}s)" if s["slowest"] else ""
+        print(
+            f"{name:20} {s['count']:>5} {s['wall']:>8.2f}s {s['wall'] / total:>6.1%}"
+            f" {s['parse']:>7.2f}s {s['compute']:>7.2f}s {s['write']:>7.2f}s"
+            f" {s['bytes'] / 1e6:>7.1f}MB {rss:>9}  {slowest}"
+        )
+
+    chorales = sorted(summary["chorales"].items(), key=lambda kv: -kv[1]["wall"])[:top]
+    if chorales:
+        print(f"\nSlowest {len(chorales)} chorales:")
+        for chorale, c in chorales:
+            main_stage, main_wall = max(c["stages"].items(), key=lambda kv: kv[1])
+            print(f"  {chorale:16} {c['wall']:>7.2f}s  (mostly {main_stage}, {main_wall:.2f}s)")
+
+    print_profiles(run_dir, top)
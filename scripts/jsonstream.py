@@ -0,0 +1,212 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Tuple
+
+# Records written between flushes to disk.
+FLUSH_EVERY = 32
+PARTIAL_SUFFIX = ".partial"
+
+
+def partial_path(path: Path) -> Path:
+    return path.with_name(path.name + PARTIAL_SUFFIX)
+
+
+def array_item(record) -> str:
+    """record as it appears inside json.dump(records, f, ensure_ascii=False, indent=2)."""
+    return "  " + json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+
+
+def read_json_array(path: Path) -> Iterator[Tuple[Any, int]]:
+    """
+    (record, end offset) for each record of an indent=2 JSON array, as
+    written by json.dump or JsonArrayWriter, reading one record at a time.
+    The offset is just past the record's last character (before its comma).
+    Stops quietly at an incomplete record, so it also reads a partial file.
+    """
+    with Path(path).open("rb") as f:
+        first = f.readline()
+        if first.strip() == b"[]" or first.rstrip(b"\n") != b"[":
+            return
+
+        offset = len(first)
+        chunk = []
+        for line in f:
+            start = offset
+            offset += len(line)
+            body = line.rstrip(b"\n")
+            if body == b"]":
+                return
+            # A partial file ends right after its last record, with no newline.
+            if not line.endswith(b"\n") and not body.endswith((b"}", b"]")):
+                return
+            chunk.append(body)
+
+            # Records sit at indent 2; deeper lines belong to the current one.
+            if body.startswith(b"   ") or body[2:] in (b"{", b"["):
+                continue
+            text = b"\n".join(chunk)
+            if text.endswith(b","):
+                text = text[:-1]
+            chunk = []
+            try:
+                record = json.loads(text)
+            except ValueError:
+                return
+            yield record, start + len(body) - (1 if body.endswith(b",") else 0)
+
+
+def read_ndjson(path: Path) -> Iterator[Tuple[Any, int]]:
+    """(record, end offset) for each complete line of an NDJSON file."""
+    with Path(path).open("rb") as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            offset += len(line)
+            yield record, offset
+
+
+class StreamWriter:
+    """
+    Writes records to <path>.partial as they are produced, flushing every
+    flush_every records, and moves the file to path once finished. If the
+    run fails, the partial file stays behind; opened again with resume=True,
+    the writer keeps its complete records (see records()), drops anything
+    after the last one and appends from there.
+
+        with JsonArrayWriter(path, resume=True) as out:
+            done = {r["id"] for r in out.records()}
+            for item in items:
+                if item.id not in done:
+                    out.write(build(item))
+    """
+
+    reader = None
+
+    def __init__(self, path: Path, resume: bool = False, flush_every: int = FLUSH_EVERY):
+        self.path = Path(path)
+        self.partial = partial_path(self.path)
+        self.resume = resume
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.close()
+            print(f"Kept {self.count} records in {self.partial} (resume to continue).")
+        return False
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        end = None
+        if self.resume and self.partial.exists():
+            end = 0
+            for _, end in type(self).reader(self.partial):
+                self.count += 1
+
+        if end is None:
+            self._file = self.partial.open("wb")
+            self._begin()
+        else:
+            self._file = self.partial.open("r+b")
+            self._file.seek(end)
+            self._file.truncate()
+            if self.count == 0:
+                self._file.seek(0)
+                self._file.truncate()
+                self._begin()
+            print(f"Resuming {self.path.name} after {self.count} records.")
+
+    def records(self) -> Iterator[Any]:
+        """Complete records written so far (those kept from an earlier run included)."""
+        self._file.flush()
+        for n, (record, _) in enumerate(type(self).reader(self.partial)):
+            if n >= self.count:
+                break
+            yield record
+
+    def write(self, record):
+        self._file.write(self._encode(record).encode("utf-8"))
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def write_all(self, records: Iterable[Any]):
+        for record in records:
+            self.write(record)
+
+    def finish(self):
+        self._end()
+        self.close()
+        os.replace(self.partial, self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def _begin(self):
+        pass
+
+    def _end(self):
+        pass
+
+    def _encode(self, record) -> str:
+        raise NotImplementedError
+
+
+class JsonArrayWriter(StreamWriter):
+    """A JSON array byte-identical to json.dump(records, f, ensure_ascii=False, indent=2)."""
+
+    reader = staticmethod(read_json_array)
+
+    def _begin(self):
+        self._file.write(b"[")
+
+    def _encode(self, record) -> str:
+        return ("\n" if self.count == 0 else ",\n") + array_item(record)
+
+    def _end(self):
+        self._file.write(b"]" if self.count == 0 else b"\n]")
+
+
+class NdjsonWriter(StreamWriter):
+    """One compact JSON record per line."""
+
+    reader = staticmethod(read_ndjson)
+
+    def _encode(self, record) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def write_json_array(path: Path, records: Iterable[Any]) -> int:
+    """Stream records into an indent=2 JSON array at path; returns how many."""
+    with JsonArrayWriter(path) as out:
+        out.write_all(records)
+    return out.count
+
+
+def iter_json_array(path: Path) -> Iterator[Any]:
+    """Records of an indent=2 JSON array file, one at a time."""
+    for record, _ in read_json_array(path):
+        yield record
+
+
+def iter_ndjson(path: Path) -> Iterator[Any]:
+    """Records of an NDJSON file, one at a time."""
+    for record, _ in read_ndjson(path):
+        yield record
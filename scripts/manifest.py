@@ -0,0 +1,120 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+
+import music21
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = Path(__file__).resolve().parent
+MANIFEST_PATH = BASE_DIR / ".cache" / "build_manifest.json"
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path) -> str:
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def json_hash(obj) -> str:
+    return text_hash(json.dumps(obj, ensure_ascii=False, sort_keys=True))
+
+
+def rel(path) -> str:
+    """Repo-relative POSIX path used as a manifest key."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(BASE_DIR).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def scripts_version(names, extra: str = "") -> str:
+    """
+    Version stamp for a stage: the source of every script it runs,
+    the music21 version and any stage options that change its output.
+    """
+    h = hashlib.sha1()
+    h.update(music21.VERSION_STR.encode("utf-8"))
+    h.update(extra.encode("utf-8"))
+    for name in sorted(names):
+        h.update(name.encode("utf-8"))
+        h.update((SCRIPTS_DIR / name).read_bytes())
+    return h.hexdigest()
+
+
+def load_manifest():
+    if not MANIFEST_PATH.exists():
+        return {"version": MANIFEST_VERSION, "units": {}}
+
+    try:
+        with MANIFEST_PATH.open(encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print("Warning: unreadable build manifest, rebuilding everything ->", e)
+        return {"version": MANIFEST_VERSION, "units": {}}
+
+    if data.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "units": {}}
+    return data
+
+
+def save_manifest(manifest):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def is_fresh(manifest, key: str, inputs: dict, version: str) -> bool:
+    """
+    A unit is fresh when it was built from the same input hashes by the same
+    script version and every output it recorded still exists.
+    """
+    unit = manifest["units"].get(key)
+    if unit is None:
+        return False
+    if unit.get("version") != version or unit.get("inputs") != inputs:
+        return False
+    return all((BASE_DIR / p).exists() for p in unit.get("outputs", []))
+
+
+def units_with_prefix(manifest, prefix: str):
+    return {k: v for k, v in manifest["units"].items() if k.startswith(prefix)}
+
+
+def record_unit(manifest, key: str, inputs: dict, version: str, outputs):
+    """
+    Store a rebuilt unit, deleting files it produced last time but not now
+    (e.g. a chorale that lost a fermata no longer owns its last cadence file).
+    """
+    new_outputs = sorted(rel(p) for p in outputs)
+    old = manifest["units"].get(key)
+    if old is not None:
+        remove_outputs(set(old.get("outputs", [])) - set(new_outputs))
+
+    manifest["units"][key] = {
+        "inputs": inputs,
+        "version": version,
+        "outputs": new_outputs,
+    }
+
+
+def drop_unit(manifest, key: str):
+    """Forget a unit whose source disappeared and delete its outputs."""
+    unit = manifest["units"].pop(key, None)
+    if unit is not None:
+        remove_outputs(unit.get("outputs", []))
+
+
+def remove_outputs(paths):
+    for p in paths:
+        path = BASE_DIR / p
+        if path.exists():
+            path.unlink()
+            print("Removed stale output:", p)
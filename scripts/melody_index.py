@@ -1,17 +1,26 @@
 from pathlib import Path
+import argparse
 import json
 
+from jsonstream import JsonArrayWriter, iter_json_array, write_json_array
+from xml_notes import events_by_part, iter_events
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
 AUDIO_NOTES_DIR = DATA_DIR / "audio_notes"
+META_PATH = DATA_DIR / "chorales_meta.json"
 
-OUTPUT_PATH = DATA_DIR / "melody_index.json"
+PART_NAMES = ["Soprano", "Alto", "Tenor", "Bass"]
 
-print(f"BASE_DIR: {BASE_DIR}")
-print(f"AUDIO_NOTES_DIR: {AUDIO_NOTES_DIR}")
+OUTPUT_PATH = DATA_DIR / "melody_index.json"
+SEARCH_INDEX_PATH = DATA_DIR / "melody_search_index.json"
 
-if not AUDIO_NOTES_DIR.exists():
-    raise FileNotFoundError(f"audio_notes directory not found: {AUDIO_NOTES_DIR}")
+SEARCH_INDEX_VERSION = 1
+# Suffixes are sorted on their first SEARCH_DEPTH symbols; longer queries
+# binary-search on that prefix and verify the rest against melody_index.
+SEARCH_DEPTH = 16
+# Separator between voices; never produced by an interval (0-11).
+VOICE_SEPARATOR = 12
 
 
 def build_part_melody(part_obj):
@@ -52,52 +61,206 @@ def build_part_melody(part_obj):
     }
 
 
-entries = []
-
-json_files = sorted(AUDIO_NOTES_DIR.glob("bwv*.json"))
-print(f"Found {len(json_files)} audio_notes JSON files.")
-
-for json_path in json_files:
-    try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"Error loading {json_path.name}: {e}")
-        continue
-
-    riem = data.get("riem")
-    bwv = data.get("bwv")
-    parts = data.get("parts", [])
-
-    if bwv is None:
-        print(f"{json_path.name}: missing BWV, skipped")
-        continue
-
+def build_entry(data):
+    """Melody index entry for one audio_notes record (None if it has no usable parts)."""
     entry_parts = []
 
-    for part_obj in parts:
+    for part_obj in data.get("parts", []):
         part_melody = build_part_melody(part_obj)
         if part_melody is not None:
             entry_parts.append(part_melody)
 
     if not entry_parts:
-        print(f"{json_path.name}: no valid parts, skipped")
-        continue
+        return None
 
-    entry = {
-        "riem": riem,
-        "bwv": bwv,
+    return {
+        "riem": data.get("riem"),
+        "bwv": data.get("bwv"),
         "parts": entry_parts,
     }
-    entries.append(entry)
 
-    print(f"BWV{bwv}: {len(entry_parts)} parts processed")
 
+def interval_codes(pitches):
+    """Intervals mod 12, the alphabet of the search index (serves both match modes)."""
+    return [(pitches[i + 1] - pitches[i]) % 12 for i in range(len(pitches) - 1)]
+
+
+def build_search_index(entries):
+    """
+    Suffix array over the interval codes of every voice of every entry.
+
+    sequence holds each voice's codes followed by VOICE_SEPARATOR;
+    voices[v] = [entry index, part index, start of the voice in sequence];
+    suffixes lists every code position sorted by the SEARCH_DEPTH symbols
+    that follow it, so all occurrences of a query form one contiguous run.
+    A code at position p is note (p - start) of its voice.
+    """
+    sequence = []
+    voices = []
+
+    for entry_idx, entry in enumerate(entries):
+        for part_idx, part in enumerate(entry["parts"]):
+            voices.append([entry_idx, part_idx, len(sequence)])
+            sequence.extend(interval_codes(part["pitches"]))
+            sequence.append(VOICE_SEPARATOR)
+
+    positions = [p for p, code in enumerate(sequence) if code != VOICE_SEPARATOR]
+    positions.sort(key=lambda p: (sequence[p:p + SEARCH_DEPTH], p))
+
+    return {
+        "version": SEARCH_INDEX_VERSION,
+        "depth": SEARCH_DEPTH,
+        "separator": VOICE_SEPARATOR,
+        "voices": voices,
+        "sequence": sequence,
+        "suffixes": positions,
+    }
+
+
+def save_search_index(index):
+    SEARCH_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    with SEARCH_INDEX_PATH.open("w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+    print(f"Saved melody search index ({len(index['suffixes'])} suffixes):")
+    print(f" -> {SEARCH_INDEX_PATH}")
+
+
+def notes_record_from_xml(ch_meta):
+    """
+    audio_notes-shaped record for one chorale, read straight from its
+    exported MusicXML with the streaming reader instead of music21.
+    """
+    riem = (
+        ch_meta.get("riem")
+        or ch_meta.get("riemenschneider")
+        or ch_meta.get("id")
+    )
+    xml_path = BASE_DIR / ch_meta["musicxml_path"]
+
+    parts = []
+    for idx, events in enumerate(events_by_part(iter_events(xml_path))):
+        if idx >= len(PART_NAMES):
+            break
+
+        notes_list = [
+            {
+                "time": ev.time,
+                "pitch": ev.midi,
+                "duration": ev.quarter_length,
+                "measure": ev.measure or None,
+            }
+            for ev in events
+            if ev.midi is not None
+        ]
+        notes_list.sort(key=lambda n: n["time"])
+
+        parts.append({"name": PART_NAMES[idx], "index": idx, "notes": notes_list})
+
+    return {"riem": riem, "bwv": str(ch_meta.get("bwv")), "parts": parts}
+
+
+def load_xml_records():
+    """
+    (audio_notes file name, notes record) for each chorale, built from
+    xml/scores one at a time. Chorales sharing a BWV keep the last
+    metadata record, as export_notes.py does.
+    """
+    with META_PATH.open("r", encoding="utf-8") as f:
+        chorales_meta = json.load(f)
+
+    by_name = {}
+    for ch_meta in chorales_meta:
+        bwv = ch_meta.get("bwv")
+        if not bwv or not ch_meta.get("musicxml_path"):
+            continue
+        bwv_str = str(bwv).replace(".", "_")
+        by_name[f"bwv{bwv_str}.json"] = ch_meta
+
+    for name in sorted(by_name):
+        try:
+            yield name, notes_record_from_xml(by_name[name])
+        except Exception as e:
+            print(f"Error reading MusicXML for {name}: {e}")
+
+
+def load_audio_notes_records():
+    if not AUDIO_NOTES_DIR.exists():
+        raise FileNotFoundError(f"audio_notes directory not found: {AUDIO_NOTES_DIR}")
+
+    json_files = sorted(AUDIO_NOTES_DIR.glob("bwv*.json"))
+    print(f"Found {len(json_files)} audio_notes JSON files.")
+
+    for json_path in json_files:
+        try:
+            with json_path.open("r", encoding="utf-8") as f:
+                yield json_path.name, json.load(f)
+        except Exception as e:
+            print(f"Error loading {json_path.name}: {e}")
+
+
+def save_entries(entries):
+    """Stream entries (any iterable) into melody_index.json."""
+    count = write_json_array(OUTPUT_PATH, entries)
+
+    print(f"Saved melody index for {count} chorales:")
+    print(f" -> {OUTPUT_PATH}")
+
+
+def iter_entries(records):
+    """Melody index entries for (name, notes record) pairs, skipping unusable ones."""
+    for name, data in records:
+        bwv = data.get("bwv")
+
+        if bwv is None:
+            print(f"{name}: missing BWV, skipped")
+            continue
+
+        entry = build_entry(data)
+        if entry is None:
+            print(f"{name}: no valid parts, skipped")
+            continue
+
+        print(f"BWV{bwv}: {len(entry['parts'])} parts processed")
+        yield entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build melody_index.json for melody search.")
+    parser.add_argument(
+        "--source",
+        choices=["audio-notes", "xml"],
+        default="audio-notes",
+        help="read data/audio_notes (default) or stream xml/scores directly",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="keep the entries an interrupted run already wrote and add only the rest",
+    )
+    args = parser.parse_args()
+
+    print(f"BASE_DIR: {BASE_DIR}")
+
+    if args.source == "xml":
+        records = load_xml_records()
+    else:
+        print(f"AUDIO_NOTES_DIR: {AUDIO_NOTES_DIR}")
+        records = load_audio_notes_records()
+
+    with JsonArrayWriter(OUTPUT_PATH, resume=args.resume) as out:
+        done = {str(entry.get("bwv")) for entry in out.records()}
+        out.write_all(
+            iter_entries((name, data) for name, data in records if str(data.get("bwv")) not in done)
+        )
+
+    print(f"Saved melody index for {out.count} chorales:")
+    print(f" -> {OUTPUT_PATH}")
 
-OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # The suffix array needs the codes of every voice, but not the entries themselves.
+    save_search_index(build_search_index(iter_json_array(OUTPUT_PATH)))
 
-with OUTPUT_PATH.open("w", encoding="utf-8") as f:
-    json.dump(entries, f, ensure_ascii=False, indent=2)
 
-print(f"Saved melody index for {len(entries)} chorales:")
-print(f" -> {OUTPUT_PATH}")
+if __name__ == "__main__":
+    main()
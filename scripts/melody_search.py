@@ -0,0 +1,385 @@
+from bisect import bisect_left, bisect_right
+import argparse
+import json
+import math
+import time
+
+from melody_index import (
+    OUTPUT_PATH,
+    SEARCH_INDEX_PATH,
+    SEARCH_INDEX_VERSION,
+    build_search_index,
+    interval_codes,
+)
+
+
+# Semitones within an octave -> diatonic steps (tritone counts as a fourth).
+DIATONIC_STEPS = [0, 1, 1, 2, 2, 3, 3, 4, 5, 5, 6, 6]
+
+# Code between voices in the approximate-search text; never a real symbol.
+APPROX_SEPARATOR = 1000
+
+
+def contour_codes(pitches):
+    """-1 / 0 / +1 per step: survives transposition, ornaments and most alterations."""
+    return [(b > a) - (b < a) for a, b in zip(pitches, pitches[1:])]
+
+
+def diatonic_step(interval: int) -> int:
+    size = abs(interval)
+    steps = DIATONIC_STEPS[size % 12] + 7 * (size // 12)
+    return steps if interval >= 0 else -steps
+
+
+def diatonic_codes(pitches):
+    """Signed diatonic step sizes, so a major and a minor third look the same."""
+    return [diatonic_step(b - a) for a, b in zip(pitches, pitches[1:])]
+
+
+def semitone_codes(pitches):
+    return [b - a for a, b in zip(pitches, pitches[1:])]
+
+
+REPRESENTATIONS = {
+    "interval": semitone_codes,
+    "diatonic": diatonic_codes,
+    "contour": contour_codes,
+}
+
+
+def myers_search(pattern, text, k):
+    """
+    Bit-parallel approximate matching (Myers 1999): every end position j in
+    text where some substring ending at j is within k edits of pattern,
+    as (j, distance). Python ints act as bit vectors of any length.
+    """
+    m = len(pattern)
+    if m == 0:
+        return []
+
+    peq = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    hits = []
+
+    for j, c in enumerate(text):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+
+        if score <= k:
+            hits.append((j, score))
+
+    return hits
+
+
+def match_start(pattern, text, end, distance):
+    """
+    Leftmost-shortest start of a substring ending at end that is within
+    distance edits of pattern (DP over the reversed window).
+    """
+    m = len(pattern)
+    prev = list(range(m + 1))
+    best = None
+
+    for length in range(1, m + distance + 1):
+        j = end - length + 1
+        if j < 0:
+            break
+        c = text[j]
+        cur = [0] * (m + 1)
+        cur[0] = length
+        for i in range(1, m + 1):
+            cost = 0 if pattern[m - i] == c else 1
+            cur[i] = min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + cost)
+        prev = cur
+        if prev[m] <= distance:
+            best = j
+            break
+
+    return best if best is not None else max(0, end - m + 1)
+
+
+def rhythm_distance(query_durations, durations):
+    """Mean |log2| duration ratio over aligned notes (0 = identical rhythm)."""
+    n = min(len(query_durations), len(durations))
+    if n == 0:
+        return 0.0
+    total = 0.0
+    for q, d in zip(query_durations[:n], durations[:n]):
+        if q > 0 and d > 0:
+            total += abs(math.log2(d / q))
+        elif q != d:
+            total += 1.0
+    return total / n
+
+
+def load_json(path):
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def matches_at(part, i, pitches, durations, mode="relative"):
+    """Same test as searchMelodyPattern in js/chorale.js, for one start position."""
+    P = part["pitches"]
+    D = part["durations"]
+    L = len(durations)
+
+    if i + L > len(D):
+        return False
+
+    if mode == "relative":
+        I = part["intervals"]
+        for k in range(L - 1):
+            if I[i + k] != pitches[k + 1] - pitches[k]:
+                return False
+        for k in range(L):
+            if D[i + k] != durations[k]:
+                return False
+        return True
+
+    for k in range(L):
+        if P[i + k] % 12 != pitches[k] % 12 or D[i + k] != durations[k]:
+            return False
+    return True
+
+
+class MelodySearch:
+    """
+    Melody lookup over melody_index.json through its suffix array
+    (melody_search_index.json), rebuilt in memory if the file is missing
+    or out of date.
+    """
+
+    def __init__(self, entries, index=None):
+        if index is None or index.get("version") != SEARCH_INDEX_VERSION:
+            index = build_search_index(entries)
+
+        self.entries = entries
+        self.depth = index["depth"]
+        self.sequence = index["sequence"]
+        self.suffixes = index["suffixes"]
+        self.voices = index["voices"]
+        self.voice_starts = [v[2] for v in self.voices]
+        self._approx_texts = {}
+
+    @classmethod
+    def load(cls):
+        entries = load_json(OUTPUT_PATH)
+        index = load_json(SEARCH_INDEX_PATH) if SEARCH_INDEX_PATH.exists() else None
+        return cls(entries, index)
+
+    def _prefix(self, pos, m):
+        return self.sequence[pos:pos + m]
+
+    def candidate_range(self, codes):
+        """Run of suffixes starting with codes (compared up to the index depth)."""
+        m = min(len(codes), self.depth)
+        query = codes[:m]
+        key = lambda pos: self._prefix(pos, m)
+        lo = bisect_left(self.suffixes, query, key=key)
+        hi = bisect_right(self.suffixes, query, lo=lo, key=key)
+        return lo, hi
+
+    def locate(self, pos):
+        """(entry, part index, note index) of a sequence position."""
+        v = bisect_right(self.voice_starts, pos) - 1
+        entry_idx, part_idx, start = self.voices[v]
+        return self.entries[entry_idx], part_idx, pos - start
+
+    def find(self, pitches, durations, mode="relative"):
+        """
+        Every place a voice contains the pattern.
+        relative: same intervals and durations; absolute: same pitch
+        classes and durations. Hits come back in corpus order.
+        """
+        if len(durations) < 2 or len(pitches) != len(durations):
+            return []
+
+        lo, hi = self.candidate_range(interval_codes(pitches))
+
+        hits = []
+        for pos in sorted(self.suffixes[lo:hi]):
+            entry, part_idx, i = self.locate(pos)
+            part = entry["parts"][part_idx]
+            if not matches_at(part, i, pitches, durations, mode):
+                continue
+
+            measures = part.get("measures")
+            hits.append(
+                {
+                    "riem": entry.get("riem"),
+                    "bwv": entry.get("bwv"),
+                    "voice": part.get("name"),
+                    "part": part.get("index"),
+                    "note_index": i,
+                    "measure": measures[i] if measures else None,
+                }
+            )
+        return hits
+
+    def _approx_text(self, representation):
+        """
+        Concatenated codes of every voice for one representation, with
+        APPROX_SEPARATOR between voices, built once and reused.
+        Voice v starts at the same offset as in the suffix-array sequence.
+        """
+        if representation not in self._approx_texts:
+            to_codes = REPRESENTATIONS[representation]
+            text = []
+            for entry_idx, part_idx, _ in self.voices:
+                text.extend(to_codes(self.entries[entry_idx]["parts"][part_idx]["pitches"]))
+                text.append(APPROX_SEPARATOR)
+            self._approx_texts[representation] = text
+        return self._approx_texts[representation]
+
+    def find_approximate(
+        self,
+        pitches,
+        durations=None,
+        k=1,
+        representation="diatonic",
+        limit=50,
+    ):
+        """
+        Ranked places where a voice matches the pattern within k edits of
+        its interval codes (interval, diatonic or contour; all are
+        transposition-invariant). An inserted passing tone costs one edit
+        in contour and two elsewhere. Ranked by edits, then by how far the
+        rhythm is from durations (if given).
+        """
+        if len(pitches) < 2:
+            return []
+
+        pattern = REPRESENTATIONS[representation](pitches)
+        text = self._approx_text(representation)
+        k = max(0, min(k, len(pattern) - 1))
+
+        # Consecutive end positions belong to one occurrence; keep its best end.
+        ends = []
+        prev_end = None
+        for end, dist in myers_search(pattern, text, k):
+            if prev_end is not None and end == prev_end + 1:
+                if dist < ends[-1][1]:
+                    ends[-1] = (end, dist)
+            else:
+                ends.append((end, dist))
+            prev_end = end
+
+        found = []
+        for end, dist in ends:
+            if dist == 0:
+                start = end - len(pattern) + 1
+            else:
+                start = match_start(pattern, text, end, dist)
+            if APPROX_SEPARATOR in text[start:end + 1]:
+                continue
+            found.append((dist, start, end))
+
+        # Overlapping windows are one match; keep the closest of each run.
+        found.sort(key=lambda f: (f[0], f[2] - f[1], f[1]))
+        covered = set()
+        hits = []
+        for dist, start, end in found:
+            span = range(start, end + 1)
+            if any(pos in covered for pos in span):
+                continue
+            covered.update(span)
+
+            entry, part_idx, i = self.locate(start)
+            part = entry["parts"][part_idx]
+            n_notes = end - start + 2
+            matched_durations = part["durations"][i:i + n_notes]
+            measures = part.get("measures")
+
+            hits.append(
+                {
+                    "riem": entry.get("riem"),
+                    "bwv": entry.get("bwv"),
+                    "voice": part.get("name"),
+                    "part": part.get("index"),
+                    "note_index": i,
+                    "length": n_notes,
+                    "measure": measures[i] if measures else None,
+                    "distance": dist,
+                    "rhythm": (
+                        round(rhythm_distance(durations, matched_durations), 3)
+                        if durations
+                        else 0.0
+                    ),
+                    "pitches": part["pitches"][i:i + n_notes],
+                }
+            )
+
+        hits.sort(key=lambda h: (h["distance"], h["rhythm"], h["riem"] or 0, h["note_index"]))
+        return hits[:limit] if limit else hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up a melody in melody_index.json.")
+    parser.add_argument("pitches", type=int, nargs="+", help="MIDI pitches of the pattern")
+    parser.add_argument(
+        "--durations",
+        type=float,
+        nargs="+",
+        help="quarterLength of each note (default: 1.0 each)",
+    )
+    parser.add_argument("--mode", choices=["relative", "absolute"], default="relative")
+    parser.add_argument(
+        "--approximate",
+        type=int,
+        metavar="K",
+        help="ranked search allowing up to K edits instead of exact matching",
+    )
+    parser.add_argument(
+        "--representation",
+        choices=sorted(REPRESENTATIONS),
+        default="diatonic",
+        help="codes compared by --approximate (default: diatonic)",
+    )
+    parser.add_argument("--limit", type=int, default=50, help="max approximate hits")
+    args = parser.parse_args()
+
+    durations = args.durations or [1.0] * len(args.pitches)
+
+    search = MelodySearch.load()
+    t0 = time.perf_counter()
+    if args.approximate is not None:
+        hits = search.find_approximate(
+            args.pitches, durations, args.approximate, args.representation, args.limit
+        )
+    else:
+        hits = search.find(args.pitches, durations, args.mode)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    for hit in hits:
+        extra = ""
+        if "distance" in hit:
+            extra = f" (edits {hit['distance']}, rhythm {hit['rhythm']})"
+        print(
+            f"R{hit['riem']} BWV{hit['bwv']} {hit['voice']}: "
+            f"note {hit['note_index']}, measure {hit['measure']}{extra}"
+        )
+    print(f"{len(hits)} hits in {elapsed:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import json
+import struct
+
+MAGIC = b"BCN1"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHI")
+
+
+def _pad4(n: int) -> int:
+    return (4 - n % 4) % 4
+
+
+def encode_notes_record(record) -> bytes:
+    """
+    Pack an audio_notes record into typed columns.
+
+    Layout (little-endian, every column starts on a 4-byte boundary):
+
+      0   magic        4 bytes  b"BCN1"
+      4   version      uint16
+      6   part_count   uint16
+      8   meta_length  uint32
+      12  meta         UTF-8 JSON, space-padded to a multiple of 4 bytes:
+                       riem, bwv, tempo_qpm, time_signature,
+                       total_duration_beats, parts: [{name, index}]
+      ..  note_count   uint32 per part
+      ..  per part, in order:
+            times      float32[n]
+            durations  float32[n]
+            measures   uint16[n]  (0 = no measure number), padded to 4
+            pitches    uint8[n]   (MIDI), padded to 4
+
+    js/audio.js decodes the same layout with typed-array views.
+    """
+    parts = record.get("parts", [])
+    meta = {
+        "riem": record.get("riem"),
+        "bwv": record.get("bwv"),
+        "tempo_qpm": record.get("tempo_qpm"),
+        "time_signature": record.get("time_signature"),
+        "total_duration_beats": record.get("total_duration_beats"),
+        "parts": [{"name": p.get("name"), "index": p.get("index")} for p in parts],
+    }
+    meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    meta_bytes += b" " * _pad4(len(meta_bytes))
+
+    chunks = [HEADER.pack(MAGIC, VERSION, len(parts), len(meta_bytes)), meta_bytes]
+    chunks.append(struct.pack(f"<{len(parts)}I", *(len(p.get("notes", [])) for p in parts)))
+
+    for p in parts:
+        notes = p.get("notes", [])
+        n = len(notes)
+        chunks.append(struct.pack(f"<{n}f", *(n_["time"] for n_ in notes)))
+        chunks.append(struct.pack(f"<{n}f", *(n_["duration"] for n_ in notes)))
+        chunks.append(struct.pack(f"<{n}H", *((n_.get("measure") or 0) for n_ in notes)))
+        chunks.append(b"\0" * _pad4(2 * n))
+        chunks.append(struct.pack(f"<{n}B", *(n_["pitch"] for n_ in notes)))
+        chunks.append(b"\0" * _pad4(n))
+
+    return b"".join(chunks)
+
+
+def decode_notes_record(data: bytes):
+    """Inverse of encode_notes_record: rebuild the audio_notes JSON shape."""
+    magic, version, part_count, meta_length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a packed audio_notes file")
+    if version != VERSION:
+        raise ValueError(f"unsupported packed audio_notes version: {version}")
+
+    pos = HEADER.size
+    meta = json.loads(data[pos:pos + meta_length].decode("utf-8"))
+    pos += meta_length
+
+    counts = struct.unpack_from(f"<{part_count}I", data, pos)
+    pos += 4 * part_count
+
+    parts = []
+    for part_meta, n in zip(meta["parts"], counts):
+        times = struct.unpack_from(f"<{n}f", data, pos)
+        pos += 4 * n
+        durations = struct.unpack_from(f"<{n}f", data, pos)
+        pos += 4 * n
+        measures = struct.unpack_from(f"<{n}H", data, pos)
+        pos += 2 * n + _pad4(2 * n)
+        pitches = struct.unpack_from(f"<{n}B", data, pos)
+        pos += n + _pad4(n)
+
+        notes = [
+            {
+                "time": times[i],
+                "pitch": pitches[i],
+                "duration": durations[i],
+                "measure": measures[i] or None,
+            }
+            for i in range(n)
+        ]
+        parts.append({"name": part_meta["name"], "index": part_meta["index"], "notes": notes})
+
+    return {
+        "riem": meta["riem"],
+        "bwv": meta["bwv"],
+        "tempo_qpm": meta["tempo_qpm"],
+        "time_signature": meta["time_signature"],
+        "total_duration_beats": meta["total_duration_beats"],
+        "parts": parts,
+    }
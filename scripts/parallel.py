@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def add_jobs_argument(parser):
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="worker processes for per-chorale work (0 = one per CPU, default 1 = serial)",
+    )
+
+
+def resolve_jobs(jobs: int) -> int:
+    if jobs is None or jobs < 0:
+        return 1
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def run_jobs(func, items, jobs: int = 1):
+    """
+    Apply func to every item and return the results in input order.
+    With jobs > 1 the calls run on a process pool; results are still merged
+    in input order, so aggregate outputs match a serial run byte for byte.
+    func must be a module-level function (or a functools.partial of one).
+    """
+    return list(iter_jobs(func, items, jobs))
+
+
+def iter_jobs(func, items, jobs: int = 1):
+    """
+    run_jobs as a generator: each result is yielded, in input order, as soon
+    as it and every earlier one are done, so callers can stream them out.
+    """
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), len(items))
+
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(func, items)
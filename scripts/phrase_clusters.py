@@ -0,0 +1,155 @@
+import random
+import zlib
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+SEED = 1
+
+# Mersenne prime for the universal hashes; crc32 values stay below it.
+_PRIME = (1 << 61) - 1
+
+_rng = random.Random(SEED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)
+]
+
+
+def phrase_tokens(intervals: Sequence[int], durations: Sequence[float]) -> List[str]:
+    """One token per step: the interval and the length of the note it lands on."""
+    tokens = []
+    for i, iv in enumerate(intervals):
+        dur = durations[i + 1] if i + 1 < len(durations) else None
+        tokens.append(f"{iv}:{dur}")
+    return tokens
+
+
+def shingles(intervals: Sequence[int], durations: Sequence[float], size: int = SHINGLE_SIZE) -> Set[str]:
+    """
+    Overlapping runs of size tokens, padded with start/end markers so short
+    phrases and phrase boundaries still produce shingles.
+    """
+    tokens = ["^"] + phrase_tokens(intervals, durations) + ["$"]
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def minhash(shingle_set: Set[str]) -> Tuple[int, ...]:
+    """NUM_PERM-value MinHash signature (deterministic across runs)."""
+    base = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+    return tuple(min((a * x + b) % _PRIME for x in base) for a, b in _PERMUTATIONS)
+
+
+def choose_bands(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows == num_perm whose LSH S-curve midpoint
+    (1 / bands) ** (1 / rows) is the highest one not above the threshold.
+    Erring low costs only extra exact checks; erring high loses pairs.
+    """
+    options = []
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        options.append(((1.0 / bands) ** (1.0 / rows), bands, rows))
+
+    below = [o for o in options if o[0] <= threshold]
+    _, bands, rows = max(below) if below else min(options)
+    return bands, rows
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def candidate_pairs(signatures: List[Tuple[int, ...]], bands: int, rows: int):
+    """Index pairs that share at least one LSH band bucket."""
+    pairs = set()
+    for band in range(bands):
+        buckets: Dict[Tuple[int, ...], List[int]] = {}
+        lo = band * rows
+        for idx, sig in enumerate(signatures):
+            buckets.setdefault(sig[lo:lo + rows], []).append(idx)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+def cluster_groups(groups: List[Dict[str, Any]], threshold: float) -> Dict[str, Any]:
+    """
+    Cluster signature groups (from soprano_index.group_phrase_entries) whose
+    interval/duration shingle sets have Jaccard similarity >= threshold.
+
+    LSH buckets propose candidate pairs in roughly linear time; only those
+    pairs get an exact Jaccard check, and accepted pairs are merged with
+    union-find. Every group gets clusterId, plus similarity to its cluster's
+    representative (the largest group). Returns the cluster summary list
+    and the LSH parameters used.
+    """
+    sets = [shingles(g["intervals"], g["durations"]) for g in groups]
+    signatures = [minhash(s) for s in sets]
+    bands, rows = choose_bands(threshold)
+
+    parent = list(range(len(groups)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    pairs = candidate_pairs(signatures, bands, rows)
+    merged = 0
+    for i, j in sorted(pairs):
+        if jaccard(sets[i], sets[j]) >= threshold:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+                merged += 1
+
+    members: Dict[int, List[int]] = {}
+    for idx in range(len(groups)):
+        members.setdefault(find(idx), []).append(idx)
+
+    ordered = sorted(
+        members.values(),
+        key=lambda idxs: (-sum(groups[i]["size"] for i in idxs), min(idxs)),
+    )
+
+    clusters = []
+    for n, idxs in enumerate(ordered, start=1):
+        cluster_id = f"clu_{n:04d}"
+        idxs = sorted(idxs, key=lambda i: (-groups[i]["size"], i))
+        rep = idxs[0]
+
+        for i in idxs:
+            groups[i]["clusterId"] = cluster_id
+            groups[i]["similarity"] = round(jaccard(sets[i], sets[rep]), 3)
+
+        clusters.append(
+            {
+                "clusterId": cluster_id,
+                "representative": groups[rep]["groupId"],
+                "groupIds": [groups[i]["groupId"] for i in idxs],
+                "size": sum(groups[i]["size"] for i in idxs),
+                "minSimilarity": min(groups[i]["similarity"] for i in idxs),
+            }
+        )
+
+    return {
+        "clusters": clusters,
+        "params": {
+            "threshold": threshold,
+            "numPerm": NUM_PERM,
+            "bands": bands,
+            "rows": rows,
+            "shingleSize": SHINGLE_SIZE,
+            "candidatePairs": len(pairs),
+            "mergedPairs": merged,
+        },
+    }
@@ -1,27 +1,32 @@
 import json
 from pathlib import Path
-from music21 import converter, meter, stream
+
+from xml_notes import iter_events
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SCORES_DIR = BASE_DIR / "xml" / "scores"
 OUTPUT_JSON = BASE_DIR / "data" / "pickup_beats.json"
 
 
-def get_pickup_beats(score):
-    part = score.parts[0]
+def first_part_measures(path):
+    """MeasureInfo list of the first part, read without building a music21 score."""
+    measures = []
+    for ev in iter_events(path, measures):
+        if ev.part > 0:
+            break
+    return [m for m in measures if m.part == 0]
+
 
-    ts_list = part.recurse().getElementsByClass(meter.TimeSignature)
-    if not ts_list:
+def get_pickup_beats(measures):
+    ts_measures = [m for m in measures if m.bar_duration is not None]
+    if not ts_measures:
         return 0.0
-    ts = ts_list[0]
-
-    full_measure_qL = ts.barDuration.quarterLength
 
-    measures = part.getElementsByClass(stream.Measure)
+    full_measure_qL = ts_measures[0].bar_duration
 
     pickup_measure = None
     for m in measures:
-        if m.number == 0 or m.number == "0":
+        if m.number == 0:
             pickup_measure = m
             break
 
@@ -29,20 +34,12 @@ def get_pickup_beats(score):
         if not measures:
             return 0.0
 
-        first = measures[0]
-        actual_qL = first.duration.quarterLength
-        if actual_qL == 0:
-            actual_qL = sum(n.duration.quarterLength for n in first.notesAndRests)
-
+        actual_qL = measures[0].duration
         if abs(actual_qL - full_measure_qL) < 1e-6:
             return 0.0
         return float(actual_qL)
 
-    actual_qL = pickup_measure.duration.quarterLength
-    if actual_qL == 0:
-        actual_qL = sum(n.duration.quarterLength for n in pickup_measure.notesAndRests)
-
-    return float(actual_qL)
+    return float(pickup_measure.duration)
 
 
 def main():
@@ -54,13 +51,16 @@ def main():
 
     for path in sorted(SCORES_DIR.glob("*.musicxml")):
         try:
-            score = converter.parse(path)
-            pickup_beats = get_pickup_beats(score)
+            pickup_beats = get_pickup_beats(first_part_measures(path))
             data[path.name] = pickup_beats
             print(f"{path.name}: pickup = {pickup_beats} beats")
         except Exception as e:
             print(f"failed to process {path.name}: {e}")
 
+    save_pickup_beats(data)
+
+
+def save_pickup_beats(data):
     OUTPUT_JSON.parent.mkdir(parents=True, exist_ok=True)
     with OUTPUT_JSON.open("w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,286 @@
+from pathlib import Path
+import argparse
+import gzip
+import io
+import hashlib
+import json
+import os
+import zipfile
+from functools import partial
+
+from parallel import add_jobs_argument, run_jobs
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DIST_DIR = BASE_DIR / "dist"
+MANIFEST_NAME = "release.json"
+RELEASE_VERSION = 1
+
+SITE_FILES = ["index.html", "style.css"]
+SITE_DIRS = ["js", "data", "xml"]
+
+# Intermediate or local-only files that are never published.
+SKIP_SUFFIXES = {".partial", ".ndjson", ".tmp"}
+SKIP_NAMES = {".DS_Store"}
+
+# Worth precompressing; everything else (.bin notes, the corpus bundle,
+# which is read with Range requests) is copied as is.
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".musicxml", ".xml", ".svg"}
+SCORE_SUFFIXES = {".musicxml", ".xml"}
+
+FORMATS = ("gz", "br", "mxl")
+
+HASH_LENGTH = 16
+# Fixed zip timestamps so .mxl files only change with their score.
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def site_files(root: Path = BASE_DIR):
+    files = [root / name for name in SITE_FILES if (root / name).is_file()]
+    for d in SITE_DIRS:
+        for path in sorted((root / d).rglob("*")):
+            if not path.is_file() or path.name in SKIP_NAMES:
+                continue
+            if path.suffix in SKIP_SUFFIXES or "__pycache__" in path.parts:
+                continue
+            files.append(path)
+    return files
+
+
+def minify(path: Path, data: bytes) -> bytes:
+    """JSON with compact separators; other files unchanged."""
+    if path.suffix != ".json":
+        return data
+    obj = json.loads(data.decode("utf-8"))
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    # mtime=0 keeps the output (and its hash) the same from run to run.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_bytes(data: bytes) -> bytes:
+    return brotli.compress(data, quality=11)
+
+
+def mxl_bytes(name: str, data: bytes) -> bytes:
+    """Compressed MusicXML (.mxl): a zip with the score and its container file."""
+    container = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        "<container>\n"
+        "  <rootfiles>\n"
+        f'    <rootfile full-path="{name}" media-type="application/vnd.recordare.musicxml+xml"/>\n'
+        "  </rootfiles>\n"
+        "</container>\n"
+    )
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        # The mimetype entry comes first and uncompressed, as the MXL spec asks.
+        z.writestr(zipfile.ZipInfo("mimetype", ZIP_DATE), "application/vnd.recordare.musicxml")
+        for entry_name, text in (("META-INF/container.xml", container.encode("utf-8")), (name, data)):
+            info = zipfile.ZipInfo(entry_name, ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            z.writestr(info, text, compresslevel=9)
+    return buf.getvalue()
+
+
+def variants_for(path: Path, formats) -> list:
+    """Sibling suffixes written next to a released file."""
+    if path.suffix not in COMPRESSIBLE:
+        return []
+    out = [f for f in ("gz", "br") if f in formats]
+    if "mxl" in formats and path.suffix in SCORE_SUFFIXES:
+        out.append("mxl")
+    return out
+
+
+def site_key(path: Path) -> str:
+    return path.relative_to(BASE_DIR).as_posix()
+
+
+def release_file(item, out_root: Path, formats):
+    """
+    Write one file (minified) and its compressed siblings under out_root.
+    item is (path, its manifest entry from the previous release or {});
+    returns (key, new manifest entry). Siblings of a file whose content
+    hash is unchanged are kept instead of recompressed.
+    """
+    path, old = item
+    key = site_key(path)
+    data = minify(path, path.read_bytes())
+    digest = content_hash(data)
+
+    target = out_root / key
+    target.parent.mkdir(parents=True, exist_ok=True)
+    entry = {"hash": digest, "size": len(data)}
+
+    reuse = old.get("hash") == digest and target.exists()
+    if not reuse:
+        target.write_bytes(data)
+
+    for fmt in variants_for(path, formats):
+        if fmt == "mxl":
+            sibling = target.with_suffix(".mxl")
+        else:
+            sibling = target.with_name(target.name + "." + fmt)
+
+        if reuse and fmt in old and sibling.exists():
+            entry[fmt] = old[fmt]
+            continue
+
+        if fmt == "gz":
+            packed = gzip_bytes(data)
+        elif fmt == "br":
+            packed = brotli_bytes(data)
+        else:
+            packed = mxl_bytes(path.name, data)
+        sibling.write_bytes(packed)
+        entry[fmt] = len(packed)
+
+    return key, entry
+
+
+def load_previous(out_root: Path) -> dict:
+    path = out_root / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != RELEASE_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def remove_stale(out_root: Path, previous: dict, keep: set):
+    """
+    Delete what the previous release wrote and this one did not. Only
+    paths listed in the previous release.json are touched, so anything
+    else living under out_root is left alone.
+    """
+    stale = set()
+    for key, entry in previous.items():
+        stale.update(written_paths(key, entry))
+    for rel in sorted(stale - keep):
+        path = out_root / rel
+        if out_root not in path.resolve().parents:
+            continue
+        if path.is_file():
+            path.unlink()
+        # Prune directories the removal emptied, up to out_root.
+        parent = path.parent
+        while parent != out_root and parent.is_dir() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
+
+def check_out_root(out_root: Path):
+    """Refuse release folders that would mix the release into the site or the scripts."""
+    if out_root == BASE_DIR or out_root in BASE_DIR.parents:
+        raise ValueError(f"{out_root} contains the repository; choose a separate folder")
+    for d in SITE_DIRS + ["scripts"]:
+        source_dir = BASE_DIR / d
+        if out_root == source_dir or source_dir in out_root.parents:
+            raise ValueError(f"{out_root} overlaps the repository's {d}/ folder")
+
+
+def written_paths(key: str, entry: dict) -> list:
+    paths = [key]
+    for fmt in ("gz", "br"):
+        if fmt in entry:
+            paths.append(f"{key}.{fmt}")
+    if "mxl" in entry:
+        paths.append(str(Path(key).with_suffix(".mxl").as_posix()))
+    return paths
+
+
+def print_summary(files: dict):
+    raw = sum(e["size"] for e in files.values())
+    print(f"Released {len(files)} files, {raw / 1e6:.1f} MB minified")
+    for fmt in ("gz", "br", "mxl"):
+        entries = [e for e in files.values() if fmt in e]
+        if entries:
+            before = sum(e["size"] for e in entries)
+            after = sum(e[fmt] for e in entries)
+            print(f"  .{fmt}: {len(entries)} files, {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+
+def write_release(out_root: Path = DIST_DIR, formats=FORMATS, jobs: int = 1, clean: bool = False):
+    """
+    Mirror the site into out_root with compact JSON and precompressed
+    siblings, and write release.json (content hash and sizes per file).
+    """
+    formats = set(formats)
+    if "br" in formats and brotli is None:
+        print("brotli module not installed; skipping .br files (pip install brotli).")
+        formats.discard("br")
+
+    out_root = Path(out_root).resolve()
+    check_out_root(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    previous = load_previous(out_root)
+    if clean:
+        remove_stale(out_root, previous, set())
+        previous = {}
+
+    files = site_files()
+    print(f"Releasing {len(files)} files to {out_root}")
+    results = run_jobs(
+        partial(release_file, out_root=out_root, formats=formats),
+        [(path, previous.get(site_key(path), {})) for path in files],
+        jobs,
+    )
+
+    manifest = {"version": RELEASE_VERSION, "files": dict(sorted(results))}
+    keep = {MANIFEST_NAME}
+    for key, entry in results:
+        keep.update(written_paths(key, entry))
+    remove_stale(out_root, previous, keep)
+
+    tmp_path = out_root / (MANIFEST_NAME + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, out_root / MANIFEST_NAME)
+
+    print_summary(manifest["files"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a release copy of the site: compact JSON plus precompressed siblings."
+    )
+    parser.add_argument("--out", type=Path, default=DIST_DIR, help="release folder (default: dist/)")
+    parser.add_argument(
+        "--formats",
+        default=",".join(FORMATS),
+        help="comma-separated siblings to write: gz, br (needs the brotli module), mxl",
+    )
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="remove the previous release's files and rebuild every file from scratch",
+    )
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    formats = {f.strip() for f in args.formats.split(",") if f.strip()}
+    unknown = formats - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))}")
+    try:
+        check_out_root(args.out.resolve())
+    except ValueError as e:
+        parser.error(str(e))
+    write_release(args.out, formats, args.jobs, args.clean)
+
+
+if __name__ == "__main__":
+    main()
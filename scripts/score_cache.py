@@ -0,0 +1,94 @@
+from pathlib import Path
+import hashlib
+import os
+import tempfile
+
+import music21
+from music21 import converter, corpus
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = BASE_DIR / ".cache" / "scores"
+# converter.freeze pickles and compresses with zlib (its default zipType).
+CACHE_SUFFIX = ".p.zlib"
+
+
+def source_key(path: Path) -> str:
+    """
+    Build the cache key for a source file from its resolved path, its
+    content hash and the music21 version that will parse it.
+    Content (not mtime) is hashed so fresh git checkouts stay warm.
+    """
+    path = Path(path)
+    h = hashlib.sha1()
+    h.update(str(path.resolve()).encode("utf-8"))
+    h.update(b"\0")
+    h.update(music21.VERSION_STR.encode("utf-8"))
+    h.update(b"\0")
+    h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def cache_path_for(path: Path) -> Path:
+    return CACHE_DIR / f"{source_key(path)}{CACHE_SUFFIX}"
+
+
+def _store(score, cache_path: Path):
+    """Freeze a parsed score into the cache (atomic rename, safe for parallel runs)."""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=cache_path.parent, prefix=".tmp-", suffix=CACHE_SUFFIX
+    )
+    os.close(fd)
+    try:
+        converter.freeze(score, fmt="pickle", fp=tmp_name)
+        os.replace(tmp_name, cache_path)
+    except Exception as e:
+        print("Warning: could not cache", cache_path.name, "->", e)
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def _load_or_parse(src_path: Path, parse_func):
+    cache_path = cache_path_for(src_path)
+
+    if cache_path.exists():
+        try:
+            return converter.thaw(cache_path)
+        except Exception as e:
+            print("Warning: stale score cache", cache_path.name, "->", e)
+
+    score = parse_func()
+    _store(score, cache_path)
+    return score
+
+
+def parse_file(path) -> music21.stream.Score:
+    """
+    Cached replacement for converter.parse(path).
+    A warm cache thaws the pickled stream instead of running the MusicXML parser.
+    """
+    path = Path(path)
+    return _load_or_parse(path, lambda: converter.parse(path))
+
+
+def parse_corpus(corpus_path: str) -> music21.stream.Score:
+    """
+    Cached replacement for corpus.parse(corpus_path),
+    keyed by the corpus file the work resolves to.
+    """
+    work = corpus.getWork(corpus_path)
+    if isinstance(work, list):
+        if not work:
+            raise ValueError(f"corpus work not found: {corpus_path}")
+        work = work[0]
+    return _load_or_parse(Path(work), lambda: corpus.parse(corpus_path))
+
+
+def clear_cache():
+    if not CACHE_DIR.exists():
+        return 0
+    removed = 0
+    for p in CACHE_DIR.glob(f"*{CACHE_SUFFIX}"):
+        p.unlink()
+        removed += 1
+    return removed
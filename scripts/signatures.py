@@ -0,0 +1,57 @@
+from typing import Dict, Iterable, List, Optional
+
+SIGNATURE_FIELDS = [
+    "soprano_signature",
+    "soprano_signature_with_rhythm",
+    "bass_signature",
+    "bass_signature_with_rhythm",
+]
+
+
+class SignatureTable:
+    """
+    Interned melody signatures ("65:1.0,64:1.0,...", "INT:...|DUR:...").
+
+    Each distinct non-empty string is stored once and referred to by its
+    position in sorted order, so equal signatures share an ID and IDs sort
+    the way the strings do. Grouping, sorting and filtering on signatures
+    become integer operations; the strings are only needed for display.
+    """
+
+    def __init__(self, signatures: Iterable[Optional[str]] = ()):
+        self.strings: List[str] = sorted({s for s in signatures if s})
+        self._ids: Dict[str, int] = {s: i for i, s in enumerate(self.strings)}
+
+    @classmethod
+    def from_records(cls, records, fields=SIGNATURE_FIELDS) -> "SignatureTable":
+        return cls(r.get(f) for r in records for f in fields)
+
+    @classmethod
+    def from_json(cls, data: List[str]) -> "SignatureTable":
+        table = cls()
+        table.strings = list(data)
+        table._ids = {s: i for i, s in enumerate(table.strings)}
+        return table
+
+    def to_json(self) -> List[str]:
+        return self.strings
+
+    def __len__(self):
+        return len(self.strings)
+
+    def id_of(self, signature: Optional[str]) -> Optional[int]:
+        """ID of signature; None for a missing or empty one."""
+        if not signature:
+            return None
+        return self._ids[signature]
+
+    def string_of(self, sig_id: Optional[int]) -> Optional[str]:
+        return None if sig_id is None else self.strings[sig_id]
+
+    def intern_record(self, record: dict, fields=SIGNATURE_FIELDS) -> dict:
+        """Copy of record with its signature fields replaced by IDs."""
+        out = dict(record)
+        for f in fields:
+            if f in out:
+                out[f] = self.id_of(out[f])
+        return out
@@ -0,0 +1,119 @@
+from bisect import bisect_right
+from typing import List, NamedTuple, Optional, Tuple
+
+from xml_notes import NoteEvent
+
+EPS = 1e-6
+
+
+class Sonority(NamedTuple):
+    time: float
+    duration: float
+    pitches: Tuple[Tuple[int, str], ...]
+
+    @property
+    def names(self) -> List[str]:
+        return [name for _, name in self.pitches]
+
+    @property
+    def pitch_classes(self) -> List[int]:
+        return sorted({midi % 12 for midi, _ in self.pitches})
+
+
+def align_measures(events: List[NoteEvent]) -> List[NoteEvent]:
+    """
+    events with each part's measures moved onto the first part's measure
+    starts, and cut off where the next of those measures begins.
+    """
+    starts_by_part = {}
+    for ev in events:
+        starts = starts_by_part.setdefault(ev.part, [])
+        start = round(ev.time - ev.offset, 6)
+        if not starts or starts[-1] != start:
+            starts.append(start)
+
+    template = starts_by_part.get(0, [])
+    aligned = []
+    for part, starts in starts_by_part.items():
+        index = {start: idx for idx, start in enumerate(starts)}
+        for ev in events:
+            if ev.part != part:
+                continue
+            idx = index[round(ev.time - ev.offset, 6)]
+            if idx >= len(template):
+                aligned.append(ev)
+                continue
+            time = template[idx] + ev.offset
+            length = ev.quarter_length
+            if idx + 1 < len(template):
+                length = max(min(length, template[idx + 1] - time), 0.0)
+            aligned.append(ev._replace(time=time, quarter_length=length))
+    return aligned
+
+
+class SonorityIndex:
+    """
+    The vertical pitch sets of a score, like the chords of music21's
+    chordify() but built from xml_notes events in one sweep.
+
+    Every onset and release in any part (rests included) starts a new
+    segment; a segment holds the distinct (midi, name) pitches sounding
+    through it, lowest first. Lookups at an offset are a bisect.
+
+    As in MusicXML (and chordify), the n-th measure of every part starts
+    where the n-th measure of the first part does, even when a part's
+    measures add up differently, and nothing sounds past its barline.
+    """
+
+    def __init__(self, events: List[NoteEvent]):
+        timed = [ev for ev in align_measures(events) if ev.quarter_length > 0]
+        notes = sorted(
+            (ev for ev in timed if ev.midi is not None), key=lambda ev: ev.time
+        )
+        boundaries = sorted(
+            {round(ev.time, 6) for ev in timed}
+            | {round(ev.time + ev.quarter_length, 6) for ev in timed}
+        )
+
+        self.segments: List[Sonority] = []
+        active: List[NoteEvent] = []
+        next_note = 0
+        for start, end in zip(boundaries, boundaries[1:]):
+            while next_note < len(notes) and notes[next_note].time <= start + EPS:
+                active.append(notes[next_note])
+                next_note += 1
+            active = [ev for ev in active if ev.time + ev.quarter_length > start + EPS]
+
+            pitches = tuple(sorted({(ev.midi, ev.name) for ev in active}))
+            self.segments.append(Sonority(start, end - start, pitches))
+
+        self._starts = [s.time for s in self.segments]
+
+    def at(self, time: float) -> Optional[Sonority]:
+        """The segment sounding at time (None before the first or after the last)."""
+        idx = bisect_right(self._starts, time + EPS) - 1
+        if idx < 0:
+            return None
+        segment = self.segments[idx]
+        if time >= segment.time + segment.duration - EPS:
+            return None
+        return segment
+
+    def chords(self) -> List[Sonority]:
+        """Segments with at least one sounding pitch (chordify's Chord objects)."""
+        return [s for s in self.segments if s.pitches]
+
+    def final_chord(self) -> Optional[Sonority]:
+        chords = self.chords()
+        return chords[-1] if chords else None
+
+    def harmonic_rhythm(self) -> List[Sonority]:
+        """Chords with consecutive segments of identical pitch content merged."""
+        merged: List[Sonority] = []
+        for s in self.segments:
+            if merged and merged[-1].pitches == s.pitches:
+                last = merged[-1]
+                merged[-1] = last._replace(duration=s.time + s.duration - last.time)
+            else:
+                merged.append(s)
+        return [s for s in merged if s.pitches]
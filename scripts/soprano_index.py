@@ -1,15 +1,24 @@
+import argparse
 import json
 import math
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
-from music21 import converter, stream, note
+from music21 import stream, note
 
+from jsonstream import NdjsonWriter, iter_ndjson
+from phrase_clusters import cluster_groups
+from score_cache import parse_file
+from signatures import SignatureTable
 
-ROOT = Path("/Users/joeun/Desktop/ChoraleDictionary")
+
+ROOT = Path(__file__).resolve().parent.parent
 PHRASE_DIR = ROOT / "xml" / "scores_phrase"
 OUTPUT_JSON = ROOT / "data" / "soprano_groups.json"
+# One extract_phrase_entry result per line, written as phrases are parsed.
+# A working file for --resume, kept out of the served data/ folder.
+PHRASES_NDJSON = ROOT / ".cache" / "soprano_phrases.ndjson"
 
 
 def round_q(q: float, ndigits: int = 3) -> float:
@@ -87,85 +96,90 @@ def parse_phrase_filename(path: Path) -> Dict[str, Any]:
     }
 
 
-def build_soprano_groups() -> Dict[str, Any]:
-    if not PHRASE_DIR.exists():
-        raise SystemExit(f"Phrase directory not found: {PHRASE_DIR}")
+def extract_phrase_entry(path: Path, score: stream.Score) -> Optional[Dict[str, Any]]:
+    """
+    Soprano pattern and listing entry for one parsed phrase score.
+    Returns None when the phrase has no usable soprano line.
+    """
+    sop = get_soprano_part(score)
+    if sop is None:
+        print("    No soprano part, skipped")
+        return None
 
-    print(f"Scanning {PHRASE_DIR}")
+    pattern = extract_soprano_pattern(sop)
+    if pattern is None:
+        print("    No soprano notes, skipped")
+        return None
 
-    groups: Dict[str, Dict[str, Any]] = {}
-    total_phrases = 0
+    intervals = pattern["intervals"]
+    durations = pattern["durations"]
 
-    xml_files = sorted(
-        [p for p in PHRASE_DIR.iterdir() if p.suffix.lower() in (".xml", ".musicxml", ".mxl")]
-    )
+    if len(intervals) == 0:
+        print("    Not enough notes (no intervals), skipped")
+        return None
 
-    for path in xml_files:
-        print(f"  Processing {path.name}")
-        try:
-            score = converter.parse(path)
-        except Exception as e:
-            print("    Parse failed:", e)
-            continue
-
-        sop = get_soprano_part(score)
-        if sop is None:
-            print("    No soprano part, skipped")
-            continue
-
-        pattern = extract_soprano_pattern(sop)
-        if pattern is None:
-            print("    No soprano notes, skipped")
-            continue
-
-        intervals = pattern["intervals"]
-        durations = pattern["durations"]
-
-        if len(intervals) == 0:
-            print("    Not enough notes (no intervals), skipped")
-            continue
-
-        signature = make_signature(intervals, durations)
-
-        meta = parse_phrase_filename(path)
-        phrase_id = meta["id"]
-        piece_id = meta["pieceId"]
-        phrase_idx = meta["phraseIndex"]
-
-        md = score.metadata
-        title = None
-        if md is not None:
-            title = (
-                getattr(md, "movementName", None)
-                or getattr(md, "movementTitle", None)
-                or getattr(md, "title", None)
-                or getattr(md, "workTitle", None)
-            )
-        if not title:
-            title = piece_id
-
-        measure_label = get_measure_range_label(sop)
-
-        phrase_entry = {
+    meta = parse_phrase_filename(path)
+    phrase_id = meta["id"]
+    piece_id = meta["pieceId"]
+    phrase_idx = meta["phraseIndex"]
+
+    md = score.metadata
+    title = None
+    if md is not None:
+        title = (
+            getattr(md, "movementName", None)
+            or getattr(md, "movementTitle", None)
+            or getattr(md, "title", None)
+            or getattr(md, "workTitle", None)
+        )
+    if not title:
+        title = piece_id
+
+    measure_label = get_measure_range_label(sop)
+
+    return {
+        "signature": make_signature(intervals, durations),
+        "intervals": intervals,
+        "durations": durations,
+        "phrase": {
             "id": phrase_id,
             "pieceId": piece_id,
             "phraseIndex": phrase_idx,
             "xmlPath": f"xml/scores_phrase/{path.name}",
             "title": title,
             "measures": measure_label,
-        }
+        },
+    }
+
+
+def group_phrase_entries(
+    entries: List[Dict[str, Any]], similarity: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Group phrase entries (from extract_phrase_entry) by identical signature.
+    Signature strings are listed once in "signatures"; groups refer to
+    theirs by signatureId. With a similarity threshold, near-identical
+    groups are also clustered (MinHash/LSH, see phrase_clusters.py) and
+    tagged with clusterId.
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    total_phrases = 0
+
+    for entry in entries:
+        signature = entry["signature"]
 
         if signature not in groups:
             groups[signature] = {
                 "signature": signature,
-                "intervals": intervals,
-                "durations": durations,
+                "intervals": entry["intervals"],
+                "durations": entry["durations"],
                 "phrases": [],
             }
 
-        groups[signature]["phrases"].append(phrase_entry)
+        groups[signature]["phrases"].append(entry["phrase"])
         total_phrases += 1
 
+    table = SignatureTable(groups)
     group_list: List[Dict[str, Any]] = []
 
     for idx, (sig, g) in enumerate(groups.items(), start=1):
@@ -181,7 +195,7 @@ def build_soprano_groups() -> Dict[str, Any]:
         group_list.append(
             {
                 "groupId": f"grp_{idx:04d}",
-                "signature": g["signature"],
+                "signatureId": table.id_of(sig),
                 "intervals": g["intervals"],
                 "durations": g["durations"],
                 "size": len(phrases_sorted),
@@ -191,17 +205,74 @@ def build_soprano_groups() -> Dict[str, Any]:
 
     group_list.sort(key=lambda g: g["size"], reverse=True)
 
-    return {
+    data = {
         "generatedAt": datetime.now().isoformat(timespec="seconds"),
         "phraseCount": total_phrases,
         "groupCount": len(group_list),
+        "signatures": table.to_json(),
         "groups": group_list,
     }
 
+    if similarity is not None:
+        clustering = cluster_groups(group_list, similarity)
+        data["clusterCount"] = len(clustering["clusters"])
+        data["clustering"] = clustering["params"]
+        data["clusters"] = clustering["clusters"]
 
-def main():
-    data = build_soprano_groups()
+    return data
 
+
+def build_soprano_groups(similarity: Optional[float] = None, resume: bool = False) -> Dict[str, Any]:
+    """
+    Parse every phrase score, streaming its entry to PHRASES_NDJSON, then
+    group the entries read back from it. With resume, phrases an
+    interrupted run already wrote there are not parsed again.
+    """
+    if not PHRASE_DIR.exists():
+        raise SystemExit(f"Phrase directory not found: {PHRASE_DIR}")
+
+    print(f"Scanning {PHRASE_DIR}")
+
+    xml_files = sorted(
+        [p for p in PHRASE_DIR.iterdir() if p.suffix.lower() in (".xml", ".musicxml", ".mxl")]
+    )
+
+    with NdjsonWriter(PHRASES_NDJSON, resume=resume) as out:
+        done = {entry["phrase"]["id"] for entry in out.records()}
+
+        for path in xml_files:
+            if path.stem in done:
+                continue
+            print(f"  Processing {path.name}")
+            try:
+                score = parse_file(path)
+            except Exception as e:
+                print("    Parse failed:", e)
+                continue
+
+            entry = extract_phrase_entry(path, score)
+            if entry is not None:
+                out.write(entry)
+
+    return group_phrase_entries(iter_ndjson(PHRASES_NDJSON), similarity)
+
+
+def add_similarity_argument(parser):
+    parser.add_argument(
+        "--similarity",
+        type=float,
+        metavar="T",
+        help="also cluster near-identical phrase groups with Jaccard similarity >= T (e.g. 0.6)",
+    )
+
+
+def check_similarity(parser, value, option="--similarity"):
+    """Jaccard thresholds outside (0, 1] would merge every pair or behave like 1."""
+    if value is not None and not 0 < value <= 1:
+        parser.error(f"{option} must be greater than 0 and at most 1")
+
+
+def save_soprano_groups(data: Dict[str, Any]):
     OUTPUT_JSON.parent.mkdir(parents=True, exist_ok=True)
     with OUTPUT_JSON.open("w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -209,6 +280,22 @@ def main():
     print("\nSaved:", OUTPUT_JSON)
     print(" phraseCount =", data["phraseCount"])
     print(" groupCount  =", data["groupCount"])
+    if "clusterCount" in data:
+        print(" clusterCount =", data["clusterCount"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build soprano_groups.json from xml/scores_phrase.")
+    add_similarity_argument(parser)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="reuse the phrase entries an interrupted run already wrote",
+    )
+    args = parser.parse_args()
+    check_similarity(parser, args.similarity)
+
+    save_soprano_groups(build_soprano_groups(args.similarity, args.resume))
 
 
 if __name__ == "__main__":
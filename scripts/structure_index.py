@@ -0,0 +1,300 @@
+import argparse
+from bisect import bisect_right
+from dataclasses import dataclass
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from parallel import add_jobs_argument, run_jobs
+from pickup_beats import get_pickup_beats
+from xml_notes import read_score
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SCORES_DIR = BASE_DIR / "xml" / "scores"
+OUTPUT_JSON = BASE_DIR / "data" / "structure_index.json"
+INDEX_VERSION = 1
+
+EPS = 1e-6
+
+
+@dataclass
+class FermataEvent:
+    measure: int
+    offset: float
+    length: float
+    beat: float
+
+
+@dataclass
+class MeasureSpan:
+    number: Optional[int]
+    time: float
+    duration: float
+    bar_duration: Optional[float]
+    beat_length: float
+    padding: float
+
+
+def beat_length(time_signature: Optional[Tuple[int, int]]) -> float:
+    """quarterLength of one beat (dotted in compound meters such as 6/8 or 12/8)."""
+    if time_signature is None:
+        return 1.0
+    beats, beat_type = time_signature
+    unit = 4.0 / beat_type
+    if beats > 3 and beats % 3 == 0:
+        return unit * 3
+    return unit
+
+
+def measure_spans(measures, part: int = 0) -> List[MeasureSpan]:
+    """
+    MeasureSpan per measure of a part. padding is the paddingLeft music21's
+    MusicXML import gives a measure shorter than its bar: the opening
+    measure is a pickup, and so is a short measure that follows an earlier
+    short one (the flag survives full measures in between); any other
+    short measure is padded on the right instead, which moves no beats.
+    """
+    spans = []
+    last_short = False
+    for n, info in enumerate(m for m in measures if m.part == part):
+        bar = info.bar_duration if info.bar_duration is not None else 4.0
+        short = info.duration < bar - EPS
+        padding = 0.0
+
+        if n == 0:
+            if short:
+                padding = bar - info.duration
+        elif last_short:
+            if short:
+                padding = bar - info.duration
+                last_short = False
+        else:
+            last_short = short
+
+        spans.append(
+            MeasureSpan(
+                number=info.number,
+                time=info.time,
+                duration=info.duration,
+                bar_duration=info.bar_duration,
+                beat_length=beat_length(info.time_signature),
+                padding=padding,
+            )
+        )
+    return spans
+
+
+@dataclass
+class ChoraleStructure:
+    """
+    Soprano layout of one chorale: its measures, every fermata (notes and
+    rests) with the beat music21 would report, the pickup length and the
+    first sounding onset. Cadence and phrase slicing only need this.
+    """
+
+    name: str
+    measures: List[MeasureSpan]
+    fermatas: List[FermataEvent]
+    pickup: float
+    first_onset: Optional[Tuple[int, float]]
+
+    @property
+    def stem(self) -> str:
+        return Path(self.name).stem
+
+    def measure_range(self) -> Tuple[int, int]:
+        numbers = [m.number for m in self.measures if m.number is not None]
+        if not numbers:
+            return 1, 1
+        return min(numbers), max(numbers)
+
+    def bar_duration(self, number: int) -> Optional[float]:
+        """Bar length of a measure number (the last measure carrying it)."""
+        bar = None
+        for m in self.measures:
+            if m.number == number:
+                bar = m.bar_duration
+        return bar
+
+    def fermata_points(self) -> List[FermataEvent]:
+        """The earliest fermata of each measure, in measure order."""
+        by_measure: Dict[int, FermataEvent] = {}
+        for f in self.fermatas:
+            if f.measure not in by_measure:
+                by_measure[f.measure] = f
+        return [by_measure[num] for num in sorted(by_measure)]
+
+    def fermata_beat(self, measure: int) -> Optional[float]:
+        for f in self.fermata_points():
+            if f.measure == measure:
+                return f.beat
+        return None
+
+    def cadence_bounds(self) -> List[Tuple[int, int, float, float]]:
+        """
+        [(start_measure, end_measure, fermata_offset, fermata_beat)] per
+        cadence: the fermata's measure, plus the one before when the
+        fermata falls on the downbeat.
+        """
+        bounds = []
+        for f in self.fermata_points():
+            start = f.measure - 1 if f.beat == 1 and f.measure > 1 else f.measure
+            bounds.append((start, f.measure, f.offset, f.beat))
+        return bounds
+
+    def phrase_bounds(self) -> List[Tuple[int, float, int, Optional[float]]]:
+        """
+        [(start_measure, start_offset, end_measure, end_offset)] per phrase.
+        Each fermata closes a phrase at the end of its note; the next one
+        starts right after it (or on the next downbeat once the bar is
+        full). The last phrase runs to the end (end_offset None).
+        """
+        if not self.measures:
+            return []
+
+        min_meas, max_meas = self.measure_range()
+        first_meas, first_off = self.first_onset or (min_meas, 0.0)
+
+        if not self.fermatas:
+            return [(first_meas, first_off, max_meas, None)]
+
+        bounds = []
+        cur_meas, cur_off = first_meas, first_off
+        for f in self.fermatas:
+            end_offset = f.offset + f.length
+            bounds.append((cur_meas, cur_off, f.measure, end_offset))
+
+            cur_meas, cur_off = f.measure, end_offset
+            bar_q = self.bar_duration(f.measure)
+            if bar_q is not None and cur_off >= bar_q - EPS:
+                cur_meas, cur_off = f.measure + 1, 0.0
+
+        if cur_meas <= max_meas:
+            bounds.append((cur_meas, cur_off, max_meas, None))
+
+        return bounds
+
+    def to_json(self):
+        return {
+            "measures": [
+                [m.number, m.time, m.duration, m.bar_duration, m.beat_length, m.padding]
+                for m in self.measures
+            ],
+            "fermatas": [[f.measure, f.offset, f.length, f.beat] for f in self.fermatas],
+            "pickup": self.pickup,
+            "firstOnset": list(self.first_onset) if self.first_onset else None,
+        }
+
+    @classmethod
+    def from_json(cls, name: str, data) -> "ChoraleStructure":
+        first = data.get("firstOnset")
+        return cls(
+            name=name,
+            measures=[MeasureSpan(*m) for m in data["measures"]],
+            fermatas=[FermataEvent(*f) for f in data["fermatas"]],
+            pickup=data["pickup"],
+            first_onset=tuple(first) if first else None,
+        )
+
+
+def build_structure(path: Path, events=None, measures=None) -> ChoraleStructure:
+    """One streaming read of a chorale (or its already read events/measures)."""
+    path = Path(path)
+    if events is None or measures is None:
+        events, measures = read_score(path)
+
+    spans = measure_spans(measures)
+    starts = [m.time for m in spans]
+
+    fermatas = []
+    first_onset = None
+    for ev in events:
+        if ev.part != 0:
+            continue
+        if ev.measure is None:
+            continue
+
+        if not ev.is_rest and (first_onset is None or (ev.measure, ev.offset) < first_onset):
+            first_onset = (ev.measure, ev.offset)
+
+        if not ev.fermata:
+            continue
+
+        # Split measures share a number, so find the measure by start time.
+        span = spans[max(bisect_right(starts, ev.time - ev.offset + EPS) - 1, 0)]
+        fermatas.append(
+            FermataEvent(
+                measure=ev.measure,
+                offset=ev.offset,
+                length=ev.quarter_length,
+                beat=(ev.offset + span.padding) / span.beat_length + 1,
+            )
+        )
+
+    fermatas.sort(key=lambda f: (f.measure, f.offset))
+
+    return ChoraleStructure(
+        name=path.name,
+        measures=spans,
+        fermatas=fermatas,
+        pickup=get_pickup_beats([m for m in measures if m.part == 0]),
+        first_onset=first_onset,
+    )
+
+
+def save_structures(structures, out_path: Path = OUTPUT_JSON):
+    """Write the index (one compact line per chorale, sorted by file name)."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [
+        f"{json.dumps(s.name)}:{json.dumps(s.to_json(), separators=(',', ':'))}"
+        for s in sorted(structures, key=lambda s: s.name)
+    ]
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write('{"version":%d,"chorales":{\n' % INDEX_VERSION)
+        f.write(",\n".join(lines))
+        f.write("\n}}\n")
+
+    print(f"Saved structure of {len(lines)} chorales to:", out_path)
+
+
+def load_structures(path: Path = OUTPUT_JSON) -> Dict[str, ChoraleStructure]:
+    """file name -> ChoraleStructure, or {} if the index is missing or outdated."""
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != INDEX_VERSION:
+        return {}
+    return {
+        name: ChoraleStructure.from_json(name, entry)
+        for name, entry in data["chorales"].items()
+    }
+
+
+def build_structure_or_none(path: Path):
+    try:
+        return build_structure(path)
+    except Exception as e:
+        print(f"failed to process {path.name}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index fermatas, measures, pickup and first onset of every chorale."
+    )
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    files = sorted(SCORES_DIR.glob("*.xml")) + sorted(SCORES_DIR.glob("*.musicxml"))
+    if not files:
+        print("No MusicXML files found:", SCORES_DIR)
+        return
+
+    structures = run_jobs(build_structure_or_none, files, args.jobs)
+    save_structures([s for s in structures if s is not None])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+from pathlib import Path
+import sys
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+import xml.etree.ElementTree as ET
+
+STEP_TO_PC = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+ALTER_TO_ACCIDENTAL = {-2: "--", -1: "-", 0: "", 1: "#", 2: "##"}
+
+
+class NoteEvent(NamedTuple):
+    part: int
+    measure: Optional[int]
+    offset: float
+    time: float
+    midi: Optional[int]
+    quarter_length: float
+    fermata: bool
+    name: Optional[str]
+
+    @property
+    def is_rest(self) -> bool:
+        return self.midi is None
+
+
+class MeasureInfo(NamedTuple):
+    part: int
+    number: Optional[int]
+    time: float
+    duration: float
+    time_signature: Optional[Tuple[int, int]]
+
+    @property
+    def bar_duration(self) -> Optional[float]:
+        if self.time_signature is None:
+            return None
+        return bar_duration_of(self.time_signature)
+
+
+def bar_duration_of(time_signature: Tuple[int, int]) -> float:
+    beats, beat_type = time_signature
+    return beats * 4.0 / beat_type
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_measure_number(value) -> Optional[int]:
+    if value is None:
+        return None
+    digits = ""
+    for ch in value:
+        if ch.isdigit():
+            digits += ch
+        elif digits:
+            break
+    return int(digits) if digits else None
+
+
+def pitch_of(pitch_elem, ns: str = "") -> Tuple[int, str]:
+    """MIDI number and music21-style nameWithOctave ("E-5", "F#3") of a <pitch>."""
+    step = pitch_elem.findtext(ns + "step") or "C"
+    octave = int(pitch_elem.findtext(ns + "octave") or 4)
+    alter_text = pitch_elem.findtext(ns + "alter")
+    alter = int(round(float(alter_text))) if alter_text else 0
+
+    midi = (octave + 1) * 12 + STEP_TO_PC[step] + alter
+    name = f"{step}{ALTER_TO_ACCIDENTAL.get(alter, '')}{octave}"
+    return midi, name
+
+
+def is_full_measure_rest(note_elem, ns: str = "") -> bool:
+    rest = note_elem.find(ns + "rest")
+    if rest is None:
+        return False
+    if rest.get("measure") == "yes":
+        return True
+    return (
+        note_elem.findtext(ns + "type") in ("whole", "breve")
+        and note_elem.find(ns + "dot") is None
+        and note_elem.find(ns + "time-modification") is None
+    )
+
+
+def iter_events(path, measures: Optional[List[MeasureInfo]] = None) -> Iterator[NoteEvent]:
+    """
+    Stream note and rest events from a MusicXML file with iterparse,
+    without building a music21 object graph.
+
+    offset is relative to the measure and time to the start of the part,
+    both in quarterLength, matching music21's offsets after parsing
+    (measures advance by their filled length, so pickups keep their
+    real length). Events follow music21's notesAndRests for single-voice
+    parts: grace notes have quarter_length 0, chord members share the onset
+    of the note they attach to and <forward> gaps become rests (except one
+    that closes the part). Events are yielded as each measure closes.
+    If a list is passed as measures it is filled with one MeasureInfo per
+    measure in the same order. path may also be a binary file object.
+    """
+    ns = None
+    part_idx = 0
+    divisions = 1.0
+    time_sig = None
+    measure_time = 0.0
+    held = []
+    end_forward = None
+
+    source = path if hasattr(path, "read") else str(path)
+    for _, elem in ET.iterparse(source, events=("end",)):
+        tag = elem.tag
+
+        if ns is None:
+            ns = tag[: tag.index("}") + 1] if tag.startswith("{") else ""
+
+        if tag == ns + "measure":
+            measure_num = parse_measure_number(elem.get("number"))
+            pos = 0.0
+            measure_len = 0.0
+            last_onset = 0.0
+            pending = []
+            note_count = 0
+            full_rest = None
+            end_forward = None
+
+            for child in elem:
+                ctag = child.tag
+
+                if ctag == ns + "note":
+                    note_count += 1
+                    end_forward = None
+
+                    if child.find(ns + "grace") is not None:
+                        ql = 0.0
+                    else:
+                        ql = float(child.findtext(ns + "duration") or 0) / divisions
+
+                    if child.find(ns + "chord") is not None:
+                        onset = last_onset
+                    else:
+                        onset = pos
+                        pos += ql
+                        last_onset = onset
+                    if onset + ql > measure_len:
+                        measure_len = onset + ql
+
+                    pitch_elem = child.find(ns + "pitch")
+                    if pitch_elem is not None:
+                        midi, name = pitch_of(pitch_elem, ns)
+                    else:
+                        midi, name = None, None
+                        if is_full_measure_rest(child, ns):
+                            full_rest = len(pending)
+
+                    pending.append(
+                        NoteEvent(
+                            part=part_idx,
+                            measure=measure_num,
+                            offset=onset,
+                            time=measure_time + onset,
+                            midi=midi,
+                            quarter_length=ql,
+                            fermata=child.find(ns + "notations/" + ns + "fermata") is not None,
+                            name=name,
+                        )
+                    )
+
+                elif ctag == ns + "backup":
+                    pos -= float(child.findtext(ns + "duration") or 0) / divisions
+
+                elif ctag == ns + "forward":
+                    dur = float(child.findtext(ns + "duration") or 0) / divisions
+                    end_forward = len(pending)
+                    pending.append(
+                        NoteEvent(
+                            part=part_idx,
+                            measure=measure_num,
+                            offset=pos,
+                            time=measure_time + pos,
+                            midi=None,
+                            quarter_length=dur,
+                            fermata=False,
+                            name=None,
+                        )
+                    )
+                    pos += dur
+                    if pos > measure_len:
+                        measure_len = pos
+
+                elif ctag == ns + "attributes":
+                    div_text = child.findtext(ns + "divisions")
+                    if div_text:
+                        divisions = float(div_text)
+                    time_elem = child.find(ns + "time")
+                    if time_elem is not None:
+                        beats = time_elem.findtext(ns + "beats")
+                        beat_type = time_elem.findtext(ns + "beat-type")
+                        if beats and beat_type and beats.isdigit():
+                            time_sig = (int(beats), int(beat_type))
+
+            if full_rest is not None and note_count == 1:
+                # music21 stretches a lone whole-bar rest to the current
+                # time signature (4/4 if the part has none yet).
+                bar = bar_duration_of(time_sig or (4, 4))
+                pending[full_rest] = pending[full_rest]._replace(quarter_length=bar)
+                measure_len = bar
+
+            if measures is not None:
+                measures.append(
+                    MeasureInfo(
+                        part=part_idx,
+                        number=measure_num,
+                        time=measure_time,
+                        duration=measure_len,
+                        time_signature=time_sig,
+                    )
+                )
+            measure_time += measure_len
+            elem.clear()
+
+            # The last measure is held back until the part closes, in case
+            # it ends with a trailing <forward> that music21 drops.
+            yield from held
+            held = pending
+
+        elif tag == ns + "part":
+            if end_forward is not None and end_forward == len(held) - 1:
+                held.pop()
+            yield from held
+            held = []
+            end_forward = None
+            part_idx += 1
+            divisions = 1.0
+            time_sig = None
+            measure_time = 0.0
+            elem.clear()
+
+
+def read_score(path):
+    """Return (events, measures) for a whole MusicXML file."""
+    measures: List[MeasureInfo] = []
+    events = list(iter_events(path, measures))
+    return events, measures
+
+
+def events_by_part(events) -> List[List[NoteEvent]]:
+    parts: List[List[NoteEvent]] = []
+    for ev in events:
+        while len(parts) <= ev.part:
+            parts.append([])
+        parts[ev.part].append(ev)
+    return parts
+
+
+def main():
+    for arg in sys.argv[1:]:
+        events, measures = read_score(Path(arg))
+        parts = events_by_part(events)
+        print(f"{Path(arg).name}: {len(parts)} parts, {len(events)} events, "
+              f"{sum(1 for m in measures if m.part == 0)} measures")
+
+
+if __name__ == "__main__":
+    main()
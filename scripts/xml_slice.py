@@ -0,0 +1,346 @@
+import copy
+from pathlib import Path
+from typing import Optional
+import xml.etree.ElementTree as ET
+
+from structure_index import build_structure
+from xml_notes import local_name, parse_measure_number
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CADENCE_DIR = BASE_DIR / "xml" / "scores_cadence"
+PHRASE_DIR = BASE_DIR / "xml" / "scores_phrase"
+
+EPS = 1e-6
+
+# MusicXML schema order of <attributes> children.
+ATTRIBUTE_ORDER = [
+    "footnote",
+    "level",
+    "divisions",
+    "key",
+    "time",
+    "staves",
+    "part-symbol",
+    "instruments",
+    "clef",
+    "staff-details",
+    "transpose",
+    "directive",
+    "measure-style",
+]
+
+ENGINES = ["music21", "xml"]
+
+# Note-level children whose position is the running cursor.
+POSITIONED_TAGS = {"direction", "harmony", "figured-bass", "sound"}
+
+
+def add_engine_argument(parser):
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="music21",
+        help="slice with music21 (default) or straight from the MusicXML tree (much faster)",
+    )
+
+
+def make_clef(ns: str, sign: str, line: int):
+    c = ET.Element(ns + "clef")
+    ET.SubElement(c, ns + "sign").text = sign
+    ET.SubElement(c, ns + "line").text = str(line)
+    return c
+
+
+def format_duration(value: float) -> str:
+    return str(int(round(value))) if abs(value - round(value)) < EPS else repr(value)
+
+
+class SourceScore:
+    """
+    A chorale's MusicXML tree, indexed once so that any number of excerpts
+    can be cut from it.
+
+    For every part it keeps the <measure> elements with their numbers and
+    the divisions/key/time/clef in effect when each measure starts.
+    Excerpts share the untouched source elements (notes, directions,
+    header) instead of copying them; only measures whose content changes
+    and the <attributes> injected into first measures are new elements.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.root = ET.parse(self.path).getroot()
+        tag = self.root.tag
+        self.ns = tag[: tag.index("}") + 1] if tag.startswith("{") else ""
+        self.parts = [self._index_part(p) for p in self.root.findall(self.ns + "part")]
+
+    def _index_part(self, part_elem):
+        ns = self.ns
+        state = {"divisions": None, "key": None, "time": None, "clef": None}
+        measures = []
+
+        for m in part_elem.findall(ns + "measure"):
+            measures.append((parse_measure_number(m.get("number")), m, dict(state)))
+            for attrs in m.findall(ns + "attributes"):
+                for name in state:
+                    child = attrs.find(ns + name)
+                    if child is not None:
+                        state[name] = child.text if name == "divisions" else child
+
+        return part_elem, measures
+
+    def _trim_measure(self, m, divisions, lo, hi, hi_inclusive, shift, drop_trailing_rests):
+        """
+        Copy of measure m keeping the notes whose onset (quarterLength)
+        lies in [lo, hi) ([lo, hi] if hi_inclusive; None means open), moved
+        back by shift. Positions are rebuilt with <forward>/<backup> so
+        multi-voice measures stay aligned after notes are removed.
+        """
+        ns = self.ns
+        pos = 0.0
+        last_onset = 0.0
+        items = []
+
+        for child in m:
+            name = local_name(child.tag)
+
+            if name == "note":
+                if child.find(ns + "grace") is not None:
+                    dur = 0.0
+                else:
+                    dur = float(child.findtext(ns + "duration") or 0)
+                is_chord = child.find(ns + "chord") is not None
+                onset = last_onset if is_chord else pos
+                if not is_chord:
+                    pos += dur
+                    last_onset = onset
+                items.append(("note", child, onset, dur, is_chord))
+
+            elif name == "backup":
+                pos -= float(child.findtext(ns + "duration") or 0)
+
+            elif name == "forward":
+                pos += float(child.findtext(ns + "duration") or 0)
+
+            elif name == "attributes":
+                items.append(("attributes", child, pos, 0.0, False))
+
+            elif name in POSITIONED_TAGS:
+                items.append(("positioned", child, pos, 0.0, False))
+
+            else:
+                items.append(("fixed", child, None, 0.0, False))
+
+        lo_div = lo * divisions if lo is not None else None
+        hi_div = hi * divisions if hi is not None else None
+        shift_div = shift * divisions
+
+        def in_range(onset):
+            if lo_div is not None and onset < lo_div - EPS:
+                return False
+            if hi_div is not None:
+                if hi_inclusive:
+                    return onset <= hi_div + EPS
+                return onset < hi_div - EPS
+            return True
+
+        kept = []
+        for kind, child, onset, dur, is_chord in items:
+            if kind in ("note", "positioned") and not in_range(onset):
+                continue
+            target = None if onset is None else max(0.0, onset - shift_div)
+            kept.append((kind, child, target, dur, is_chord))
+
+        if drop_trailing_rests:
+            last_note_end = 0.0
+            for kind, child, target, dur, _ in kept:
+                if kind == "note" and child.find(ns + "rest") is None:
+                    last_note_end = max(last_note_end, target + dur)
+            if last_note_end > 0:
+                kept = [
+                    k for k in kept
+                    if not (
+                        k[0] == "note"
+                        and k[1].find(ns + "rest") is not None
+                        and k[2] >= last_note_end - EPS
+                    )
+                ]
+
+        new_m = ET.Element(m.tag, m.attrib)
+        new_m.text, new_m.tail = m.text, m.tail
+        cursor = 0.0
+        for kind, child, target, dur, is_chord in kept:
+            if target is not None and not is_chord:
+                if target > cursor + EPS:
+                    fwd = ET.SubElement(new_m, ns + "forward")
+                    ET.SubElement(fwd, ns + "duration").text = format_duration(target - cursor)
+                elif target < cursor - EPS:
+                    back = ET.SubElement(new_m, ns + "backup")
+                    ET.SubElement(back, ns + "duration").text = format_duration(cursor - target)
+                cursor = target
+            new_m.append(child)
+            if kind == "note" and not is_chord:
+                cursor += dur
+
+        return new_m
+
+    def _inject_attributes(self, m, state, clef_elem):
+        """
+        Give the first measure of an excerpt the divisions, key and time in
+        effect at its start, and replace its opening clef with clef_elem.
+        The measure's own <attributes> is copied, never edited in place.
+        """
+        ns = self.ns
+        first_attrs = None
+        first_idx = 0
+        for idx, child in enumerate(m):
+            if local_name(child.tag) == "attributes":
+                first_attrs, first_idx = child, idx
+                break
+            if local_name(child.tag) in ("note", "backup", "forward"):
+                break
+
+        attrs = ET.Element(ns + "attributes") if first_attrs is None else copy.copy(first_attrs)
+        present = {local_name(c.tag) for c in attrs}
+
+        if "divisions" not in present and state["divisions"] is not None:
+            div = ET.Element(ns + "divisions")
+            div.text = state["divisions"]
+            attrs.append(div)
+        for name in ("key", "time"):
+            if name not in present and state[name] is not None:
+                attrs.append(state[name])
+        for c in attrs.findall(ns + "clef"):
+            attrs.remove(c)
+        if clef_elem is not None:
+            attrs.append(clef_elem)
+
+        order = {name: i for i, name in enumerate(ATTRIBUTE_ORDER)}
+        attrs[:] = sorted(attrs, key=lambda c: order.get(local_name(c.tag), len(order)))
+
+        if first_attrs is None:
+            m.insert(0, attrs)
+        else:
+            m[first_idx] = attrs
+
+    def _opening_clef(self, part_idx, m, state, clef_mode):
+        ns = self.ns
+        if clef_mode == "cadence":
+            return make_clef(ns, "G", 2) if part_idx < 2 else make_clef(ns, "F", 4)
+        if part_idx in (2, 3):
+            return make_clef(ns, "F", 4)
+        clef_elem = m.find(ns + "attributes/" + ns + "clef")
+        if clef_elem is None:
+            clef_elem = state["clef"]
+        if clef_elem is None and part_idx in (0, 1):
+            clef_elem = make_clef(ns, "G", 2)
+        return clef_elem
+
+    def excerpt(
+        self,
+        start_measure: int,
+        start_offset: float,
+        end_measure: int,
+        end_offset: Optional[float],
+        end_inclusive: bool = False,
+        clef_mode: str = "phrase",
+    ):
+        """
+        ElementTree holding measures start_measure..end_measure of every
+        part, without the notes before start_offset in the first measure
+        (the rest of that measure moves back to 0) and from end_offset on
+        in the last (up to and including it when end_inclusive).
+
+        clef_mode "phrase" follows extract_phrases.py (tenor and bass get
+        a bass clef, the upper parts keep theirs); "cadence" follows
+        cadences.py (treble for parts 0-1, bass for the rest).
+        """
+        ns = self.ns
+        root = ET.Element(self.root.tag, self.root.attrib)
+        root.text = self.root.text
+        for child in self.root:
+            if local_name(child.tag) != "part":
+                root.append(child)
+
+        for part_idx, (part_elem, measures) in enumerate(self.parts):
+            new_part = ET.SubElement(root, part_elem.tag, part_elem.attrib)
+            new_part.text, new_part.tail = part_elem.text, part_elem.tail
+            first = True
+
+            for num, m, state in measures:
+                if num is None or num < start_measure or num > end_measure:
+                    continue
+
+                trim_start = num == start_measure and start_offset > EPS
+                trim_end = num == end_measure and end_offset is not None
+                if trim_start or trim_end or first:
+                    divisions = float(state["divisions"] or 1)
+                    for a in m.findall(ns + "attributes"):
+                        if a.findtext(ns + "divisions"):
+                            divisions = float(a.findtext(ns + "divisions"))
+                            break
+                    new_m = self._trim_measure(
+                        m,
+                        divisions,
+                        start_offset if trim_start else None,
+                        end_offset if trim_end else None,
+                        end_inclusive,
+                        start_offset if trim_start else 0.0,
+                        drop_trailing_rests=first and clef_mode == "phrase",
+                    )
+                else:
+                    new_m = m
+
+                if first:
+                    clef_elem = self._opening_clef(part_idx, new_m, state, clef_mode)
+                    self._inject_attributes(new_m, state, clef_elem)
+                    first = False
+
+                new_part.append(new_m)
+
+        return ET.ElementTree(root)
+
+
+def write_tree(tree, out_path: Path):
+    tree.write(out_path, encoding="utf-8", xml_declaration=True)
+
+
+def tree_bytes(tree) -> bytes:
+    """The bytes write_tree would write, for excerpts served from memory."""
+    return ET.tostring(tree.getroot(), encoding="utf-8", xml_declaration=True)
+
+
+def write_cadences(path: Path, out_dir: Path = CADENCE_DIR, structure=None):
+    """Cut every fermata cadence of a chorale; returns [(out_path, fermata_beat)]."""
+    if structure is None:
+        structure = build_structure(path)
+    source = SourceScore(path)
+    results = []
+
+    for idx, (start, end, offset, beat) in enumerate(structure.cadence_bounds()):
+        tree = source.excerpt(start, 0.0, end, offset, end_inclusive=True, clef_mode="cadence")
+        out_path = out_dir / f"{path.stem}_cad{idx + 1}_m{start}-{end}.musicxml"
+        write_tree(tree, out_path)
+        print(f"Generated: {out_path.name} (measures {start}–{end})")
+        results.append((out_path, beat))
+
+    return results
+
+
+def write_phrases(path: Path, out_dir: Path = PHRASE_DIR, structure=None):
+    """Cut every fermata phrase of a chorale; returns [out_path]."""
+    if structure is None:
+        structure = build_structure(path)
+    source = SourceScore(path)
+    results = []
+
+    for idx, (s_meas, s_off, e_meas, e_off) in enumerate(structure.phrase_bounds(), start=1):
+        tree = source.excerpt(s_meas, s_off, e_meas, e_off, clef_mode="phrase")
+        out_path = out_dir / f"{path.stem}_phrase{idx:02d}.musicxml"
+        write_tree(tree, out_path)
+        end_label = "end" if e_off is None else e_off
+        print(f"  Saved: {out_path.name} (measures {s_meas}:{s_off} ~ {e_meas}:{end_label})")
+        results.append(out_path)
+
+    return results